@@ -12,6 +12,7 @@ import galaxy.quota
 from galaxy.managers.tags import GalaxyTagManager
 from galaxy.visualization.genomes import Genomes
 from galaxy.visualization.data_providers.registry import DataProviderRegistry
+from galaxy.datatypes.dataproviders.base import OffsetIndex
 from galaxy.visualization.registry import VisualizationsRegistry
 from galaxy.tools.imp_exp import load_history_imp_exp_tools
 from galaxy.sample_tracking import external_service_types
@@ -71,6 +72,10 @@ class UniverseApplication( object, config.ConfiguresGalaxyMixin ):
         self.genomes = Genomes( self )
         # Data providers registry.
         self.data_provider_registry = DataProviderRegistry()
+        # Indexes of line positions used by dataset dataproviders to page through large files.
+        if self.config.dataprovider_index_interval > 0:
+            OffsetIndex.index_dir = self.config.dataprovider_index_path
+            OffsetIndex.interval = self.config.dataprovider_index_interval
 
         # Initialize job metrics manager, needs to be in place before
         # config so per-destination modifications can be made.
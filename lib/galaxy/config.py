@@ -161,6 +161,8 @@ class Configuration( object ):
         self.collect_outputs_from = [ x.strip() for x in kwargs.get( 'collect_outputs_from', 'new_file_path,job_working_directory' ).lower().split(',') ]
         self.template_path = resolve_path( kwargs.get( "template_path", "templates" ), self.root )
         self.template_cache = resolve_path( kwargs.get( "template_cache_path", "database/compiled_templates" ), self.root )
+        self.dataprovider_index_path = resolve_path( kwargs.get( "dataprovider_index_path", "database/dataprovider_index" ), self.root )
+        self.dataprovider_index_interval = int( kwargs.get( "dataprovider_index_interval", "10000" ) )
         self.local_job_queue_workers = int( kwargs.get( "local_job_queue_workers", "5" ) )
         self.cluster_job_queue_workers = int( kwargs.get( "cluster_job_queue_workers", "3" ) )
         self.job_queue_cleanup_interval = int( kwargs.get("job_queue_cleanup_interval", "5") )
@@ -204,6 +206,7 @@ class Configuration( object ):
         self.smtp_password = kwargs.get( 'smtp_password', None )
         self.smtp_ssl = kwargs.get( 'smtp_ssl', None )
         self.track_jobs_in_database = kwargs.get( 'track_jobs_in_database', 'None' )
+        self.job_handler_full_check_interval = int( kwargs.get( 'job_handler_full_check_interval', 30 ) )
         self.start_job_runners = listify(kwargs.get( 'start_job_runners', '' ))
         self.expose_dataset_path = string_as_bool( kwargs.get( 'expose_dataset_path', 'False' ) )
         # External Service types used in sample tracking
@@ -298,6 +301,10 @@ class Configuration( object ):
         self.nginx_upload_job_files_path = kwargs.get( 'nginx_upload_job_files_path', False )
         if self.nginx_upload_store:
             self.nginx_upload_store = os.path.abspath( self.nginx_upload_store )
+        # Zip archives of datasets are deflated with this level (0 stores the files)
+        self.zip_compression_level = max( 0, min( int( kwargs.get( 'zip_compression_level', 6 ) ), 9 ) )
+        if self.upstream_gzip:
+            self.zip_compression_level = 0
         self.object_store = kwargs.get( 'object_store', 'disk' )
         self.object_store_check_old_style = string_as_bool( kwargs.get( 'object_store_check_old_style', False ) )
         self.object_store_cache_path = resolve_path( kwargs.get( "object_store_cache_path", "database/object_store_cache" ), self.root )
@@ -434,6 +441,8 @@ class Configuration( object ):
             self.visualization_plugins_directory = ie_dirs
         elif ie_dirs:
             self.visualization_plugins_directory += ",%s" % ie_dirs
+        # bytes of region data (e.g. Trackster tiles) kept in memory per process
+        self.visualization_data_cache_size = int( kwargs.get( 'visualization_data_cache_size', 64 * 1024 * 1024 ) )
 
         self.proxy_session_map = self.resolve_path( kwargs.get( "dynamic_proxy_session_map", "database/session_map.sqlite" ) )
         self.manage_dynamic_proxy = string_as_bool( kwargs.get( "dynamic_proxy_manage", "True" ) )  # Set to false if being launched externally
@@ -598,7 +607,7 @@ class Configuration( object ):
         if self.object_store_config_file is None:
             for path in (self.file_path, self.job_working_directory):
                 self._ensure_directory( path )
-        for path in (self.new_file_path, self.template_cache, self.ftp_upload_dir,
+        for path in (self.new_file_path, self.template_cache, self.dataprovider_index_path, self.ftp_upload_dir,
                      self.library_import_dir, self.user_library_import_dir,
                      self.nginx_upload_store, self.whoosh_index_dir,
                      self.object_store_cache_path):
@@ -83,6 +83,7 @@ class Binary( data.Data ):
         fname = ''.join(c in valid_chars and c or '_' for c in dataset.name)[0:150]
         trans.response.set_content_type( "application/octet-stream" ) #force octet-stream so Safari doesn't append mime extensions to filename
         trans.response.headers["Content-Disposition"] = 'attachment; filename="Galaxy%s-[%s].%s"' % (dataset.hid, fname, to_ext)
+        trans.response.set_file_validators( dataset.file_name )
         return open( dataset.file_name )
 
 
@@ -144,6 +145,8 @@ class Bam( Binary ):
     file_ext = "bam"
     track_type = "ReadTrack"
     data_sources = { "data": "bai", "index": "bigwig" }
+    # BGZF is gzip
+    sniff_magic = ( '\x1f\x8b', )
 
     MetadataElement( name="bam_index", desc="BAM Index File", param=metadata.FileParameter, file_ext="bai", readonly=True, no_value=None, visible=False, optional=True )
 
@@ -407,6 +410,8 @@ Binary.register_sniffable_binary_format("bam", "bam", Bam)
 class Bcf( Binary):
     """Class describing a BCF file"""
     file_ext = "bcf"
+    # BGZF is gzip
+    sniff_magic = ( '\x1f\x8b', )
 
     def sniff( self, filename ):
         # BCF is compressed in the BGZF format, and must not be uncompressed in Galaxy.
@@ -467,6 +472,7 @@ Binary.register_unsniffable_binary_ext("scf")
 class Sff( Binary ):
     """ Standard Flowgram Format (SFF) """
     file_ext = "sff"
+    sniff_magic = ( '.sff', )
 
     def __init__( self, **kwd ):
         Binary.__init__( self, **kwd )
@@ -513,6 +519,10 @@ class BigWig(Binary):
         self._magic = 0x888FFC26
         self._name = "BigWig"
 
+    @property
+    def sniff_magic( self ):
+        return ( struct.pack( "I", self._magic ), )
+
     def _unpack( self, pattern, handle ):
         return struct.unpack( pattern, handle.read( struct.calcsize( pattern ) ) )
 
@@ -557,6 +567,7 @@ class TwoBit (Binary):
     """Class describing a TwoBit format nucleotide file"""
 
     file_ext = "twobit"
+    sniff_magic = ( struct.pack( ">L", TWOBIT_MAGIC_NUMBER ), struct.pack( ">L", TWOBIT_MAGIC_NUMBER_SWAP ) )
 
     def sniff(self, filename):
         try:
@@ -593,6 +604,7 @@ class SQlite ( Binary ):
     MetadataElement( name="table_columns", default={}, param=DictParameter, desc="Database Table Columns", readonly=True, visible=True, no_value={} )
     MetadataElement( name="table_row_count", default={}, param=DictParameter, desc="Database Table Row Count", readonly=True, visible=True, no_value={} )
     file_ext = "sqlite"
+    sniff_magic = ( 'SQLite format 3\0', )
 
     def init_meta( self, dataset, copy_from=None ):
         Binary.init_meta( self, dataset, copy_from=copy_from )
@@ -740,6 +752,7 @@ Binary.register_sniffable_binary_format("sqlite", "sqlite", SQlite)
 class Xlsx(Binary):
     """Class for Excel 2007 (xlsx) files"""
     file_ext="xlsx"
+    sniff_magic = ( 'PK\x03\x04', )
     def sniff( self, filename ):
         # Xlsx is compressed in zip format and must not be uncompressed in Galaxy.
         try:
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""
+Convert from interval (BED), GFF or VCF file to a summary pyramid of the
+coverage of its features, for zoomed out views in the track browser.
+
+usage: %prog <options> in_file out_file
+    -F, --format: interval, gff or vcf, default=interval
+    -c, --chr-col: chromosome column, default=1
+    -s, --start-col: start column, default=2
+    -e, --end-col: end column, default=3
+"""
+
+import optparse
+from array import array
+
+from galaxy.visualization.data_providers.summary_pyramid import write_summary_pyramid
+
+
+def read_intervals( in_file, input_format, chrom_col, start_col, end_col ):
+    """
+    Returns { chrom: ( starts, ends ) } with the 0-based, half-open
+    coordinates of the features in in_file.
+    """
+    intervals = {}
+    for line in in_file:
+        if not line.strip() or line.startswith( ( '#', 'track', 'browser' ) ):
+            continue
+        fields = line.rstrip( '\r\n' ).split( '\t' )
+        try:
+            chrom = fields[ chrom_col ]
+            if input_format == 'gff':
+                # 1-based, closed coordinates
+                start, end = int( fields[ 3 ] ) - 1, int( fields[ 4 ] )
+            elif input_format == 'vcf':
+                # 1-based position and reference allele
+                start = int( fields[ 1 ] ) - 1
+                end = start + max( len( fields[ 3 ] ), 1 )
+            else:
+                start, end = int( fields[ start_col ] ), int( fields[ end_col ] )
+        except ( IndexError, ValueError ):
+            continue
+        if end <= start:
+            continue
+        if chrom not in intervals:
+            intervals[ chrom ] = ( array( 'l' ), array( 'l' ) )
+        starts, ends = intervals[ chrom ]
+        starts.append( start )
+        ends.append( end )
+    return intervals
+
+
+def main():
+    # Read options, args.
+    parser = optparse.OptionParser()
+    parser.add_option( '-F', '--format', dest='input_format', default='interval' )
+    parser.add_option( '-c', '--chr-col', type='int', dest='chrom_col', default=1 )
+    parser.add_option( '-s', '--start-col', type='int', dest='start_col', default=2 )
+    parser.add_option( '-e', '--end-col', type='int', dest='end_col', default=3 )
+    (options, args) = parser.parse_args()
+    input_fname, output_fname = args
+
+    # Make column indices 0-based.
+    intervals = read_intervals( open( input_fname, 'r' ), options.input_format.lower(),
+                                options.chrom_col - 1, options.start_col - 1, options.end_col - 1 )
+
+    # Do conversion, one chrom at a time.
+    def chrom_intervals():
+        for chrom in sorted( intervals ):
+            starts, ends = intervals.pop( chrom )
+            yield chrom, starts, ends
+
+    out = open( output_fname, 'wb' )
+    write_summary_pyramid( out, chrom_intervals() )
+    out.close()
+
+if __name__ == "__main__":
+    main()
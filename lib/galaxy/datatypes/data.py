@@ -5,15 +5,15 @@ import os
 import shutil
 import sys
 import tempfile
-import zipfile
 from cgi import escape
 from inspect import isclass
 from galaxy import util
 from galaxy.datatypes.metadata import MetadataElement #import directly to maintain ease of use in Datatype class definitions
+from galaxy.datatypes.observers import DataLinesObserver, scan_file
 from galaxy.util import inflector
 from galaxy.util.bunch import Bunch
 from galaxy.util.odict import odict
-from galaxy.util.sanitize_html import sanitize_html
+from galaxy.util.sanitize_html import iter_sanitized_html
 
 import dataproviders
 
@@ -94,6 +94,9 @@ class Data( object ):
     primary_file_name = 'index'
     #A per datatype setting (inherited): max file size (in bytes) for setting optional metadata
     _max_optional_metadata_filesize = None
+    # Tuple of byte strings that any file of this datatype starts with. If set,
+    # sniff() is only called for files starting with one of them.
+    sniff_magic = None
 
     # Trackster track type.
     track_type = None
@@ -242,17 +245,12 @@ class Data( object ):
             error = False
             try:
                 if (params.do_action == 'zip'):
-                    # Can't use mkstemp - the file must not exist first
-                    tmpd = tempfile.mkdtemp()
-                    util.umask_fix_perms( tmpd, trans.app.config.umask, 0777, trans.app.config.gid )
-                    tmpf = os.path.join( tmpd, 'library_download.' + params.do_action )
-                    archive = zipfile.ZipFile( tmpf, 'w', zipfile.ZIP_DEFLATED, True )
-                    archive.add = lambda x, y: archive.write( x, y.encode('CP437') )
+                    archive = util.streamball.ZipStreamBall( trans.app.config.zip_compression_level )
                 elif params.do_action == 'tgz':
                     archive = util.streamball.StreamBall( 'w|gz' )
                 elif params.do_action == 'tbz':
                     archive = util.streamball.StreamBall( 'w|bz2' )
-            except (OSError, zipfile.BadZipFile):
+            except OSError:
                 error = True
                 log.exception( "Unable to create archive for download" )
                 msg = "Unable to create archive for %s for download, please report this error" % outfname
@@ -286,21 +284,17 @@ class Data( object ):
                                 continue
                 if not error:
                     if params.do_action == 'zip':
-                        archive.close()
-                        tmpfh = open( tmpf )
-                        # CANNOT clean up - unlink/rmdir was always failing because file handle retained to return - must rely on a cron job to clean up tmp
                         trans.response.set_content_type( "application/x-zip-compressed" )
                         trans.response.headers[ "Content-Disposition" ] = 'attachment; filename="%s.zip"' % outfname
-                        return tmpfh
                     else:
                         trans.response.set_content_type( "application/x-tar" )
                         outext = 'tgz'
                         if params.do_action == 'tbz':
                             outext = 'tbz'
                         trans.response.headers[ "Content-Disposition" ] = 'attachment; filename="%s.%s"' % (outfname,outext)
-                        archive.wsgi_status = trans.response.wsgi_status()
-                        archive.wsgi_headeritems = trans.response.wsgi_headeritems()
-                        return archive.stream
+                    archive.wsgi_status = trans.response.wsgi_status()
+                    archive.wsgi_headeritems = trans.response.wsgi_headeritems()
+                    return archive.stream
         return trans.show_error_message( msg )
 
     def _serve_raw(self, trans, dataset, to_ext):
@@ -309,6 +303,7 @@ class Data( object ):
         fname = ''.join(c in valid_chars and c or '_' for c in dataset.name)[0:150]
         trans.response.set_content_type( "application/octet-stream" ) #force octet-stream so Safari doesn't append mime extensions to filename
         trans.response.headers["Content-Disposition"] = 'attachment; filename="Galaxy%s-[%s].%s"' % (dataset.hid, fname, to_ext)
+        trans.response.set_file_validators( dataset.file_name )
         return open( dataset.file_name )
 
     def display_data(self, trans, data, preview=False, filename=None, to_ext=None, size=None, offset=None, **kwd):
@@ -341,6 +336,7 @@ class Data( object ):
                     except:
                         mime = "text/plain"
                 self._clean_and_set_mime_type( trans, mime )
+                trans.response.set_file_validators( file_path )
                 return open( file_path )
             else:
                 return trans.show_error_message( "Could not find '%s' on the extra files path %s." % ( filename, file_path ) )
@@ -359,6 +355,7 @@ class Data( object ):
                 fname = ''.join(c in valid_chars and c or '_' for c in data.name)[0:150]
                 trans.response.set_content_type( "application/octet-stream" ) #force octet-stream so Safari doesn't append mime extensions to filename
                 trans.response.headers["Content-Disposition"] = 'attachment; filename="Galaxy%s-[%s].%s"' % (data.hid, fname, to_ext)
+                trans.response.set_file_validators( data.file_name )
                 return open( data.file_name )
         if not os.path.exists( data.file_name ):
             raise paste.httpexceptions.HTTPNotFound( "File Not Found (%s)." % data.file_name )
@@ -368,8 +365,10 @@ class Data( object ):
         preview = util.string_as_bool( preview )
         if not preview or isinstance(data.datatype, datatypes.images.Image) or os.stat( data.file_name ).st_size < max_peek_size:
             if trans.app.config.sanitize_all_html and trans.response.get_content_type() == "text/html":
-                # Sanitize anytime we respond with plain text/html content.
-                return sanitize_html(open( data.file_name ).read())
+                # Sanitize anytime we respond with plain text/html content, streaming the file through the sanitizer.
+                data_file = open( data.file_name )
+                return iter_sanitized_html( iter( lambda: data_file.read( 65536 ), '' ) )
+            trans.response.set_file_validators( data.file_name )
             return open( data.file_name )
         else:
             trans.response.set_content_type( "text/html" )
@@ -698,12 +697,7 @@ class Text( Data ):
         Count the number of lines of data in dataset,
         skipping all blank lines and comments.
         """
-        data_lines = 0
-        for line in file( dataset.file_name ):
-            line = line.strip()
-            if line and not line.startswith( '#' ):
-                data_lines += 1
-        return data_lines
+        return scan_file( dataset.file_name, [ DataLinesObserver() ] )[0].data_lines
     def set_peek( self, dataset, line_count=None, is_multi_byte=False, WIDTH=256, skipchars=[] ):
         """
         Set the peek.  This method is used by various subclasses of Text.
@@ -7,13 +7,16 @@ Base class(es) for all DataProviders.
 # also, this shouldn't be a replacement/re-implementation of the tool layer
 #   (which provides traceability/versioning/reproducibility)
 
-from collections import deque
+from collections import deque, OrderedDict
+import errno
+import hashlib
+import json
+import os
+import tempfile
 import exceptions
 
 _TODO = """
 hooks into datatypes (define providers inside datatype modules) as factories
-capture tell() when provider is done
-    def stop( self ): self.endpoint = source.tell(); raise StopIteration()
 implement __len__ sensibly where it can be (would be good to have where we're giving some progress - '100 of 300')
     seems like sniffed files would have this info
 unit tests
@@ -246,12 +249,20 @@ class LimitedOffsetDataProvider( FilteredDataProvider ):
         Iterate over the source until `num_valid_data_read` is greater than
         `offset`, begin providing datat, and stop when `num_data_returned`
         is greater than `offset`.
+
+        If the source is a file that can be indexed (see `get_offset_index`),
+        start from the last indexed position at or before `offset` instead of
+        the start of the file.
         """
         if self.limit != None and self.limit <= 0:
             return
             yield
 
-        parent_gen = super( LimitedOffsetDataProvider, self ).__iter__()
+        offset_index = self.get_offset_index()
+        if offset_index:
+            parent_gen = self.iter_from_offset_index( offset_index )
+        else:
+            parent_gen = super( LimitedOffsetDataProvider, self ).__iter__()
         for datum in parent_gen:
             self.num_data_returned -= 1
             #print 'self.num_data_returned:', self.num_data_returned
@@ -264,17 +275,205 @@ class LimitedOffsetDataProvider( FilteredDataProvider ):
             if self.limit != None and self.num_data_returned >= self.limit:
                 break
 
-    #TODO: skipping lines is inefficient - somehow cache file position/line_num pair and allow provider
-    #   to seek to a pos/line and then begin providing lines
-    # the important catch here is that we need to have accurate pos/line pairs
-    #   in order to preserve the functionality of limit and offset
-    #if file_seek and len( file_seek ) == 2:
-    #    seek_pos, new_line_num = file_seek
-    #    self.seek_and_set_curr_line( seek_pos, new_line_num )
-
-    #def seek_and_set_curr_line( self, file_seek, new_curr_line_num ):
-    #    self.seek( file_seek, os.SEEK_SET )
-    #    self.curr_line_num = new_curr_line_num
+    def filter_signature( self ):
+        """
+        Return a string describing which data from the source `filter` considers
+        valid - or `None` if that can't be described (and the positions of valid
+        data can't be indexed).
+
+        Meant to be overridden along with `filter`.
+        """
+        return None
+
+    def get_offset_index( self ):
+        """
+        Return an `OffsetIndex` for this provider's source or `None` if the source
+        isn't an unread file or this provider's filtering can't be described.
+        """
+        if self.filter_fn:
+            return None
+        # any subclass that changes what's valid must also change the signature
+        mro = type( self ).__mro__
+        for cls in mro[ :mro.index( LimitedOffsetDataProvider ) ]:
+            if 'filter' in cls.__dict__ and 'filter_signature' not in cls.__dict__:
+                return None
+        signature = self.filter_signature()
+        if signature == None:
+            return None
+
+        source = self.source
+        try:
+            if source.tell() != 0:
+                return None
+        except ( AttributeError, IOError ):
+            return None
+        if isinstance( source, file ):
+            return OffsetIndex.for_file( source.name, signature )
+        if hasattr( type( source ), 'create_offset_index' ):
+            return source.create_offset_index( signature )
+        return None
+
+    def iter_from_offset_index( self, offset_index ):
+        """
+        Seek the source to the last indexed position at or before `offset`, restore
+        the counters for that position, and filter data from there (as
+        `FilteredDataProvider.__iter__` does) - recording new positions in the
+        index along the way.
+        """
+        position, self.num_data_read, self.num_valid_data_read = offset_index.find( self.offset )
+        with self:
+            self.source.seek( position )
+            try:
+                for datum in self.source:
+                    # lines are read from a binary file, so their lengths are byte lengths
+                    position += len( datum )
+                    self.num_data_read += 1
+                    datum = self.filter( datum )
+                    if datum != None:
+                        self.num_valid_data_read += 1
+                        self.num_data_returned += 1
+                        offset_index.record( position, self.num_data_read, self.num_valid_data_read )
+                        yield datum
+            finally:
+                offset_index.save()
+
+
+class OffsetIndex( object ):
+    """
+    A sparse index of positions in a file for a LimitedOffsetDataProvider: after
+    every `interval` valid data, the position of the next line and the provider's
+    `num_data_read` and `num_valid_data_read` counters are recorded.
+
+    What counts as valid depends on the provider's filters, so a file's side file
+    in `index_dir` holds the checkpoints of (at most `max_signatures`) filter
+    signatures. Indeces are built lazily while providers read the file and are
+    discarded when the size or modification time of the file changes. The side
+    files of datasets are removed when the dataset is purged.
+    """
+    # directory for the side files (set from the app's config) - `None` disables indexing
+    index_dir = None
+    # number of valid data between recorded positions
+    interval = 10000
+    # number of filter signatures kept per file, the least recently saved are dropped
+    max_signatures = 8
+
+    def __init__( self, filename, signature, key=None ):
+        """
+        :param filename: the path of the (regular) file to index
+        :param signature: the provider's `filter_signature`
+        :param key: the name of the side file (defaults to a hash of the path)
+        """
+        self.filename = os.path.abspath( filename )
+        self.signature = signature
+        if key is None:
+            key = hashlib.sha1( self.filename ).hexdigest()
+        self.index_filename = os.path.join( self.index_dir, key + '.json' )
+        self.file_stat = self.get_file_stat()
+        self.checkpoints = self.load().get( signature, [] )
+        self.num_saved = len( self.checkpoints )
+
+    @classmethod
+    def for_file( cls, filename, signature, key=None ):
+        """
+        Return the index for `filename` and `signature` or `None` if indexing is
+        disabled or `filename` isn't a regular file.
+        """
+        if not cls.index_dir or not os.path.isfile( filename ):
+            return None
+        return cls( filename, signature, key=key )
+
+    @classmethod
+    def for_dataset( cls, dataset, signature ):
+        """
+        Return the index for the file of `dataset` (a `model.Dataset`) and
+        `signature` or `None` if indexing is disabled.
+        """
+        return cls.for_file( dataset.file_name, signature, key=cls.dataset_key( dataset ) )
+
+    @staticmethod
+    def dataset_key( dataset ):
+        return 'dataset_%d' % dataset.id
+
+    @classmethod
+    def remove_for_dataset( cls, dataset ):
+        """
+        Remove the side file of `dataset` (if any).
+        """
+        if not cls.index_dir:
+            return
+        try:
+            os.unlink( os.path.join( cls.index_dir, cls.dataset_key( dataset ) + '.json' ) )
+        except OSError, os_err:
+            if os_err.errno != errno.ENOENT:
+                log.warn( 'Unable to remove offset index for dataset %s: %s', dataset.id, os_err )
+
+    def get_file_stat( self ):
+        stat = os.stat( self.filename )
+        return [ stat.st_size, stat.st_mtime ]
+
+    def load( self ):
+        """
+        Return the checkpoints saved for this file as a dictionary keyed by filter
+        signature - or an empty one if there are none or they're out of date.
+        """
+        try:
+            with open( self.index_filename ) as index_file:
+                saved = json.load( index_file )
+        except ( IOError, ValueError ):
+            return {}
+        if( saved.get( 'file_stat' ) != self.file_stat
+        or  saved.get( 'interval' ) != self.interval ):
+            return {}
+        # signatures are saved least recently saved first
+        return OrderedDict( ( signature, [ tuple( checkpoint ) for checkpoint in checkpoints ] )
+            for signature, checkpoints in saved.get( 'signatures', [] ) )
+
+    def find( self, num_valid ):
+        """
+        Return the last checkpoint at or before `num_valid` valid data as a tuple of
+        `( position, num_data_read, num_valid_data_read )`.
+        """
+        num_checkpoints = min( num_valid // self.interval, len( self.checkpoints ) )
+        if not num_checkpoints:
+            return ( 0, 0, 0 )
+        return self.checkpoints[ num_checkpoints - 1 ]
+
+    def record( self, position, num_data_read, num_valid_data_read ):
+        """
+        Add a checkpoint if `num_valid_data_read` is the next one to be indexed.
+        """
+        if num_valid_data_read == ( len( self.checkpoints ) + 1 ) * self.interval:
+            self.checkpoints.append( ( position, num_data_read, num_valid_data_read ) )
+
+    def save( self ):
+        """
+        Write the index to its side file if checkpoints were added and the file
+        hasn't changed since the index was loaded.
+        """
+        if len( self.checkpoints ) == self.num_saved:
+            return
+        try:
+            if self.get_file_stat() != self.file_stat:
+                return
+            signatures = self.load()
+            signatures.pop( self.signature, None )
+            signatures[ self.signature ] = self.checkpoints
+            # write then rename so concurrent readers never see a partial index
+            handle, tmp_filename = tempfile.mkstemp( dir=self.index_dir, suffix='.tmp' )
+            try:
+                with os.fdopen( handle, 'w' ) as tmp_file:
+                    json.dump({
+                        'file_stat'     : self.file_stat,
+                        'interval'      : self.interval,
+                        'signatures'    : signatures.items()[ -self.max_signatures: ]
+                    }, tmp_file )
+                os.rename( tmp_filename, self.index_filename )
+            except:
+                os.unlink( tmp_filename )
+                raise
+            self.num_saved = len( self.checkpoints )
+        except ( IOError, OSError ), os_err:
+            log.warn( 'Unable to save offset index for %s: %s', self.filename, os_err )
 
 
 class MultiSourceDataProvider( DataProvider ):
@@ -102,18 +102,23 @@ class ColumnarDataProvider( line.RegexLineDataProvider ):
 
         # how/whether to parse each column value
         self.parsers = {}
+        self.has_custom_parsers = False
         if parse_columns:
             self.parsers = self.get_default_parsers()
             # overwrite with user desired parsers
             self.parsers.update( parsers or {} )
+            self.has_custom_parsers = bool( parsers )
 
         filters = filters or []
         self.column_filters = []
+        # the filter strings that were parsed (used to describe the filtering)
+        self.column_filter_params = []
         for filter_ in filters:
             parsed = self.parse_filter( filter_ )
             #TODO: might be better to error on bad filter/None here
             if callable( parsed ):
                 self.column_filters.append( parsed )
+                self.column_filter_params.append( filter_ )
 
     def parse_filter( self, filter_param_str ):
         split = filter_param_str.split( '-', 2 )
@@ -249,6 +254,16 @@ class ColumnarDataProvider( line.RegexLineDataProvider ):
         columns = self.parse_columns_from_line( line )
         return self.filter_by_columns( columns )
 
+    def filter_signature( self ):
+        signature = super( ColumnarDataProvider, self ).filter_signature()
+        if signature == None or not self.column_filters:
+            return signature
+        # column filters are passed parsed values - which parser functions can't be described
+        if self.has_custom_parsers:
+            return None
+        return signature + repr(( 'columns', self.selected_column_indeces, self.column_types,
+                                  self.deliminator, sorted( self.parsers.keys() ), self.column_filter_params ))
+
     def parse_columns_from_line( self, line ):
         """
         Returns a list of the desired, parsed columns.
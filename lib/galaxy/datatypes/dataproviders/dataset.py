@@ -54,6 +54,14 @@ class DatasetDataProvider( base.DataProvider ):
         #TODO: this might be a good place to interface with the object_store...
         super( DatasetDataProvider, self ).__init__( open( dataset.file_name, 'rb' ) )
 
+    def create_offset_index( self, signature ):
+        """
+        Return an index of positions in the dataset's file for providers with
+        the given filter signature (or `None` if indexing is disabled).
+        .. seealso:: base.OffsetIndex
+        """
+        return base.OffsetIndex.for_dataset( self.dataset.dataset, signature )
+
     #TODO: this is a bit of a mess
     @classmethod
     def get_column_metadata_from_dataset( cls, dataset ):
@@ -83,6 +83,9 @@ class FilteredLineDataProvider( base.LimitedOffsetDataProvider ):
 
         return super( FilteredLineDataProvider, self ).filter( line )
 
+    def filter_signature( self ):
+        return repr(( 'line', self.strip_lines, self.strip_newlines, self.provide_blank, self.comment_char ))
+
 
 class RegexLineDataProvider( FilteredLineDataProvider ):
     """
@@ -123,6 +126,12 @@ class RegexLineDataProvider( FilteredLineDataProvider ):
             line = self.filter_by_regex( line )
         return line
 
+    def filter_signature( self ):
+        signature = super( RegexLineDataProvider, self ).filter_signature()
+        if signature == None or not self.compiled_regex_list:
+            return signature
+        return signature + repr(( 'regex', self.regex_list, self.invert ))
+
     def filter_by_regex( self, line ):
         matches = any([ regex.match( line ) for regex in self.compiled_regex_list ])
         if self.invert:
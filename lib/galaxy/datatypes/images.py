@@ -61,6 +61,7 @@ class Image( data.Data ):
 
 class Jpg( Image ):
     file_ext = "jpg"
+    sniff_magic = ( '\xff\xd8', )
 
     def sniff(self, filename, image=None):
         """Determine if the file is in jpg format."""
@@ -69,6 +70,7 @@ class Jpg( Image ):
 
 class Png( Image ):
     file_ext = "png"
+    sniff_magic = ( '\x89PNG\r\n\x1a\n', )
 
     def sniff(self, filename, image=None):
         """Determine if the file is in png format."""
@@ -77,6 +79,7 @@ class Png( Image ):
 
 class Tiff( Image ):
     file_ext = "tiff"
+    sniff_magic = ( 'II*\x00', 'MM\x00*' )
 
     def sniff(self, filename, image=None):
         """Determine if the file is in tiff format."""
@@ -85,6 +88,7 @@ class Tiff( Image ):
 
 class Bmp( Image ):
     file_ext = "bmp"
+    sniff_magic = ( 'BM', )
 
     def sniff(self, filename, image=None):
         """Determine if the file is in bmp format."""
@@ -93,6 +97,7 @@ class Bmp( Image ):
 
 class Gif( Image ):
     file_ext = "gif"
+    sniff_magic = ( 'GIF87a', 'GIF89a' )
 
     def sniff(self, filename, image=None):
         """Determine if the file is in gif format."""
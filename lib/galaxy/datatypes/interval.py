@@ -49,7 +49,7 @@ class Interval( Tabular ):
     file_ext = "interval"
     line_class = "region"
     track_type = "FeatureTrack"
-    data_sources = { "data": "tabix", "index": "bigwig" }
+    data_sources = { "data": "tabix", "index": [ "summary_pyramid", "bigwig" ] }
 
     """Add metadata elements"""
     MetadataElement( name="chromCol", default=1, desc="Chrom column", param=metadata.ColumnParameter )
@@ -380,7 +380,7 @@ class BedGraph( Interval ):
 class Bed( Interval ):
     """Tab delimited data in BED format"""
     file_ext = "bed"
-    data_sources = { "data": "tabix", "index": "bigwig", "feature_search": "fli" }
+    data_sources = { "data": "tabix", "index": [ "summary_pyramid", "bigwig" ], "feature_search": "fli" }
     track_type = Interval.track_type
 
     """Add metadata elements"""
@@ -597,7 +597,7 @@ class Gff( Tabular, _RemoteCallMixin ):
     """Tab delimited data in Gff format"""
     file_ext = "gff"
     column_names = [ 'Seqname', 'Source', 'Feature', 'Start', 'End', 'Score', 'Strand', 'Frame', 'Group' ]
-    data_sources = { "data": "interval_index", "index": "bigwig", "feature_search": "fli" }
+    data_sources = { "data": "interval_index", "index": [ "summary_pyramid", "bigwig" ], "feature_search": "fli" }
     track_type = Interval.track_type
 
     """Add metadata elements"""
@@ -0,0 +1,219 @@
+"""
+Observers compute metadata (line counts, column types, sequence counts, the
+peek, ...) from the lines of a dataset's file, so that everything a datatype
+needs can be collected from a single buffered read of the file.
+
+Large files can also be scanned by a pool of processes: once all observers
+that are still active only count or summarize lines regardless of their
+order, the rest of the file is split into ranges of whole lines that are
+read (through mmap) by the pool, and the partial results are merged. This is
+enabled by setting GALAXY_METADATA_SCAN_PROCESSES (e.g. in the environment
+of the jobs, for externally set metadata) to the number of processes to use,
+for files of at least GALAXY_METADATA_SCAN_MIN_SIZE bytes.
+"""
+import mmap
+import multiprocessing
+import os
+
+READ_BUFFER_SIZE = 1048576
+
+SCAN_PROCESSES_ENV = 'GALAXY_METADATA_SCAN_PROCESSES'
+SCAN_MIN_SIZE_ENV = 'GALAXY_METADATA_SCAN_MIN_SIZE'
+DEFAULT_SCAN_MIN_SIZE = 268435456
+# The remaining lines are split into this many ranges per process, to even
+# out the work of the processes
+RANGES_PER_PROCESS = 4
+
+
+class FileObserver( object ):
+    """
+    Is fed the lines of a file, in order, by scan_file. observe returns True
+    once the observer needs no more lines; finish is called when the scan is
+    over, whether or not the whole file was read.
+    """
+
+    def observe( self, line ):
+        raise NotImplementedError()
+
+    def finish( self ):
+        pass
+
+    def splittable( self ):
+        """
+        Returns True if the observer needs all remaining lines of the file,
+        but not in order, so that they can be fed in ranges to observers
+        returned by split.
+        """
+        return False
+
+    def split( self ):
+        """
+        Returns a new (picklable) observer to be fed a range of the remaining
+        lines of the file, possibly in another process; its results are
+        added to this observer by merge.
+        """
+        raise NotImplementedError()
+
+    def merge( self, part ):
+        """Adds the results of the observer part (see split) of the next range of lines."""
+        raise NotImplementedError()
+
+
+def scan_processes():
+    """Returns the number of processes to scan large files with (1 to scan in this process only)."""
+    try:
+        return max( int( os.environ.get( SCAN_PROCESSES_ENV, 1 ) ), 1 )
+    except ValueError:
+        return 1
+
+
+def scan_min_size():
+    """Returns the size of the smallest files to scan with multiple processes."""
+    try:
+        return int( os.environ.get( SCAN_MIN_SIZE_ENV, DEFAULT_SCAN_MIN_SIZE ) )
+    except ValueError:
+        return DEFAULT_SCAN_MIN_SIZE
+
+
+def scan_file( file_name, observers, processes=None, min_size=None ):
+    """
+    Reads file_name once, feeding its lines to all observers until each of
+    them is done (or the file ends), then finishes them. Files of at least
+    min_size bytes are scanned with processes processes (both default to the
+    settings from the environment) as far as the observers allow.
+    """
+    if processes is None:
+        processes = scan_processes()
+    if min_size is None:
+        min_size = scan_min_size()
+    active = list( observers )
+    if active:
+        fh = open( file_name, 'rb', READ_BUFFER_SIZE )
+        try:
+            size = os.fstat( fh.fileno() ).st_size
+            if processes > 1 and size >= min_size:
+                _scan_in_parallel( fh, size, active, processes )
+            else:
+                _scan( fh, active )
+        finally:
+            fh.close()
+    for observer in observers:
+        observer.finish()
+    return observers
+
+
+def _observe( line, active ):
+    # Feeds line to the active observers, returns those still active
+    done = [ observer for observer in active if observer.observe( line ) ]
+    if done:
+        return [ observer for observer in active if observer not in done ]
+    return active
+
+
+def _scan( fh, active ):
+    for line in fh:
+        active = _observe( line, active )
+        if not active:
+            break
+
+
+def _scan_in_parallel( fh, size, active, processes ):
+    # Lines are fed in order until the remaining observers can be split
+    offset = 0
+    if [ observer for observer in active if not observer.splittable() ]:
+        for line in fh:
+            offset += len( line )
+            active = _observe( line, active )
+            if not [ observer for observer in active if not observer.splittable() ]:
+                break
+    if not active or offset >= size:
+        return
+    ranges = line_ranges( fh, offset, size, processes * RANGES_PER_PROCESS )
+    tasks = [ ( fh.name, start, end, [ observer.split() for observer in active ] ) for start, end in ranges ]
+    pool = multiprocessing.Pool( processes )
+    try:
+        results = pool.map( _scan_range, tasks )
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    for parts in results:
+        for observer, part in zip( active, parts ):
+            observer.merge( part )
+
+
+def line_ranges( fh, start, end, count ):
+    """
+    Splits the bytes from start to end of the file fh, where a line starts at
+    start, into at most count ( start, end ) ranges of whole lines.
+    """
+    boundaries = [ start ]
+    for i in range( 1, count ):
+        position = start + ( end - start ) * i // count
+        if position <= boundaries[ -1 ]:
+            continue
+        # Move to the start of the first line at or after position
+        fh.seek( position - 1 )
+        fh.readline()
+        position = fh.tell()
+        if boundaries[ -1 ] < position < end:
+            boundaries.append( position )
+    boundaries.append( end )
+    return zip( boundaries[ :-1 ], boundaries[ 1: ] )
+
+
+def _scan_range( task ):
+    # Runs in the pool: feeds the lines from start to end to the parts
+    file_name, start, end, parts = task
+    fh = open( file_name, 'rb' )
+    try:
+        data = mmap.mmap( fh.fileno(), 0, access=mmap.ACCESS_READ )
+        try:
+            pending = ''
+            for block_start in xrange( start, end, READ_BUFFER_SIZE ):
+                lines = ( pending + data[ block_start:min( block_start + READ_BUFFER_SIZE, end ) ] ).split( '\n' )
+                # The last line may continue in the next block
+                pending = lines.pop()
+                for line in lines:
+                    line += '\n'
+                    for part in parts:
+                        part.observe( line )
+            if pending:
+                for part in parts:
+                    part.observe( pending )
+        finally:
+            data.close()
+    finally:
+        fh.close()
+    return parts
+
+
+class DataLinesObserver( FileObserver ):
+    """
+    Counts the lines of data, skipping all blank lines and comments, and sets
+    the data_lines metadata of dataset (if any) to the count.
+    """
+
+    def __init__( self, dataset=None ):
+        self.dataset = dataset
+        self.data_lines = 0
+
+    def observe( self, line ):
+        line = line.strip()
+        if line and not line.startswith( '#' ):
+            self.data_lines += 1
+
+    def finish( self ):
+        if self.dataset is not None:
+            self.dataset.metadata.data_lines = self.data_lines
+
+    def splittable( self ):
+        return True
+
+    def split( self ):
+        return DataLinesObserver()
+
+    def merge( self, part ):
+        self.data_lines += part.data_lines
@@ -17,6 +17,7 @@ from galaxy.datatypes import metadata
 from galaxy.datatypes.checkers import is_gzip
 from galaxy.datatypes.sniff import get_test_fname, get_headers
 from galaxy.datatypes.metadata import MetadataElement
+from galaxy.datatypes.observers import FileObserver, scan_file
 from galaxy.datatypes.util.image_util import check_image_type
 
 try:
@@ -71,6 +72,110 @@ class SequenceSplitLocations( data.Text ):
         return False
 
 
+class SequenceMetadataObserver( FileObserver ):
+    """Sets the number of sequences and the number of data lines of a (FASTA like) sequence dataset."""
+    def __init__( self, dataset=None ):
+        self.dataset = dataset
+        self.data_lines = 0
+        self.sequences = 0
+    def observe( self, line ):
+        line = line.strip()
+        if line and line.startswith( '#' ):
+            # We don't count comment lines for sequence data types
+            return
+        if line and line.startswith( '>' ):
+            self.sequences += 1
+            self.data_lines +=1
+        else:
+            self.data_lines += 1
+    def finish( self ):
+        self.dataset.metadata.data_lines = self.data_lines
+        self.dataset.metadata.sequences = self.sequences
+    def splittable( self ):
+        return True
+    def split( self ):
+        return SequenceMetadataObserver()
+    def merge( self, part ):
+        self.data_lines += part.data_lines
+        self.sequences += part.sequences
+
+
+class FastqMetadataObserver( FileObserver ):
+    """Sets the number of sequences and the number of data lines of a FASTQ dataset."""
+    def __init__( self, dataset ):
+        self.dataset = dataset
+        self.data_lines = 0
+        self.sequences = 0
+        self.seq_counter = 0     # blocks should be 4 lines long
+    def observe( self, line ):
+        line = line.strip()
+        if line and line.startswith( '#' ) and not self.data_lines:
+            # We don't count comment lines for sequence data types
+            return
+        self.seq_counter += 1
+        self.data_lines += 1
+        if line and line.startswith( '@' ):
+            if self.seq_counter >= 4:
+                # count previous block
+                # blocks should be 4 lines long
+                self.sequences += 1
+                self.seq_counter = 1
+    def finish( self ):
+        if self.seq_counter >= 4:
+            # count final block
+            self.sequences += 1
+        self.dataset.metadata.data_lines = self.data_lines
+        self.dataset.metadata.sequences = self.sequences
+    def splittable( self ):
+        # comment lines are only skipped before the first data line
+        return self.data_lines > 0
+    def split( self ):
+        return FastqRangeObserver()
+    def merge( self, part ):
+        seq_counter, sequences = part.counts[ min( self.seq_counter, 4 ) ]
+        self.data_lines += part.data_lines
+        self.sequences += sequences + part.sequences
+        if part.seq_counter is None:
+            self.seq_counter = seq_counter
+        else:
+            self.seq_counter = part.seq_counter
+
+
+class FastqRangeObserver( FileObserver ):
+    """
+    Counts the data lines and sequences of a range of lines from the middle
+    of a FASTQ file for a FastqMetadataObserver. Which '@' lines start a new
+    sequence depends on the number of lines of the block the range starts
+    in, so the range is counted for each such number (counters from 4 on
+    behave alike) until the counters agree, which is usually within a few
+    blocks.
+    """
+    def __init__( self ):
+        self.data_lines = 0
+        # [ seq_counter, sequences ] for each seq_counter at the start of the range
+        self.counts = [ [ seq_counter, 0 ] for seq_counter in range( 5 ) ]
+        # once the counters agree: the common counter and the sequences counted since
+        self.seq_counter = None
+        self.sequences = 0
+    def observe( self, line ):
+        self.data_lines += 1
+        starts_block = line.strip().startswith( '@' )
+        if self.seq_counter is not None:
+            self.seq_counter += 1
+            if starts_block and self.seq_counter >= 4:
+                self.sequences += 1
+                self.seq_counter = 1
+            return
+        for count in self.counts:
+            count[0] += 1
+            if starts_block and count[0] >= 4:
+                count[1] += 1
+                count[0] = 1
+        seq_counter = self.counts[0][0]
+        if not [ count for count in self.counts if count[0] != seq_counter ]:
+            self.seq_counter = seq_counter
+
+
 class Sequence( data.Text ):
     """Class describing a sequence"""
 
@@ -81,20 +186,7 @@ class Sequence( data.Text ):
         """
         Set the number of sequences and the number of data lines in dataset.
         """
-        data_lines = 0
-        sequences = 0
-        for line in file( dataset.file_name ):
-            line = line.strip()
-            if line and line.startswith( '#' ):
-                # We don't count comment lines for sequence data types
-                continue
-            if line and line.startswith( '>' ):
-                sequences += 1
-                data_lines +=1
-            else:
-                data_lines += 1
-        dataset.metadata.data_lines = data_lines
-        dataset.metadata.sequences = sequences
+        scan_file( dataset.file_name, [ SequenceMetadataObserver( dataset ) ] )
     def set_peek( self, dataset, is_multi_byte=False ):
         if not dataset.dataset.purged:
             dataset.peek = data.get_file_peek( dataset.file_name, is_multi_byte=is_multi_byte )
@@ -466,27 +558,7 @@ class Fastq ( Sequence ):
             dataset.metadata.data_lines = None
             dataset.metadata.sequences = None
             return
-        data_lines = 0
-        sequences = 0
-        seq_counter = 0     # blocks should be 4 lines long
-        for line in file( dataset.file_name ):
-            line = line.strip()
-            if line and line.startswith( '#' ) and not data_lines:
-                # We don't count comment lines for sequence data types
-                continue
-            seq_counter += 1
-            data_lines += 1
-            if line and line.startswith( '@' ):
-                if seq_counter >= 4:
-                    # count previous block
-                    # blocks should be 4 lines long
-                    sequences += 1
-                    seq_counter = 1
-        if seq_counter >= 4:
-            # count final block
-            sequences += 1
-        dataset.metadata.data_lines = data_lines
-        dataset.metadata.sequences = sequences
+        scan_file( dataset.file_name, [ FastqMetadataObserver( dataset ) ] )
     def sniff ( self, filename ):
         """
         Determines whether the file is in generic fastq format
@@ -597,7 +669,7 @@ class Maf( Alignment ):
         """
         #these metadata values are not accessable by users, always overwrite
         #Imported here to avoid circular dependency
-        from galaxy.tools.util.maf_utilities import build_maf_index_species_chromosomes
+        from galaxy.tools.util.maf_utilities import build_maf_index_species_chromosomes, write_species_chromosomes
         indexes, species, species_chromosomes, blocks = build_maf_index_species_chromosomes( dataset.file_name )
         if indexes is None:
             return #this is not a MAF file
@@ -609,8 +681,7 @@ class Maf( Alignment ):
         if not chrom_file:
             chrom_file = dataset.metadata.spec['species_chromosomes'].param.new_file( dataset = dataset )
         chrom_out = open( chrom_file.file_name, 'wb' )
-        for spec, chroms in species_chromosomes.items():
-            chrom_out.write( "%s\t%s\n" % ( spec, "\t".join( chroms ) ) )
+        write_species_chromosomes( chrom_out, species, species_chromosomes )
         chrom_out.close()
         dataset.metadata.species_chromosomes = chrom_file
 
@@ -9,6 +9,7 @@ import registry
 import shutil
 import sys
 import tempfile
+import threading
 import zipfile
 
 from encodings import search_function as encodings_search_function
@@ -19,6 +20,68 @@ from galaxy.datatypes.binary import Binary
 
 log = logging.getLogger(__name__)
 
+SNIFF_PREFIX_SIZE = 2**20 # 1Mb
+
+# the prefix of the file guess_ext is currently sniffing in this thread
+_sniffing = threading.local()
+_default_sniff_order = None
+
+class FilePrefix( object ):
+    """
+    The first bytes of a file, read once by guess_ext and shared by all the
+    sniffers it calls (via get_headers and the datatypes' sniff_magic).
+    The contents may also be given, if they were kept while writing the file.
+    """
+    def __init__( self, filename, size=SNIFF_PREFIX_SIZE, contents=None, truncated=False ):
+        self.filename = filename
+        if contents is None:
+            f = open( filename, 'rb' )
+            try:
+                contents = f.read( size )
+                # is there more to the file than we've read?
+                truncated = bool( f.read( 1 ) )
+            finally:
+                f.close()
+        self.contents = contents
+        self.truncated = truncated
+        self._lines = None
+
+    def startswith( self, magic ):
+        """Returns True if the file starts with magic (a string or tuple of strings)"""
+        return self.contents.startswith( magic )
+
+    def get_lines( self, count ):
+        """
+        Returns the first 'count' lines of the file (without the newlines), or None
+        if they're not all in the prefix.
+        """
+        if self._lines is None:
+            lines = self.contents.split( '\n' )
+            # the last piece is either an incomplete line or the end of the file
+            last = lines.pop()
+            if last and not self.truncated:
+                lines.append( last )
+            self._lines = lines
+        if len( self._lines ) < count and self.truncated:
+            return None
+        return self._lines[ :count ]
+
+def get_file_prefix( fname ):
+    """Returns the prefix of fname if it's currently being sniffed, otherwise None"""
+    file_prefix = getattr( _sniffing, 'file_prefix', None )
+    if file_prefix is not None and file_prefix.filename == fname:
+        return file_prefix
+    return None
+
+def get_default_sniff_order():
+    """Returns the sniff_order of the default datatypes registry, which is only loaded once"""
+    global _default_sniff_order
+    if _default_sniff_order is None:
+        datatypes_registry = registry.Registry()
+        datatypes_registry.load_datatypes()
+        _default_sniff_order = datatypes_registry.sniff_order
+    return _default_sniff_order
+
 def get_test_fname(fname):
     """Returns test data filename"""
     path, name = os.path.split(__file__)
@@ -103,15 +166,7 @@ def convert_newlines( fname, in_place=True, tmp_dir=None, tmp_prefix=None ):
     '1 2\\n3 4\\n'
     """
     fd, temp_name = tempfile.mkstemp( prefix=tmp_prefix, dir=tmp_dir )
-    fp = os.fdopen( fd, "wt" )
-    i = None
-    for i, line in enumerate( file( fname, "U" ) ):
-        fp.write( "%s\n" % line.rstrip( "\r\n" ) )
-    fp.close()
-    if i is None:
-        i = 0
-    else:
-        i += 1
+    i = _convert_file( fname, fd )
     if in_place:
         shutil.move( temp_name, fname )
         # Return number of lines in file.
@@ -162,20 +217,101 @@ def convert_newlines_sep2tabs( fname, in_place=True, patt="\\s+", tmp_dir=None,
     >>> file(fname).read()
     '1\\t2\\n3\\t4\\n'
     """
-    regexp = re.compile( patt )
     fd, temp_name = tempfile.mkstemp( prefix=tmp_prefix, dir=tmp_dir )
-    fp = os.fdopen( fd, "wt" )
-    for i, line in enumerate( file( fname, "U" ) ):
-        line  = line.rstrip( '\r\n' )
-        elems = regexp.split( line )
-        fp.write( "%s\n" % '\t'.join( elems ) )
-    fp.close()
+    i = _convert_file( fname, fd, sep2tabs=True, patt=patt )
     if in_place:
         shutil.move( temp_name, fname )
         # Return number of lines in file.
-        return ( i + 1, None )
+        return ( i, None )
     else:
-        return ( i + 1, temp_name )
+        return ( i, temp_name )
+
+def _convert_file( fname, fd, **kwd ):
+    # Writes fname through a NewlineConverter to the file descriptor fd, returns the number of lines
+    fp = os.fdopen( fd, "wb" )
+    try:
+        converter = NewlineConverter( fp, **kwd )
+        f = open( fname, 'rb' )
+        try:
+            while 1:
+                chunk = f.read( NewlineConverter.CHUNK_SIZE )
+                if not chunk:
+                    break
+                converter.write( chunk )
+        finally:
+            f.close()
+        converter.flush()
+    finally:
+        fp.close()
+    return converter.line_count
+
+class NewlineConverter( object ):
+    """
+    Converts the data written to it in chunks from universal line endings to
+    Posix line endings, and optionally 'sep' separated columns to tab
+    separated ones, writing the result to out (a file like object) - as
+    convert_newlines and convert_newlines_sep2tabs do for whole files, but
+    without having to write the data to a file first (e.g. while it is being
+    decompressed). Also counts the lines and keeps the first bytes of the
+    result for sniffing.
+
+    >>> from StringIO import StringIO
+    >>> out = StringIO()
+    >>> converter = NewlineConverter( out, sep2tabs=True )
+    >>> for chunk in [ "1 2\\r", "\\n3  4\\r5", " 6" ]:
+    ...     converter.write( chunk )
+    >>> converter.flush()
+    >>> out.getvalue()
+    '1\\t2\\n3\\t4\\n5\\t6\\n'
+    >>> converter.line_count
+    3
+    """
+    CHUNK_SIZE = 2**20 # 1Mb
+
+    def __init__( self, out, sep2tabs=False, patt="\\s+", prefix_size=SNIFF_PREFIX_SIZE ):
+        self.out = out
+        self.regexp = None
+        if sep2tabs:
+            self.regexp = re.compile( patt )
+        self.prefix_size = prefix_size
+        self.prefix = ''
+        self.size = 0
+        self.line_count = 0
+        # the last, unterminated, line written so far
+        self._pending = ''
+
+    def write( self, chunk ):
+        data = self._pending + chunk
+        cr = ''
+        if data.endswith( '\r' ):
+            # might be followed by a '\n' in the next chunk
+            data, cr = data[ :-1 ], '\r'
+        lines = data.replace( '\r\n', '\n' ).replace( '\r', '\n' ).split( '\n' )
+        self._pending = lines.pop() + cr
+        self._write_lines( lines )
+
+    def flush( self ):
+        """Writes the last line, if it is not terminated."""
+        if self._pending:
+            self._write_lines( [ self._pending.rstrip( '\r' ) ] )
+            self._pending = ''
+
+    def get_file_prefix( self, filename ):
+        """Returns the FilePrefix of filename, the file the result was written to."""
+        return FilePrefix( filename, contents=self.prefix, truncated=self.size > len( self.prefix ) )
+
+    def _write_lines( self, lines ):
+        if not lines:
+            return
+        if self.regexp is not None:
+            lines = [ '\t'.join( self.regexp.split( line ) ) for line in lines ]
+        lines.append( '' )
+        data = '\n'.join( lines )
+        self.out.write( data )
+        self.line_count += len( lines ) - 1
+        if self.size < self.prefix_size:
+            self.prefix += data[ :self.prefix_size - self.size ]
+        self.size += len( data )
 
 def get_headers( fname, sep, count=60, is_multi_byte=False ):
     """
@@ -186,7 +322,14 @@ def get_headers( fname, sep, count=60, is_multi_byte=False ):
     [['chr7', '127475281', '127491632', 'NM_000230', '0', '+', '127486022', '127488767', '0', '3', '29,172,3225,', '0,10713,13126,'], ['chr7', '127486011', '127488900', 'D49487', '0', '+', '127486022', '127488767', '0', '2', '155,490,', '0,2399']]
     """
     headers = []
-    for idx, line in enumerate(file(fname)):
+    lines = None
+    # within guess_ext, the lines are usually in the prefix that was already read
+    file_prefix = get_file_prefix( fname )
+    if file_prefix is not None:
+        lines = file_prefix.get_lines( count + 1 )
+    if lines is None:
+        lines = file(fname)
+    for idx, line in enumerate(lines):
         line = line.rstrip('\n\r')
         if is_multi_byte:
             # TODO: fix this - sep is never found in line
@@ -242,10 +385,11 @@ def is_column_based( fname, sep='\t', skip=0, is_multi_byte=False ):
                 return False
     return True
 
-def guess_ext( fname, sniff_order=None, is_multi_byte=False ):
+def guess_ext( fname, sniff_order=None, is_multi_byte=False, file_prefix=None ):
     """
     Returns an extension that can be used in the datatype factory to
-    generate a data for the 'fname' file
+    generate a data for the 'fname' file. The start of the file is read
+    unless its FilePrefix is given.
 
     >>> fname = get_test_fname('megablast_xml_parser_test1.blastxml')
     >>> guess_ext(fname)
@@ -302,42 +446,52 @@ def guess_ext( fname, sniff_order=None, is_multi_byte=False ):
     'bam'
     """
     if sniff_order is None:
-        datatypes_registry = registry.Registry()
-        datatypes_registry.load_datatypes()
-        sniff_order = datatypes_registry.sniff_order
-    for datatype in sniff_order:
-        """
-        Some classes may not have a sniff function, which is ok.  In fact, the
-        Tabular and Text classes are 2 examples of classes that should never have
-        a sniff function.  Since these classes are default classes, they contain
-        few rules to filter out data of other formats, so they should be called
-        from this function after all other datatypes in sniff_order have not been
-        successfully discovered.
-        """
-        try:
-            if datatype.sniff( fname ):
-                return datatype.file_ext
-        except:
-            pass
-    headers = get_headers( fname, None )
-    is_binary = False
-    if is_multi_byte:
+        sniff_order = get_default_sniff_order()
+    # read the start of the file once for all sniffers
+    if file_prefix is None:
+        file_prefix = FilePrefix( fname )
+    previous_file_prefix = getattr( _sniffing, 'file_prefix', None )
+    _sniffing.file_prefix = file_prefix
+    try:
+        for datatype in sniff_order:
+            """
+            Some classes may not have a sniff function, which is ok.  In fact, the
+            Tabular and Text classes are 2 examples of classes that should never have
+            a sniff function.  Since these classes are default classes, they contain
+            few rules to filter out data of other formats, so they should be called
+            from this function after all other datatypes in sniff_order have not been
+            successfully discovered.
+            """
+            # skip the sniffer if the file can't be of this type
+            sniff_magic = getattr( datatype, 'sniff_magic', None )
+            if sniff_magic and not file_prefix.startswith( sniff_magic ):
+                continue
+            try:
+                if datatype.sniff( fname ):
+                    return datatype.file_ext
+            except:
+                pass
+        headers = get_headers( fname, None )
         is_binary = False
-    else:
-        for hdr in headers:
-            for char in hdr:
-                #old behavior had 'char' possibly having length > 1,
-                #need to determine when/if this occurs
-                is_binary = util.is_binary( char )
+        if is_multi_byte:
+            is_binary = False
+        else:
+            for hdr in headers:
+                for char in hdr:
+                    #old behavior had 'char' possibly having length > 1,
+                    #need to determine when/if this occurs
+                    is_binary = util.is_binary( char )
+                    if is_binary:
+                        break
                 if is_binary:
                     break
-            if is_binary:
-                break
-    if is_binary:
-        return 'data'        #default binary data type file extension
-    if is_column_based( fname, '\t', 1, is_multi_byte=is_multi_byte ):
-        return 'tabular'    #default tabular data type file extension
-    return 'txt'            #default text data type file extension
+        if is_binary:
+            return 'data'        #default binary data type file extension
+        if is_column_based( fname, '\t', 1, is_multi_byte=is_multi_byte ):
+            return 'tabular'    #default tabular data type file extension
+        return 'txt'            #default text data type file extension
+    finally:
+        _sniffing.file_prefix = previous_file_prefix
 
 def handle_compressed_file( filename, datatypes_registry, ext = 'auto' ):
     CHUNK_SIZE = 2**20 # 1Mb
@@ -13,12 +13,196 @@ from galaxy.datatypes import data
 from galaxy.datatypes import metadata
 from galaxy.datatypes.checkers import is_gzip
 from galaxy.datatypes.metadata import MetadataElement
+from galaxy.datatypes.observers import FileObserver, scan_file
 from galaxy.datatypes.sniff import get_headers, get_test_fname
 from galaxy.util.json import dumps
 import dataproviders
 
 log = logging.getLogger(__name__)
 
+class TabularMetadataObserver( FileObserver ):
+    """
+    Sets the data_lines, comment_lines, column_types and columns metadata of
+    a tabular dataset, see Tabular.set_meta.
+    """
+    column_type_set_order = [ 'int', 'float', 'list', 'str'  ] #Order to set column types in
+    default_column_type = column_type_set_order[-1] # Default column type is lowest in list
+    column_type_compare_order = list( reversed( column_type_set_order ) ) #Order to compare column types
+
+    def __init__( self, dataset, skip = None, max_data_lines = 100000, max_guess_type_data_lines = None ):
+        self.dataset = dataset
+        # Store original skip value to check with later
+        self.requested_skip = skip
+        if skip is None:
+            skip = 0
+        self.skip = skip
+        self.max_data_lines = max_data_lines
+        self.max_guess_type_data_lines = max_guess_type_data_lines
+        self.data_lines = 0
+        self.comment_lines = 0
+        self.column_types = []
+        self.first_line_column_types = [ self.default_column_type ] # default value is one column of type str
+        self.i = 0
+        self.bytes_read = 0
+        self._set_is_column_type()
+
+    def _set_is_column_type( self ):
+        self.is_column_type = {} #Dict to store column type string to checking function
+        for column_type in self.column_type_set_order:
+            self.is_column_type[column_type] = getattr( self, "is_%s" % ( column_type ) )
+
+    def __getstate__( self ):
+        # the checking functions are not picklable, see split
+        state = self.__dict__.copy()
+        del state[ 'is_column_type' ]
+        return state
+
+    def __setstate__( self, state ):
+        self.__dict__.update( state )
+        self._set_is_column_type()
+
+    def type_overrules_type( self, column_type1, column_type2 ):
+        if column_type1 is None or column_type1 == column_type2:
+            return False
+        if column_type2 is None:
+            return True
+        for column_type in self.column_type_compare_order:
+            if column_type1 == column_type:
+                return True
+            if column_type2 == column_type:
+                return False
+        #neither column type was found in our ordered list, this cannot happen
+        raise "Tried to compare unknown column types"
+
+    @staticmethod
+    def is_int( column_text ):
+        try:
+            int( column_text )
+            return True
+        except:
+            return False
+
+    @staticmethod
+    def is_float( column_text ):
+        try:
+            float( column_text )
+            return True
+        except:
+            if column_text.strip().lower() == 'na':
+                return True #na is special cased to be a float
+            return False
+
+    @staticmethod
+    def is_list( column_text ):
+        return "," in column_text
+
+    @staticmethod
+    def is_str( column_text ):
+        #anything, except an empty string, is True
+        if column_text == "":
+            return False
+        return True
+
+    def guess_column_type( self, column_text ):
+        for column_type in self.column_type_set_order:
+            if self.is_column_type[column_type]( column_text ):
+                return column_type
+        return None
+
+    def observe( self, line ):
+        self.bytes_read += len( line )
+        i = self.i
+        line = line.rstrip( '\r\n' )
+        if i < self.skip or not line or line.startswith( '#' ):
+            # We'll call blank lines comments
+            self.comment_lines += 1
+        else:
+            self.data_lines += 1
+            column_types = self.column_types
+            if self.max_guess_type_data_lines is None or self.data_lines <= self.max_guess_type_data_lines:
+                fields = line.split( '\t' )
+                for field_count, field in enumerate( fields ):
+                    if field_count >= len( column_types ): #found a previously unknown column, we append None
+                        column_types.append( None )
+                    column_type = self.guess_column_type( field )
+                    if self.type_overrules_type( column_type, column_types[field_count] ):
+                        column_types[field_count] = column_type
+            if i == 0 and self.requested_skip is None:
+                # This is our first line, people seem to like to upload files that have a header line, but do not
+                # start with '#' (i.e. all column types would then most likely be detected as str).  We will assume
+                # that the first line is always a header (this was previous behavior - it was always skipped).  When
+                # the requested skip is None, we only use the data from the first line if we have no other data for
+                # a column.  This is far from perfect, as
+                # 1,2,3	1.1	2.2	qwerty
+                # 0	0		1,2,3
+                # will be detected as
+                # "column_types": ["int", "int", "float", "list"]
+                # instead of
+                # "column_types": ["list", "float", "float", "str"]  *** would seem to be the 'Truth' by manual
+                # observation that the first line should be included as data.  The old method would have detected as
+                # "column_types": ["int", "int", "str", "list"]
+                self.first_line_column_types = column_types
+                self.column_types = [ None for col in self.first_line_column_types ]
+        if self.max_data_lines is not None and self.data_lines >= self.max_data_lines:
+            if self.bytes_read != self.dataset.get_size():
+                self.data_lines = None #Clear optional data_lines metadata value
+                self.comment_lines = None #Clear optional comment_lines metadata value; additional comment lines could appear below this point
+            return True
+        self.i += 1
+        return False
+
+    def splittable( self ):
+        # Once past the first line, the skipped lines and the lines to guess column types from (if limited), the
+        # remaining lines can be counted (and their column types guessed) in any order, unless only the first
+        # max_data_lines are to be read
+        if self.max_data_lines is not None or self.i < max( self.skip, 1 ):
+            return False
+        return self.max_guess_type_data_lines is None or self.data_lines >= self.max_guess_type_data_lines
+
+    def split( self ):
+        max_guess_type_data_lines = None
+        if self.max_guess_type_data_lines is not None:
+            max_guess_type_data_lines = 0
+        part = TabularMetadataObserver( None, skip=0, max_data_lines=None, max_guess_type_data_lines=max_guess_type_data_lines )
+        # Not the first line
+        part.i = 1
+        return part
+
+    def merge( self, part ):
+        self.data_lines += part.data_lines
+        self.comment_lines += part.comment_lines
+        self.bytes_read += part.bytes_read
+        self.i += part.i - 1
+        column_types = self.column_types
+        for field_count, column_type in enumerate( part.column_types ):
+            if field_count >= len( column_types ):
+                column_types.append( None )
+            if self.type_overrules_type( column_type, column_types[field_count] ):
+                column_types[field_count] = column_type
+
+    def finish( self ):
+        column_types = self.column_types
+        first_line_column_types = self.first_line_column_types
+        default_column_type = self.default_column_type
+        #we error on the larger number of columns
+        #first we pad our column_types by using data from first line
+        if len( first_line_column_types ) > len( column_types ):
+            for column_type in first_line_column_types[len( column_types ):]:
+                column_types.append( column_type )
+        #Now we fill any unknown (None) column_types with data from first line
+        for i in range( len( column_types ) ):
+            if column_types[i] is None:
+                if len( first_line_column_types ) <= i or first_line_column_types[i] is None:
+                    column_types[i] = default_column_type
+                else:
+                    column_types[i] = first_line_column_types[i]
+        # Set the discovered metadata values for the dataset
+        dataset = self.dataset
+        dataset.metadata.data_lines = self.data_lines
+        dataset.metadata.comment_lines = self.comment_lines
+        dataset.metadata.column_types = column_types
+        dataset.metadata.columns = len( column_types )
+
 @dataproviders.decorators.has_dataproviders
 class Tabular( data.Text ):
     """Tab delimited data"""
@@ -57,121 +241,12 @@ class Tabular( data.Text ):
            Since metadata can now be processed on cluster nodes, we've merged the line count portion
            of the set_peek() processing here, and we now check the entire contents of the file.
         """
-        # Store original skip value to check with later
-        requested_skip = skip
-        if skip is None:
-            skip = 0
-        column_type_set_order = [ 'int', 'float', 'list', 'str'  ] #Order to set column types in
-        default_column_type = column_type_set_order[-1] # Default column type is lowest in list
-        column_type_compare_order = list( column_type_set_order ) #Order to compare column types
-        column_type_compare_order.reverse()
-        def type_overrules_type( column_type1, column_type2 ):
-            if column_type1 is None or column_type1 == column_type2:
-                return False
-            if column_type2 is None:
-                return True
-            for column_type in column_type_compare_order:
-                if column_type1 == column_type:
-                    return True
-                if column_type2 == column_type:
-                    return False
-            #neither column type was found in our ordered list, this cannot happen
-            raise "Tried to compare unknown column types"
-        def is_int( column_text ):
-            try:
-                int( column_text )
-                return True
-            except:
-                return False
-        def is_float( column_text ):
-            try:
-                float( column_text )
-                return True
-            except:
-                if column_text.strip().lower() == 'na':
-                    return True #na is special cased to be a float
-                return False
-        def is_list( column_text ):
-            return "," in column_text
-        def is_str( column_text ):
-            #anything, except an empty string, is True
-            if column_text == "":
-                return False
-            return True
-        is_column_type = {} #Dict to store column type string to checking function
-        for column_type in column_type_set_order:
-            is_column_type[column_type] = locals()[ "is_%s" % ( column_type ) ]
-        def guess_column_type( column_text ):
-            for column_type in column_type_set_order:
-                if is_column_type[column_type]( column_text ):
-                    return column_type
-            return None
-        data_lines = 0
-        comment_lines = 0
-        column_types = []
-        first_line_column_types = [default_column_type] # default value is one column of type str
+        observer = TabularMetadataObserver( dataset, skip=skip, max_data_lines=max_data_lines, max_guess_type_data_lines=max_guess_type_data_lines )
         if dataset.has_data():
             #NOTE: if skip > num_check_lines, we won't detect any metadata, and will use default
-            dataset_fh = open( dataset.file_name )
-            i = 0
-            while True:
-                line = dataset_fh.readline()
-                if not line: break
-                line = line.rstrip( '\r\n' )
-                if i < skip or not line or line.startswith( '#' ):
-                    # We'll call blank lines comments
-                    comment_lines += 1
-                else:
-                    data_lines += 1
-                    if max_guess_type_data_lines is None or data_lines <= max_guess_type_data_lines:
-                        fields = line.split( '\t' )
-                        for field_count, field in enumerate( fields ):
-                            if field_count >= len( column_types ): #found a previously unknown column, we append None
-                                column_types.append( None )
-                            column_type = guess_column_type( field )
-                            if type_overrules_type( column_type, column_types[field_count] ):
-                                column_types[field_count] = column_type
-                    if i == 0 and requested_skip is None:
-                        # This is our first line, people seem to like to upload files that have a header line, but do not
-                        # start with '#' (i.e. all column types would then most likely be detected as str).  We will assume
-                        # that the first line is always a header (this was previous behavior - it was always skipped).  When
-                        # the requested skip is None, we only use the data from the first line if we have no other data for
-                        # a column.  This is far from perfect, as
-                        # 1,2,3	1.1	2.2	qwerty
-                        # 0	0		1,2,3
-                        # will be detected as
-                        # "column_types": ["int", "int", "float", "list"]
-                        # instead of
-                        # "column_types": ["list", "float", "float", "str"]  *** would seem to be the 'Truth' by manual
-                        # observation that the first line should be included as data.  The old method would have detected as
-                        # "column_types": ["int", "int", "str", "list"]
-                        first_line_column_types = column_types
-                        column_types = [ None for col in first_line_column_types ]
-                if max_data_lines is not None and data_lines >= max_data_lines:
-                    if dataset_fh.tell() != dataset.get_size():
-                        data_lines = None #Clear optional data_lines metadata value
-                        comment_lines = None #Clear optional comment_lines metadata value; additional comment lines could appear below this point
-                    break
-                i += 1
-            dataset_fh.close()
-
-        #we error on the larger number of columns
-        #first we pad our column_types by using data from first line
-        if len( first_line_column_types ) > len( column_types ):
-            for column_type in first_line_column_types[len( column_types ):]:
-                column_types.append( column_type )
-        #Now we fill any unknown (None) column_types with data from first line
-        for i in range( len( column_types ) ):
-            if column_types[i] is None:
-                if len( first_line_column_types ) <= i or first_line_column_types[i] is None:
-                    column_types[i] = default_column_type
-                else:
-                    column_types[i] = first_line_column_types[i]
-        # Set the discovered metadata values for the dataset
-        dataset.metadata.data_lines = data_lines
-        dataset.metadata.comment_lines = comment_lines
-        dataset.metadata.column_types = column_types
-        dataset.metadata.columns = len( column_types )
+            scan_file( dataset.file_name, [ observer ] )
+        else:
+            observer.finish()
     def make_html_table( self, dataset, **kwargs ):
         """Create HTML table, used for displaying peek"""
         out = ['<table cellspacing="0" cellpadding="3">']
@@ -626,7 +701,7 @@ class Pileup( Tabular ):
 class Vcf( Tabular ):
     """ Variant Call Format for describing SNPs and other simple genome variations. """
     track_type = "VariantTrack"
-    data_sources = { "data": "tabix", "index": "bigwig" }
+    data_sources = { "data": "tabix", "index": [ "summary_pyramid", "bigwig" ] }
 
     file_ext = 'vcf'
     column_names = [ 'Chrom', 'Pos', 'ID', 'Ref', 'Alt', 'Qual', 'Filter', 'Info', 'Format', 'data' ]
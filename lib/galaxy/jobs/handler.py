@@ -69,6 +69,12 @@ class JobHandlerQueue( object ):
         self.waiting_jobs = []
         # Contains wrappers of jobs that are limited or ready (so they aren't created unnecessarily/multiple times)
         self.job_wrappers = {}
+        # Tracks the inputs of new jobs so only jobs that may have become ready are queried (only use from monitor thread)
+        self.readiness_tracker = JobReadinessTracker( self.sa_session, self.app.config.server_name )
+        # Ids of the jobs that were ready but held back by limits (only use from monitor thread)
+        self.limited_job_ids = set()
+        self.full_check_interval = self.app.config.job_handler_full_check_interval
+        self.last_full_check = 0
         # Helper for interruptable sleep
         self.sleeper = Sleeper()
         self.running = True
@@ -197,41 +203,20 @@ class JobHandlerQueue( object ):
         if self.track_jobs_in_database:
             # Clear the session so we get fresh states for job and all datasets
             self.sa_session.expunge_all()
-            # Fetch all new jobs
-            hda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
-                    .join(model.JobToInputDatasetAssociation) \
-                    .join(model.HistoryDatasetAssociation) \
-                    .join(model.Dataset) \
-                    .filter(and_( (model.Job.state == model.Job.states.NEW ),
-                                 or_( ( model.HistoryDatasetAssociation._state == model.HistoryDatasetAssociation.states.FAILED_METADATA ),
-                                      ( model.HistoryDatasetAssociation.deleted == True ),
-                                      ( model.Dataset.state != model.Dataset.states.OK ),
-                                      ( model.Dataset.deleted == True) ) ) ).subquery()
-            ldda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
-                    .join(model.JobToInputLibraryDatasetAssociation) \
-                    .join(model.LibraryDatasetDatasetAssociation) \
-                    .join(model.Dataset) \
-                    .filter(and_((model.Job.state == model.Job.states.NEW),
-                                 or_((model.LibraryDatasetDatasetAssociation._state != None),
-                                     (model.LibraryDatasetDatasetAssociation.deleted == True),
-                                     (model.Dataset.state != model.Dataset.states.OK),
-                                     (model.Dataset.deleted == True)))).subquery()
-            if self.app.config.user_activation_on:
-                jobs_to_check = self.sa_session.query(model.Job).enable_eagerloads(False) \
-                        .outerjoin( model.User ) \
-                        .filter(and_((model.Job.state == model.Job.states.NEW),
-                                    or_((model.Job.user_id == None), (model.User.active == True)),
-                                     (model.Job.handler == self.app.config.server_name),
-                                     ~model.Job.table.c.id.in_(hda_not_ready),
-                                     ~model.Job.table.c.id.in_(ldda_not_ready))) \
-                        .order_by(model.Job.id).all()
+            # Only new jobs whose inputs changed state since the last step can
+            # have become ready, except for the occasional full check that
+            # also picks up changes the tracker does not see (e.g. users being
+            # activated). Jobs held back by limits only need to be checked
+            # against the limits again.
+            check_job_ids = self.readiness_tracker.update()
+            now = time.time()
+            if now - self.last_full_check >= self.full_check_interval:
+                self.last_full_check = now
+                jobs_to_check = self.__get_ready_jobs()
             else:
-                jobs_to_check = self.sa_session.query(model.Job).enable_eagerloads(False) \
-                    .filter(and_((model.Job.state == model.Job.states.NEW),
-                                 (model.Job.handler == self.app.config.server_name),
-                                 ~model.Job.table.c.id.in_(hda_not_ready),
-                                 ~model.Job.table.c.id.in_(ldda_not_ready))) \
-                    .order_by(model.Job.id).all()
+                jobs_to_check = self.__get_ready_jobs( check_job_ids - self.limited_job_ids ) + \
+                    self.__get_limited_jobs( self.limited_job_ids )
+                jobs_to_check.sort( key=lambda job: job.id )
             # Fetch all "resubmit" jobs
             resubmit_jobs = self.sa_session.query(model.Job).enable_eagerloads(False) \
                     .filter(and_((model.Job.state == model.Job.states.RESUBMITTED),
@@ -302,6 +287,9 @@ class JobHandlerQueue( object ):
         # Update the waiting list
         if not self.track_jobs_in_database:
             self.waiting_jobs = new_waiting_jobs
+        else:
+            # Jobs waiting on limits have to be checked again in the next step
+            self.limited_job_ids = set( new_waiting_jobs )
         # Remove cached wrappers for any jobs that are no longer being tracked
         for id in self.job_wrappers.keys():
             if id not in new_waiting_jobs:
@@ -311,6 +299,71 @@ class JobHandlerQueue( object ):
         # Done with the session
         self.sa_session.remove()
 
+    def __get_ready_jobs( self, job_ids=None ):
+        """
+        Returns the new jobs of this handler whose inputs are all ready,
+        limited to job_ids (in chunks, to keep the queries small) if given.
+        """
+        if job_ids is None:
+            return self.__ready_jobs_query().all()
+        jobs = []
+        for chunk in _chunks( sorted( job_ids ) ):
+            jobs.extend( self.__ready_jobs_query( chunk ).all() )
+        return jobs
+
+    def __get_limited_jobs( self, job_ids ):
+        """
+        Returns the jobs of job_ids, which were ready but held back by limits,
+        that are still new. Their inputs were ready, so they are looked up by
+        primary key instead of through the readiness query.
+        """
+        jobs = []
+        for chunk in _chunks( sorted( job_ids ) ):
+            jobs.extend( self.sa_session.query( model.Job ).enable_eagerloads( False )
+                         .filter( and_( model.Job.table.c.id.in_( chunk ),
+                                        model.Job.state == model.Job.states.NEW,
+                                        model.Job.handler == self.app.config.server_name ) ).all() )
+        return jobs
+
+    def __ready_jobs_query( self, job_ids=None ):
+        new_jobs = [ model.Job.state == model.Job.states.NEW ]
+        if job_ids is not None:
+            new_jobs.append( model.Job.table.c.id.in_( job_ids ) )
+        hda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
+                .join(model.JobToInputDatasetAssociation) \
+                .join(model.HistoryDatasetAssociation) \
+                .join(model.Dataset) \
+                .filter(and_( and_( *new_jobs ),
+                             or_( ( model.HistoryDatasetAssociation._state == model.HistoryDatasetAssociation.states.FAILED_METADATA ),
+                                  ( model.HistoryDatasetAssociation.deleted == True ),
+                                  ( model.Dataset.state != model.Dataset.states.OK ),
+                                  ( model.Dataset.deleted == True) ) ) ).subquery()
+        ldda_not_ready = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
+                .join(model.JobToInputLibraryDatasetAssociation) \
+                .join(model.LibraryDatasetDatasetAssociation) \
+                .join(model.Dataset) \
+                .filter(and_(and_( *new_jobs ),
+                             or_((model.LibraryDatasetDatasetAssociation._state != None),
+                                 (model.LibraryDatasetDatasetAssociation.deleted == True),
+                                 (model.Dataset.state != model.Dataset.states.OK),
+                                 (model.Dataset.deleted == True)))).subquery()
+        if self.app.config.user_activation_on:
+            return self.sa_session.query(model.Job).enable_eagerloads(False) \
+                    .outerjoin( model.User ) \
+                    .filter(and_(and_( *new_jobs ),
+                                or_((model.Job.user_id == None), (model.User.active == True)),
+                                 (model.Job.handler == self.app.config.server_name),
+                                 ~model.Job.table.c.id.in_(hda_not_ready),
+                                 ~model.Job.table.c.id.in_(ldda_not_ready))) \
+                    .order_by(model.Job.id)
+        else:
+            return self.sa_session.query(model.Job).enable_eagerloads(False) \
+                .filter(and_(and_( *new_jobs ),
+                             (model.Job.handler == self.app.config.server_name),
+                             ~model.Job.table.c.id.in_(hda_not_ready),
+                             ~model.Job.table.c.id.in_(ldda_not_ready))) \
+                .order_by(model.Job.id)
+
     def __check_job_state( self, job ):
         """
         Check if a job is ready to run by verifying that each of its input
@@ -609,6 +662,109 @@ class JobHandlerQueue( object ):
             self.dispatcher.shutdown()
 
 
+def _chunks( ids, size=500 ):
+    """Splits ids into lists short enough for an IN clause."""
+    ids = list( ids )
+    for i in range( 0, len( ids ), size ):
+        yield ids[ i:i + size ]
+
+
+class JobReadinessTracker( object ):
+    """
+    Keeps track of the new jobs of a handler and of their inputs that are not
+    ready yet. Dataset states are changed by other processes, so there is
+    nothing to subscribe to; instead each step looks up the pending inputs by
+    primary key, and only jobs that are new to the tracker or had an input
+    become ready are returned as candidates for the full readiness query.
+    """
+
+    def __init__( self, sa_session, server_name ):
+        self.sa_session = sa_session
+        self.server_name = server_name
+        # The model classes only have tables once galaxy.model.mapping is loaded
+        self.inputs = ( ( 'hda', model.JobToInputDatasetAssociation.table.c.dataset_id, model.HistoryDatasetAssociation ),
+                        ( 'ldda', model.JobToInputLibraryDatasetAssociation.table.c.ldda_id, model.LibraryDatasetDatasetAssociation ) )
+        # job id -> list of ( kind, input id )
+        self.job_inputs = {}
+        # kind -> { input id: set of waiting job ids }
+        self.input_jobs = dict( ( kind, {} ) for kind, column, assoc_class in self.inputs )
+        # kind -> set of input ids that were not ready when last seen
+        self.pending_inputs = dict( ( kind, set() ) for kind, column, assoc_class in self.inputs )
+        self.candidates = set()
+
+    def update( self ):
+        """
+        Synchronizes with the new jobs of this handler and returns the ids of
+        the jobs that may have become ready since the last call.
+        """
+        job_table = model.Job.table
+        new_job_ids = set( row[0] for row in self.sa_session.execute(
+            select( [ job_table.c.id ], and_( job_table.c.state == model.Job.states.NEW,
+                                              job_table.c.handler == self.server_name ) ) ) )
+        for job_id in set( self.job_inputs ) - new_job_ids:
+            self.__forget( job_id )
+        added = new_job_ids - set( self.job_inputs )
+        if added:
+            self.__register( added )
+        for kind, column, assoc_class in self.inputs:
+            self.__poll( kind, assoc_class )
+        candidates = self.candidates
+        self.candidates = set()
+        return candidates
+
+    def __register( self, job_ids ):
+        for job_id in job_ids:
+            self.job_inputs[ job_id ] = []
+        for kind, column, assoc_class in self.inputs:
+            input_ids = set()
+            for chunk in _chunks( job_ids ):
+                for job_id, input_id in self.sa_session.execute(
+                        select( [ column.table.c.job_id, column ], column.table.c.job_id.in_( chunk ) ) ):
+                    if input_id is None:
+                        continue
+                    self.job_inputs[ job_id ].append( ( kind, input_id ) )
+                    self.input_jobs[ kind ].setdefault( input_id, set() ).add( job_id )
+                    input_ids.add( input_id )
+            # Look inputs up in the next poll, the jobs are candidates anyway
+            self.pending_inputs[ kind ].update( input_ids )
+        self.candidates.update( job_ids )
+
+    def __forget( self, job_id ):
+        self.candidates.discard( job_id )
+        for kind, input_id in self.job_inputs.pop( job_id ):
+            waiting = self.input_jobs[ kind ].get( input_id )
+            if waiting is None:
+                continue
+            waiting.discard( job_id )
+            if not waiting:
+                del self.input_jobs[ kind ][ input_id ]
+                self.pending_inputs[ kind ].discard( input_id )
+
+    def __poll( self, kind, assoc_class ):
+        pending = self.pending_inputs[ kind ]
+        if not pending:
+            return
+        assoc_table = assoc_class.table
+        dataset_table = model.Dataset.table
+        if assoc_class is model.HistoryDatasetAssociation:
+            assoc_state_ready = or_( assoc_table.c._state == None,
+                                     assoc_table.c._state != assoc_class.states.FAILED_METADATA )
+        else:
+            assoc_state_ready = assoc_table.c._state == None
+        ready = set()
+        for chunk in _chunks( pending ):
+            ready.update( row[0] for row in self.sa_session.execute(
+                select( [ assoc_table.c.id ], and_( assoc_table.c.id.in_( chunk ),
+                                                    assoc_table.c.dataset_id == dataset_table.c.id,
+                                                    assoc_state_ready,
+                                                    assoc_table.c.deleted == False,
+                                                    dataset_table.c.state == model.Dataset.states.OK,
+                                                    dataset_table.c.deleted == False ) ) ) )
+        for input_id in ready:
+            pending.discard( input_id )
+            self.candidates.update( self.input_jobs[ kind ].get( input_id, () ) )
+
+
 class JobHandlerStopQueue( object ):
     """
     A queue for jobs which need to be terminated prematurely.
@@ -10,6 +10,7 @@ import datetime
 import threading
 import subprocess
 
+from multiprocessing.pool import ThreadPool
 from Queue import Queue, Empty
 
 import galaxy.eggs
@@ -29,6 +30,9 @@ log = logging.getLogger( __name__ )
 
 STOP_SIGNAL = object()
 
+# Factor by which the monitor interval grows while no watched job changes state
+MONITOR_INTERVAL_BACKOFF = 1.5
+
 
 JOB_RUNNER_PARAMETER_UNKNOWN_MESSAGE = "Invalid job runner parameter for this plugin: %s"
 JOB_RUNNER_PARAMETER_MAP_PROBLEM_MESSAGE = "Job runner parameter '%s' value '%s' could not be converted to the correct type"
@@ -462,7 +466,17 @@ class AsynchronousJobRunner( BaseJobRunner ):
     a distributed resource manager).  Provides general methods for having a
     thread to monitor the state of asynchronous jobs and submitting those jobs
     to the correct methods (queue, finish, cleanup) at appropriate times..
+
+    The monitor thread checks the watched jobs every monitor_min_interval
+    seconds, backing off up to monitor_max_interval seconds while none of them
+    change state. Runners that can query the DRM for many jobs in one call
+    override check_watched_items, others implement check_watched_item, which
+    is run in monitor_workers threads at once if more than one is configured.
     """
+    DEFAULT_SPECS = dict( BaseJobRunner.DEFAULT_SPECS,
+                          monitor_workers=dict( map=int, valid=lambda x: x >= 1, default=1 ),
+                          monitor_min_interval=dict( map=float, valid=lambda x: x > 0, default=1.0 ),
+                          monitor_max_interval=dict( map=float, valid=lambda x: x > 0, default=10.0 ) )
 
     def __init__( self, app, nworkers, **kwargs ):
         super( AsynchronousJobRunner, self ).__init__( app, nworkers, **kwargs )
@@ -473,6 +487,8 @@ class AsynchronousJobRunner( BaseJobRunner ):
         # to 'watched' and then manage the watched jobs.
         self.watched = []
         self.monitor_queue = Queue()
+        # Threads for checking watched jobs, created by the monitor thread when needed
+        self.monitor_pool = None
 
     def _init_monitor_thread(self):
         self.monitor_thread = threading.Thread( name="%s.monitor_thread" % self.runner_name, target=self.monitor )
@@ -488,25 +504,53 @@ class AsynchronousJobRunner( BaseJobRunner ):
         Watches jobs currently in the monitor queue and deals with state
         changes (queued to running) and job completion.
         """
+        min_interval = self.runner_params.monitor_min_interval
+        max_interval = max( self.runner_params.monitor_max_interval, min_interval )
+        interval = min_interval
         while 1:
             # Take any new watched jobs and put them on the monitor list
+            new_jobs = False
             try:
                 while 1:
                     async_job_state = self.monitor_queue.get_nowait()
                     if async_job_state is STOP_SIGNAL:
                         # TODO: This is where any cleanup would occur
                         self.handle_stop()
+                        if self.monitor_pool is not None:
+                            self.monitor_pool.close()
                         return
                     self.watched.append( async_job_state )
+                    new_jobs = True
             except Empty:
                 pass
             # Iterate over the list of watched jobs and check state
+            old_states = self.__watched_states()
             try:
                 self.check_watched_items()
             except Exception:
                 log.exception('Unhandled exception checking active jobs')
+            # Check again soon after something happened, less often otherwise
+            if new_jobs or self.__watched_states() != old_states:
+                interval = min_interval
+            else:
+                interval = min( interval * MONITOR_INTERVAL_BACKOFF, max_interval )
             # Sleep a bit before the next state check
-            time.sleep( 1 )
+            time.sleep( interval )
+
+    def __watched_states( self ):
+        return [ ( id( job_state ), job_state.old_state, job_state.running ) for job_state in self.watched ]
+
+    def map_watched( self, func, items ):
+        """
+        Returns [ func( item ) for item in items ], run in the monitor_workers
+        threads if there are several. For use from the monitor thread only.
+        """
+        items = list( items )
+        if self.runner_params.monitor_workers < 2 or len( items ) < 2:
+            return map( func, items )
+        if self.monitor_pool is None:
+            self.monitor_pool = ThreadPool( self.runner_params.monitor_workers )
+        return self.monitor_pool.map( func, items )
 
     def monitor_job(self, job_state):
         self.monitor_queue.put( job_state )
@@ -527,12 +571,19 @@ class AsynchronousJobRunner( BaseJobRunner ):
         reuse the logic here.
         """
         new_watched = []
-        for async_job_state in self.watched:
-            new_async_job_state = self.check_watched_item(async_job_state)
+        for new_async_job_state in self.map_watched( self.__check_watched_item, self.watched ):
             if new_async_job_state:
                 new_watched.append(new_async_job_state)
         self.watched = new_watched
 
+    def __check_watched_item( self, job_state ):
+        try:
+            return self.check_watched_item( job_state )
+        except Exception:
+            # Keep watching the job rather than losing the other jobs' results
+            log.exception( "(%s/%s) Unhandled exception checking job state" % ( job_state.job_wrapper.get_id_tag(), job_state.job_id ) )
+            return job_state
+
     # Subclasses should implement this unless they override check_watched_items all together.
     def check_watched_item(self, job_state):
         raise NotImplementedError()
@@ -21,9 +21,9 @@ class ShellJobRunner( AsynchronousJobRunner ):
     """
     runner_name = "ShellRunner"
 
-    def __init__( self, app, nworkers ):
+    def __init__( self, app, nworkers, **kwargs ):
         """Start the job runner """
-        super( ShellJobRunner, self ).__init__( app, nworkers )
+        super( ShellJobRunner, self ).__init__( app, nworkers, **kwargs )
 
         self.cli_interface = CliInterface()
         self._init_monitor_thread()
@@ -126,12 +126,15 @@ class ShellJobRunner( AsynchronousJobRunner ):
         """
         new_watched = []
 
-        job_states = self.__get_job_states()
+        job_states, failed_destinations = self.__get_job_states()
 
         for ajs in self.watched:
             external_job_id = ajs.job_id
             id_tag = ajs.job_wrapper.get_id_tag()
             old_state = ajs.old_state
+            if ajs.job_destination.id in failed_destinations:
+                new_watched.append( ajs )
+                continue
             state = job_states.get(external_job_id, None)
             if state is None:
                 if ajs.job_wrapper.get_state() == model.Job.states.DELETED:
@@ -162,8 +165,14 @@ class ShellJobRunner( AsynchronousJobRunner ):
         self.watched = new_watched
 
     def __get_job_states(self):
+        """
+        Returns the states of the watched jobs, checked with one status command
+        per destination (run concurrently if there are monitor_workers), and
+        the ids of the destinations whose status command failed.
+        """
         job_destinations = {}
         job_states = {}
+        failed_destinations = set()
         # unique the list of destinations
         for ajs in self.watched:
             if ajs.job_destination.id not in job_destinations:
@@ -171,15 +180,26 @@ class ShellJobRunner( AsynchronousJobRunner ):
             else:
                 job_destinations[ajs.job_destination.id]['job_ids'].append( ajs.job_id )
         # check each destination for the listed job ids
-        for job_destination_id, v in job_destinations.items():
-            job_destination = v['job_destination']
-            job_ids = v['job_ids']
+        destinations = job_destinations.values()
+        for v, states in zip( destinations, self.map_watched( self.__get_destination_job_states, destinations ) ):
+            if states is None:
+                failed_destinations.add( v['job_destination'].id )
+            else:
+                job_states.update( states )
+        return job_states, failed_destinations
+
+    def __get_destination_job_states(self, v):
+        job_destination = v['job_destination']
+        job_ids = v['job_ids']
+        try:
             shell_params, job_params = self.parse_destination_params(job_destination.params)
             shell, job_interface = self.get_cli_plugins(shell_params, job_params)
             cmd_out = shell.execute(job_interface.get_status(job_ids))
             assert cmd_out.returncode == 0, cmd_out.stderr
-            job_states.update(job_interface.parse_status(cmd_out.stdout, job_ids))
-        return job_states
+            return job_interface.parse_status(cmd_out.stdout, job_ids)
+        except Exception:
+            log.exception( "Unable to check the state of jobs at destination %s, will retry" % job_destination.id )
+            return None
 
     def finish_job( self, job_state ):
         """For recovery of jobs started prior to standardizing the naming of
@@ -227,67 +227,63 @@ class DRMAAJobRunner( AsynchronousJobRunner ):
         elif drmaa_state == drmaa.JobState.DONE:
             super( DRMAAJobRunner, self )._complete_terminal_job( ajs )
 
-    def check_watched_items( self ):
+    def check_watched_item( self, ajs ):
         """
-        Called by the monitor thread to look at each watched job and deal
-        with state changes.
+        Called by the monitor thread (possibly from several threads at once,
+        see monitor_workers) to look at a watched job and deal with state
+        changes. Returns the job state if the job is still to be watched.
         """
-        new_watched = []
-        for ajs in self.watched:
-            external_job_id = ajs.job_id
-            galaxy_id_tag = ajs.job_wrapper.get_id_tag()
-            old_state = ajs.old_state
-            try:
-                assert external_job_id not in ( None, 'None' ), '(%s/%s) Invalid job id' % ( galaxy_id_tag, external_job_id )
-                state = self.ds.jobStatus( external_job_id )
-            except ( drmaa.InternalException, drmaa.InvalidJobException ), e:
-                if isinstance( e , drmaa.InvalidJobException ):
-                    ecn = "InvalidJobException".lower()
-                else:
-                    ecn = "InternalException".lower()
-                retry_param = ecn.lower() + '_retries'
-                state_param = ecn.lower() + '_state'
-                retries = getattr( ajs, retry_param, 0 )
-                if self.runner_params[ retry_param ] > 0:
-                    if retries < self.runner_params[ retry_param ]:
-                        # will retry check on next iteration
-                        setattr( ajs, retry_param, retries + 1 )
-                        continue
-                if self.runner_params[ state_param ] == model.Job.states.OK:
-                    log.info( "(%s/%s) job left DRM queue with following message: %s", galaxy_id_tag, external_job_id, e )
-                    self.work_queue.put( ( self.finish_job, ajs ) )
-                elif self.runner_params[ state_param ] == model.Job.states.ERROR:
-                    log.info( "(%s/%s) job check resulted in %s after %s tries: %s", galaxy_id_tag, external_job_id, ecn, retries, e )
-                    self.work_queue.put( ( self.fail_job, ajs ) )
-                else:
-                    raise Exception( "%s is set to an invalid value (%s), this should not be possible. See galaxy.jobs.drmaa.__init__()", state_param, self.runner_params[ state_param ] )
-                continue
-            except drmaa.DrmCommunicationException, e:
-                log.warning( "(%s/%s) unable to communicate with DRM: %s", galaxy_id_tag, external_job_id, e )
-                new_watched.append( ajs )
-                continue
-            except Exception, e:
-                # so we don't kill the monitor thread
-                log.exception( "(%s/%s) Unable to check job status: %s" % ( galaxy_id_tag, external_job_id, str( e ) ) )
-                log.warning( "(%s/%s) job will now be errored" % ( galaxy_id_tag, external_job_id ) )
-                ajs.fail_message = "Cluster could not complete job"
-                self.work_queue.put( ( self.fail_job, ajs ) )
-                continue
-            if state != old_state:
-                log.debug( "(%s/%s) state change: %s" % ( galaxy_id_tag, external_job_id, self.drmaa_job_state_strings[state] ) )
-            if state == drmaa.JobState.RUNNING and not ajs.running:
-                ajs.running = True
-                ajs.job_wrapper.change_state( model.Job.states.RUNNING )
-            if state in ( drmaa.JobState.FAILED, drmaa.JobState.DONE ):
-                self._complete_terminal_job( ajs, drmaa_state = state )
-                continue
-            if ajs.check_limits():
+        external_job_id = ajs.job_id
+        galaxy_id_tag = ajs.job_wrapper.get_id_tag()
+        old_state = ajs.old_state
+        try:
+            assert external_job_id not in ( None, 'None' ), '(%s/%s) Invalid job id' % ( galaxy_id_tag, external_job_id )
+            state = self.ds.jobStatus( external_job_id )
+        except ( drmaa.InternalException, drmaa.InvalidJobException ), e:
+            if isinstance( e , drmaa.InvalidJobException ):
+                ecn = "InvalidJobException".lower()
+            else:
+                ecn = "InternalException".lower()
+            retry_param = ecn.lower() + '_retries'
+            state_param = ecn.lower() + '_state'
+            retries = getattr( ajs, retry_param, 0 )
+            if self.runner_params[ retry_param ] > 0:
+                if retries < self.runner_params[ retry_param ]:
+                    # will retry check on next iteration
+                    setattr( ajs, retry_param, retries + 1 )
+                    return ajs
+            if self.runner_params[ state_param ] == model.Job.states.OK:
+                log.info( "(%s/%s) job left DRM queue with following message: %s", galaxy_id_tag, external_job_id, e )
+                self.work_queue.put( ( self.finish_job, ajs ) )
+            elif self.runner_params[ state_param ] == model.Job.states.ERROR:
+                log.info( "(%s/%s) job check resulted in %s after %s tries: %s", galaxy_id_tag, external_job_id, ecn, retries, e )
                 self.work_queue.put( ( self.fail_job, ajs ) )
-                continue
-            ajs.old_state = state
-            new_watched.append( ajs )
-        # Replace the watch list with the updated version
-        self.watched = new_watched
+            else:
+                raise Exception( "%s is set to an invalid value (%s), this should not be possible. See galaxy.jobs.drmaa.__init__()", state_param, self.runner_params[ state_param ] )
+            return None
+        except drmaa.DrmCommunicationException, e:
+            log.warning( "(%s/%s) unable to communicate with DRM: %s", galaxy_id_tag, external_job_id, e )
+            return ajs
+        except Exception, e:
+            # so we don't kill the monitor thread
+            log.exception( "(%s/%s) Unable to check job status: %s" % ( galaxy_id_tag, external_job_id, str( e ) ) )
+            log.warning( "(%s/%s) job will now be errored" % ( galaxy_id_tag, external_job_id ) )
+            ajs.fail_message = "Cluster could not complete job"
+            self.work_queue.put( ( self.fail_job, ajs ) )
+            return None
+        if state != old_state:
+            log.debug( "(%s/%s) state change: %s" % ( galaxy_id_tag, external_job_id, self.drmaa_job_state_strings[state] ) )
+        if state == drmaa.JobState.RUNNING and not ajs.running:
+            ajs.running = True
+            ajs.job_wrapper.change_state( model.Job.states.RUNNING )
+        if state in ( drmaa.JobState.FAILED, drmaa.JobState.DONE ):
+            self._complete_terminal_job( ajs, drmaa_state = state )
+            return None
+        if ajs.check_limits():
+            self.work_queue.put( ( self.fail_job, ajs ) )
+            return None
+        ajs.old_state = state
+        return ajs
 
     def stop_job( self, job ):
         """Attempts to delete a job from the DRM queue"""
@@ -96,7 +96,7 @@ class PBSJobRunner( AsynchronousJobRunner ):
     """
     runner_name = "PBSRunner"
 
-    def __init__( self, app, nworkers ):
+    def __init__( self, app, nworkers, **kwargs ):
         """Start the job runner """
         # Check if PBS was importable, fail if not
         if pbs is None:
@@ -109,7 +109,7 @@ class PBSJobRunner( AsynchronousJobRunner ):
         self.default_pbs_server     # this is a method with a property decorator, so this causes the default server to be set
 
         # Proceed with general initialization
-        super( PBSJobRunner, self ).__init__( app, nworkers )
+        super( PBSJobRunner, self ).__init__( app, nworkers, **kwargs )
         self._init_monitor_thread()
         self._init_worker_threads()
 
@@ -117,7 +117,14 @@ class ProvidesUserContext( object ):
     def get_current_user_roles( self ):
         user = self.user
         if user:
-            roles = user.all_roles()
+            # Looking up the roles of the user (and their groups) takes several
+            # queries and permission checks ask for them over and over, so they
+            # are kept for the rest of the transaction, unless the user changes.
+            cached_user, roles = getattr( self, '_current_user_roles', ( None, None ) )
+            if cached_user is not user:
+                roles = user.all_roles()
+                self._current_user_roles = ( user, roles )
+            roles = list( roles )
         else:
             roles = []
         return roles
@@ -8,11 +8,16 @@ history.
 import os
 import gettext
 
+from sqlalchemy.sql import select
+from sqlalchemy.sql.expression import func
+from sqlalchemy import or_
+
 from galaxy import model
 from galaxy import exceptions
 from galaxy import datatypes
 import galaxy.datatypes.metadata
 from galaxy import objectstore
+from galaxy.util import string_as_bool_or_none
 
 from galaxy.managers import datasets
 from galaxy.managers import secured
@@ -23,6 +28,9 @@ from galaxy.managers import users
 import logging
 log = logging.getLogger( __name__ )
 
+# stands in for the encoded id when building the url of many summaries at once
+SUMMARY_URL_ID_PLACEHOLDER = '__summary_id__'
+
 
 class HDAManager( datasets.DatasetAssociationManager, secured.OwnableManagerMixin,
         taggable.TaggableManagerMixin, annotatable.AnnotatableManagerMixin ):
@@ -187,6 +195,37 @@ class HDAManager( datasets.DatasetAssociationManager, secured.OwnableManagerMixi
     #def by_history( self, trans, history, filters=None, **kwargs ):
     #    return history.datasets
 
+    def summary_rows( self, history, deleted=None, visible=None, hid_gt=None, since=None, limit=None ):
+        """
+        Return rows of the columns that the summary view of the HDAs in `history`
+        is built from, ordered by hid.
+
+        Only those columns are selected, in one query joined with the datasets,
+        so no HDA objects are loaded. The filters work as in
+        `History.contents_iter`.
+        """
+        hda = model.HistoryDatasetAssociation.table
+        dataset = model.Dataset.table
+        # an HDA's own state (set while setting metadata externally) overrides its dataset's
+        state = func.coalesce( func.nullif( hda.c._state, '' ), dataset.c.state ).label( 'state' )
+        query = select( [ hda.c.id, hda.c.history_id, hda.c.hid, hda.c.name, hda.c.dataset_id, hda.c.extension,
+                          hda.c.deleted, hda.c.purged, hda.c.visible, state ],
+                        from_obj=[ hda.join( dataset, hda.c.dataset_id == dataset.c.id ) ] )
+        query = query.where( hda.c.history_id == history.id ).order_by( hda.c.hid.asc() )
+        deleted = string_as_bool_or_none( deleted )
+        if deleted is not None:
+            query = query.where( hda.c.deleted == deleted )
+        visible = string_as_bool_or_none( visible )
+        if visible is not None:
+            query = query.where( hda.c.visible == visible )
+        if hid_gt is not None:
+            query = query.where( hda.c.hid > hid_gt )
+        if since is not None:
+            query = query.where( or_( hda.c.update_time > since, dataset.c.update_time > since ) )
+        if limit is not None:
+            query = query.limit( limit )
+        return self.app.model.context.execute( query ).fetchall()
+
     # .... associated
     def creating_job( self, trans, hda ):
         #TODO: is this needed? Can't you use the hda.creating_job attribute? When is this None?
@@ -470,6 +509,38 @@ class HDASerializer( datasets.DatasetAssociationSerializer,
             'type'          : lambda *a: 'file'
         })
 
+    def serialize_summary_rows( self, trans, rows ):
+        """
+        Serialize rows returned by `HDAManager.summary_rows` to the same dictionaries
+        as the 'summary' view, without loading the HDAs.
+        """
+        encode_id = self.app.security.encode_id
+        # the url only differs by id, so build it once per history and substitute the id
+        url_templates = {}
+        serialized = []
+        for row in rows:
+            encoded_id = encode_id( row.id )
+            encoded_history_id = encode_id( row.history_id )
+            if row.history_id not in url_templates:
+                url_templates[ row.history_id ] = self.url_for( 'history_content',
+                    history_id=encoded_history_id, id=SUMMARY_URL_ID_PLACEHOLDER )
+            serialized.append({
+                'id'            : encoded_id,
+                'name'          : row.name,
+                'history_id'    : encoded_history_id,
+                'hid'           : row.hid,
+                'history_content_type': 'dataset',
+                'dataset_id'    : encode_id( row.dataset_id ) if row.dataset_id is not None else None,
+                'state'         : row.state,
+                'extension'     : row.extension,
+                'deleted'       : row.deleted,
+                'purged'        : row.purged,
+                'visible'       : row.visible,
+                'type'          : 'file',
+                'url'           : url_templates[ row.history_id ].replace( SUMMARY_URL_ID_PLACEHOLDER, encoded_id ),
+            })
+        return serialized
+
     def serialize( self, trans, hda, keys ):
         """
         Override to add metadata as flattened keys on the serialized HDA.
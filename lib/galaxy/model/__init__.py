@@ -22,12 +22,14 @@ from datetime import datetime, timedelta
 from uuid import UUID, uuid4
 from string import Template
 from itertools import ifilter
+from itertools import islice
 from itertools import chain
 
 import galaxy.datatypes
 import galaxy.datatypes.registry
 import galaxy.security.passwords
 from galaxy.datatypes.metadata import MetadataCollection
+from galaxy.datatypes.dataproviders.base import OffsetIndex
 from galaxy.model.item_attrs import Dictifiable, UsesAnnotations
 import galaxy.model.orm.now
 from galaxy.security import get_permitted_actions
@@ -1137,6 +1139,12 @@ class History( object, Dictifiable, UsesAnnotations, HasName ):
     def contents_iter( self, **kwds ):
         """
         Fetch filtered list of contents of history.
+
+        Besides the types, deleted, visible and ids filters, contents can be
+        fetched a page at a time: hid_gt only returns contents with a greater
+        hid, limit at most that many contents, and since only the datasets
+        updated after that datetime (collections have no update time and are
+        always returned).
         """
         default_contents_types = [
             'dataset',
@@ -1147,7 +1155,11 @@ class History( object, Dictifiable, UsesAnnotations, HasName ):
             iters.append( self.__dataset_contents_iter( **kwds ) )
         if 'dataset_collection' in types:
             iters.append( self.__collection_contents_iter( **kwds ) )
-        return galaxy.util.merge_sorted_iterables( operator.attrgetter( "hid" ), *iters )
+        contents = galaxy.util.merge_sorted_iterables( operator.attrgetter( "hid" ), *iters )
+        limit = kwds.get( 'limit', None )
+        if limit is not None:
+            contents = islice( contents, limit )
+        return contents
 
     def __dataset_contents_iter(self, **kwds):
         return self.__filter_contents( HistoryDatasetAssociation, **kwds )
@@ -1164,6 +1176,14 @@ class History( object, Dictifiable, UsesAnnotations, HasName ):
         visible = galaxy.util.string_as_bool_or_none( kwds.get( 'visible', None ) )
         if visible is not None:
             query = query.filter( content_class.visible == visible )
+        hid_gt = kwds.get( 'hid_gt', None )
+        if hid_gt is not None:
+            query = query.filter( content_class.table.c.hid > hid_gt )
+        since = kwds.get( 'since', None )
+        if since is not None and content_class is HistoryDatasetAssociation:
+            # The state of the dataset may have changed without updating the HDA
+            query = query.filter( or_( content_class.table.c.update_time > since,
+                                       content_class.dataset.has( Dataset.table.c.update_time > since ) ) )
         if 'ids' in kwds:
             ids = kwds['ids']
             max_in_filter_length = kwds.get('max_in_filter_length', MAX_IN_FILTER_LENGTH)
@@ -1174,6 +1194,9 @@ class History( object, Dictifiable, UsesAnnotations, HasName ):
         if python_filter:
             return ifilter(python_filter, query)
         else:
+            limit = kwds.get( 'limit', None )
+            if limit is not None:
+                query = query.limit( limit )
             return query
 
     def __collection_contents_iter( self, **kwds ):
@@ -1475,6 +1498,7 @@ class Dataset( object ):
         self.object_store.delete(self)
         if self.object_store.exists(self, extra_dir=self._extra_files_path or "dataset_%d_files" % self.id, dir_only=True):
             self.object_store.delete(self, entire_dir=True, extra_dir=self._extra_files_path or "dataset_%d_files" % self.id, dir_only=True)
+        OffsetIndex.remove_for_dataset( self )
         # if os.path.exists( self.extra_files_path ):
         #     shutil.rmtree( self.extra_files_path )
         # TODO: purge metadata files
@@ -12,6 +12,9 @@ from galaxy.model.orm import *
 
 log = logging.getLogger(__name__)
 
+# Number of dataset ids per query when evaluating permissions in bulk
+DATASET_IDS_PER_QUERY = 1000
+
 
 class Action( object ):
     def __init__( self, action, description, model ):
@@ -53,6 +56,9 @@ class RBACAgent:
     def can_access_dataset( self, roles, dataset ):
         raise "Unimplemented Method"
 
+    def can_access_datasets( self, roles, dataset_ids ):
+        raise "Unimplemented Method"
+
     def can_manage_dataset( self, roles, dataset ):
         raise "Unimplemented Method"
 
@@ -86,7 +92,7 @@ class RBACAgent:
     def history_set_default_permissions( self, history, permissions=None, dataset=False, bypass_manage_permission=False ):
         raise "Unimplemented Method"
 
-    def set_all_dataset_permissions( self, dataset, permissions ):
+    def set_all_dataset_permissions( self, dataset, permissions, flush=True ):
         raise "Unimplemented Method"
 
     def set_dataset_permission( self, dataset, permission ):
@@ -613,6 +619,28 @@ class GalaxyRBACAgent( RBACAgent ):
         retval = self.dataset_is_public( dataset ) or self.allow_action( user_roles, self.permitted_actions.DATASET_ACCESS, dataset )
         return retval
 
+    def can_access_datasets( self, user_roles, dataset_ids ):
+        """
+        Return a mapping of each of dataset_ids to whether a user with user_roles
+        can access that dataset. This applies the rules of can_access_dataset
+        (a dataset without access permissions is public, otherwise the user must
+        have all of its access roles) to many datasets at once, selecting just
+        the (dataset id, role id) pairs of the access permissions instead of
+        loading the permissions of each dataset separately.
+        """
+        user_role_ids = set( role.id for role in user_roles )
+        can_access = dict.fromkeys( dataset_ids, True )
+        dataset_ids = can_access.keys()
+        permissions = self.model.DatasetPermissions.table
+        for i in range( 0, len( dataset_ids ), DATASET_IDS_PER_QUERY ):
+            query = select( [ permissions.c.dataset_id, permissions.c.role_id ],
+                            and_( permissions.c.dataset_id.in_( dataset_ids[ i:i + DATASET_IDS_PER_QUERY ] ),
+                                  permissions.c.action == self.permitted_actions.DATASET_ACCESS.action ) )
+            for dataset_id, role_id in self.sa_session.execute( query ):
+                if role_id not in user_role_ids:
+                    can_access[ dataset_id ] = False
+        return can_access
+
     def can_manage_dataset( self, roles, dataset ):
         return self.allow_action( roles, self.permitted_actions.DATASET_MANAGE_PERMISSIONS, dataset )
 
@@ -870,10 +898,11 @@ class GalaxyRBACAgent( RBACAgent ):
                 permissions[ action ] = [ dhp.role ]
         return permissions
 
-    def set_all_dataset_permissions( self, dataset, permissions={} ):
+    def set_all_dataset_permissions( self, dataset, permissions={}, flush=True ):
         """
         Set new full permissions on a dataset, eliminating all current permissions.
         Permission looks like: { Action : [ Role, Role ] }
+        The permissions are flushed unless flush is False.
         """
         # Make sure that DATASET_MANAGE_PERMISSIONS is associated with at least 1 role
         has_dataset_manage_permissions = False
@@ -899,7 +928,7 @@ class GalaxyRBACAgent( RBACAgent ):
             for dp in [ self.model.DatasetPermissions( action, dataset, role ) for role in roles ]:
                 self.sa_session.add( dp )
                 flush_needed = True
-        if flush_needed:
+        if flush_needed and flush:
             self.sa_session.flush()
         return ""
 
@@ -149,13 +149,20 @@ class DefaultToolAction( object ):
         tool.visit_inputs( param_values, visitor )
         return input_dataset_collections
 
-    def execute(self, tool, trans, incoming={}, return_job=False, set_output_hid=True, set_output_history=True, history=None, job_params=None, rerun_remap_job_id=None, mapping_over_collection=False):
+    def execute(self, tool, trans, incoming={}, return_job=False, set_output_hid=True, set_output_history=True, history=None, job_params=None, rerun_remap_job_id=None, mapping_over_collection=False, execution_cache=None):
         """
         Executes a tool, creating job and tool outputs, associating them, and
         submitting the job to the job queue. If history is not specified, use
         trans.history as destination for tool's output datasets.
+
+        If an `execution_cache` is given, lookups are shared with the other
+        executions using it, and the job is left for the cache to flush and
+        queue (see `ToolExecutionCache.flush_and_queue_jobs`).
         """
         assert tool.allow_user_access( trans.user ), "User (%s) is not allowed to access this tool." % ( trans.user )
+        flush_job = execution_cache is None
+        if execution_cache is None:
+            execution_cache = ToolExecutionCache( trans )
         # Set history.
         if not history:
             history = tool.get_default_history_by_trans( trans, create=True )
@@ -196,7 +203,7 @@ class DefaultToolAction( object ):
                 incoming[ "%s|__identifier__" % name ] = identifier
 
         # Collect chromInfo dataset and add as parameters to incoming
-        ( chrom_info, db_dataset ) = trans.app.genome_builds.get_chrom_info( input_dbkey, trans=trans, custom_build_hack_get_len_from_fasta_conversion=tool.id != 'CONVERTER_fasta_to_len' )
+        ( chrom_info, db_dataset ) = execution_cache.get_chrom_info( tool.id, input_dbkey )
         if db_dataset:
             inp_data.update( { "chromInfo": db_dataset } )
         incoming[ "chromInfo" ] = chrom_info
@@ -207,7 +214,7 @@ class DefaultToolAction( object ):
             output_permissions = trans.app.security_agent.guess_derived_permissions_for_datasets( existing_datasets )
         else:
             # No valid inputs, we will use history defaults
-            output_permissions = trans.app.security_agent.history_get_default_permissions( history )
+            output_permissions = execution_cache.get_history_default_permissions( history )
 
         # Build name for output datasets based on tool name and input names
         on_text = on_text_for_names( input_names )
@@ -220,6 +227,7 @@ class DefaultToolAction( object ):
         # datasets first, then create the associations
         parent_to_child_pairs = []
         child_dataset_names = set()
+        # All outputs of a job end up in the same object store
         object_store_populator = ObjectStorePopulator( trans.app )
 
         def handle_output( name, output ):
@@ -240,12 +248,17 @@ class DefaultToolAction( object ):
                 data = trans.app.model.HistoryDatasetAssociation( extension=ext, create_dataset=True, sa_session=trans.sa_session )
                 if output.hidden:
                     data.visible = False
-                # Commit the dataset immediately so it gets database assigned unique id
                 trans.sa_session.add( data )
-                trans.sa_session.flush()
-                trans.app.security_agent.set_all_dataset_permissions( data.dataset, output_permissions )
+                if flush_job:
+                    # Commit the dataset immediately so it gets database assigned unique id
+                    trans.sa_session.flush()
+                trans.app.security_agent.set_all_dataset_permissions( data.dataset, output_permissions, flush=flush_job )
 
-            object_store_populator.set_object_store_id( data )
+            if flush_job:
+                object_store_populator.set_object_store_id( data )
+            else:
+                # The file is created once the batch is flushed and the dataset has an id
+                execution_cache.unflushed_outputs.append( ( object_store_populator, data ) )
 
             # This may not be neccesary with the new parent/child associations
             data.designation = name
@@ -278,7 +291,8 @@ class DefaultToolAction( object ):
                 output_action_params.update( incoming )
                 output.actions.apply_action( data, output_action_params )
             # Store all changes to database
-            trans.sa_session.flush()
+            if flush_job:
+                trans.sa_session.flush()
             return data
 
         for name, output in tool.outputs.items():
@@ -303,7 +317,8 @@ class DefaultToolAction( object ):
                         if set_output_history:
                             history.add_dataset( element, set_hid=set_output_hid )
                         trans.sa_session.add( element )
-                        trans.sa_session.flush()
+                        if flush_job:
+                            trans.sa_session.flush()
 
                         elements[ output_part_def.element_identifier ] = element
 
@@ -339,14 +354,16 @@ class DefaultToolAction( object ):
                 if set_output_history:
                     history.add_dataset( data, set_hid=set_output_hid )
                 trans.sa_session.add( data )
-                trans.sa_session.flush()
+                if flush_job:
+                    trans.sa_session.flush()
         # Add all the children to their parents
         for parent_name, child_name in parent_to_child_pairs:
             parent_dataset = out_data[ parent_name ]
             child_dataset = out_data[ child_name ]
             parent_dataset.children.append( child_dataset )
         # Store data after custom code runs
-        trans.sa_session.flush()
+        if flush_job:
+            trans.sa_session.flush()
         # Create the job object
         job = trans.app.model.Job()
 
@@ -376,10 +393,9 @@ class DefaultToolAction( object ):
             job.add_input_dataset_collection( name, dataset_collection )
         for name, value in tool.params_to_strings( incoming, trans.app ).iteritems():
             job.add_parameter( name, value )
-        current_user_roles = trans.get_current_user_roles()
         for name, dataset in inp_data.iteritems():
             if dataset:
-                if not trans.app.security_agent.can_access_dataset( current_user_roles, dataset.dataset ):
+                if not trans.app.security_agent.can_access_dataset( execution_cache.current_user_roles, dataset.dataset ):
                     raise "User does not have permission to use a dataset (%s) provided for input." % data.id
                 job.add_input_dataset( name, dataset )
             else:
@@ -429,7 +445,13 @@ class DefaultToolAction( object ):
                     trans.sa_session.add(jtod)
             except Exception, e:
                 log.exception('Cannot remap rerun dependencies.')
-        trans.sa_session.flush()
+        if 'REDIRECT_URL' in incoming and not flush_job:
+            # Redirecting jobs aren't queued, so their outputs are stored (and created) now
+            execution_cache.flush_and_queue_jobs()
+            job.object_store_id = object_store_populator.object_store_id
+            flush_job = True
+        if flush_job:
+            trans.sa_session.flush()
         # Some tools are not really executable, but jobs are still created for them ( for record keeping ).
         # Examples include tools that redirect to other applications ( epigraph ).  These special tools must
         # include something that can be retrieved from the params ( e.g., REDIRECT_URL ) to keep the job
@@ -450,11 +472,14 @@ class DefaultToolAction( object ):
             trans.sa_session.add( job )
             trans.sa_session.flush()
             trans.response.send_redirect( url_for( controller='tool_runner', action='redirect', redirect_url=redirect_url ) )
-        else:
+        elif flush_job:
             # Put the job in the queue if tracking in memory
             trans.app.job_queue.put( job.id, job.tool_id )
             trans.log_event( "Added job to the job queue, id: %s" % str(job.id), tool_id=job.tool_id )
             return job, out_data
+        else:
+            execution_cache.add_unqueued_job( job, object_store_populator )
+            return job, out_data
 
     def get_output_name( self, output, dataset, tool, on_text, trans, incoming, history, params, job_params ):
         if output.label:
@@ -471,6 +496,72 @@ class DefaultToolAction( object ):
         return name
 
 
+class ToolExecutionCache( object ):
+    """
+    Lookups shared by the executions of a tool in one request (e.g. for every
+    element of a collection the tool is mapped over), and the jobs created by
+    those executions that haven't yet been flushed and queued.
+    """
+
+    def __init__( self, trans ):
+        self.trans = trans
+        self._current_user_roles = None
+        self.chrom_info = {}
+        self.history_default_permissions = {}
+        self.unqueued_jobs = []
+        # The object store populators of the unqueued jobs
+        self.unqueued_object_store_populators = []
+        # ( object store populator of the job, output ) for the outputs of the
+        # unqueued jobs, whose files are created once they have ids
+        self.unflushed_outputs = []
+
+    @property
+    def current_user_roles( self ):
+        if self._current_user_roles is None:
+            self._current_user_roles = self.trans.get_current_user_roles()
+        return self._current_user_roles
+
+    def get_chrom_info( self, tool_id, input_dbkey ):
+        custom_build_hack_get_len_from_fasta_conversion = tool_id != 'CONVERTER_fasta_to_len'
+        key = ( input_dbkey, custom_build_hack_get_len_from_fasta_conversion )
+        if key not in self.chrom_info:
+            self.chrom_info[ key ] = self.trans.app.genome_builds.get_chrom_info( input_dbkey, trans=self.trans,
+                custom_build_hack_get_len_from_fasta_conversion=custom_build_hack_get_len_from_fasta_conversion )
+        return self.chrom_info[ key ]
+
+    def get_history_default_permissions( self, history ):
+        if history.id not in self.history_default_permissions:
+            self.history_default_permissions[ history.id ] = self.trans.app.security_agent.history_get_default_permissions( history )
+        return self.history_default_permissions[ history.id ]
+
+    def add_unqueued_job( self, job, object_store_populator ):
+        self.unqueued_jobs.append( job )
+        self.unqueued_object_store_populators.append( object_store_populator )
+
+    def flush_and_queue_jobs( self ):
+        """
+        Store the unqueued jobs and their outputs (and everything else pending
+        in the session), create the files of the outputs and put the jobs in
+        the job queue. This takes two flushes however many jobs there are: one
+        gives the outputs ids, the other stores their object store ids.
+        """
+        if not self.unqueued_jobs and not self.unflushed_outputs:
+            return
+        self.trans.sa_session.flush()
+        for object_store_populator, data in self.unflushed_outputs:
+            object_store_populator.set_object_store_id( data )
+        for job, object_store_populator in zip( self.unqueued_jobs, self.unqueued_object_store_populators ):
+            job.object_store_id = object_store_populator.object_store_id
+        self.trans.sa_session.flush()
+        for job in self.unqueued_jobs:
+            # Put the job in the queue if tracking in memory
+            self.trans.app.job_queue.put( job.id, job.tool_id )
+            self.trans.log_event( "Added job to the job queue, id: %s" % str(job.id), tool_id=job.tool_id )
+        self.unqueued_jobs = []
+        self.unqueued_object_store_populators = []
+        self.unflushed_outputs = []
+
+
 class ObjectStorePopulator( object ):
     """ Small helper for interacting with the object store and making sure all
     datasets from a job end up with the same object_store_id.
@@ -261,6 +261,8 @@ class TabularToolDataTable( ToolDataTable, Dictifiable ):
         super( TabularToolDataTable, self ).__init__( config_element, tool_data_path, from_shed_config, filename)
         self.config_element = config_element
         self.data = []
+        # column index -> { value: [ positions in self.data ] }, built when first queried
+        self._indexes = {}
         self.configure_and_load( config_element, tool_data_path, from_shed_config)
 
     def configure_and_load( self, config_element, tool_data_path, from_shed_config=False, url_timeout=10 ):
@@ -426,6 +428,29 @@ class TabularToolDataTable( ToolDataTable, Dictifiable ):
     def extend_data_with( self, filename, errors=None ):
         here = os.path.dirname(os.path.abspath(filename))
         self.data.extend( self.parse_file_fields( open( filename ), errors=errors, here=here ) )
+        self._indexes = {}
+
+    def _get_index( self, column ):
+        """
+        Returns { value: [ positions of the entries with value in column ] },
+        building it if this column has not been queried since the data
+        was (re)loaded.
+        """
+        index = self._indexes.get( column )
+        if index is None:
+            index = {}
+            for position, fields in enumerate( self.data ):
+                index.setdefault( fields[ column ], [] ).append( position )
+            self._indexes[ column ] = index
+        return index
+
+    def _index_fields( self, position, fields ):
+        for column, index in self._indexes.iteritems():
+            index.setdefault( fields[ column ], [] ).append( position )
+
+    def _has_fields( self, fields ):
+        value_col = self.columns[ 'value' ]
+        return any( self.data[ position ] == fields for position in self._get_index( value_col ).get( fields[ value_col ], [] ) )
 
     def parse_file_fields( self, reader, errors=None, here="__HERE__" ):
         """
@@ -488,21 +513,40 @@ class TabularToolDataTable( ToolDataTable, Dictifiable ):
             return_col = self.columns.get( return_attr, None )
             if return_col is None:
                 return default
-        rval = []
-        # Look for table entry.
-        for fields in self.get_fields():
-            if fields[ query_col ] == query_val:
-                if return_attr is None:
-                    field_dict = {}
-                    for i, col_name in enumerate( self.get_column_name_list() ):
-                        field_dict[ col_name or i ] = fields[i]
-                    rval.append( field_dict )
-                else:
-                    rval.append( fields[ return_col ] )
-                if limit is not None and len( rval ) == limit:
-                    break
+        positions = self._get_index( query_col ).get( query_val, [] )
+        if limit is not None:
+            positions = positions[ :limit ]
+        if return_attr is None:
+            column_names = self.get_column_name_list()
+            rval = []
+            for position in positions:
+                fields = self.data[ position ]
+                field_dict = {}
+                for i, col_name in enumerate( column_names ):
+                    field_dict[ col_name or i ] = fields[i]
+                rval.append( field_dict )
+        else:
+            rval = [ self.data[ position ][ return_col ] for position in positions ]
         return rval or default
 
+    def get_entry_map( self, query_attr, query_vals, return_attr ):
+        """
+        Returns { query value: table entry } for those of query_vals that are
+        found in the query_attr column, i.e. what get_entry returns for each
+        of them, looked up in one go.
+        """
+        query_col = self.columns.get( query_attr, None )
+        return_col = self.columns.get( return_attr, None )
+        if query_col is None or return_col is None:
+            return {}
+        index = self._get_index( query_col )
+        rval = {}
+        for query_val in query_vals:
+            positions = index.get( query_val )
+            if positions:
+                rval[ query_val ] = self.data[ positions[ 0 ] ][ return_col ]
+        return rval
+
     def get_filename_for_source( self, source, default=None ):
         if source:
             #if dict, assume is compatible info dict, otherwise call method
@@ -536,8 +580,9 @@ class TabularToolDataTable( ToolDataTable, Dictifiable ):
         is_error = False
         if self.largest_index < len( fields ):
             fields = self._replace_field_separators( fields )
-            if fields not in self.get_fields() or allow_duplicates:
+            if allow_duplicates or not self._has_fields( fields ):
                 self.data.append( fields )
+                self._index_fields( len( self.data ) - 1, fields )
             else:
                 log.debug( "Attempted to add fields (%s) to data table '%s', but this entry already exists and allow_duplicates is False.", fields, self.name )
                 is_error = True
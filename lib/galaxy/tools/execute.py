@@ -5,11 +5,15 @@ collections from matched collections.
 """
 import collections
 import galaxy.tools
-from galaxy.tools.actions import on_text_for_names
+from galaxy.tools.actions import on_text_for_names, ToolExecutionCache
 
 import logging
 log = logging.getLogger( __name__ )
 
+# Number of jobs created (when mapping over collections) before they are
+# flushed to the database and queued together.
+EXECUTION_FLUSH_BATCH_SIZE = 100
+
 
 def execute( trans, tool, param_combinations, history, rerun_remap_job_id=None, collection_info=None, workflow_invocation_uuid=None ):
     """
@@ -17,6 +21,10 @@ def execute( trans, tool, param_combinations, history, rerun_remap_job_id=None,
     failures, etc...).
     """
     execution_tracker = ToolExecutionTracker( tool, param_combinations, collection_info )
+    # Share lookups between the executions and store and queue their jobs in batches.
+    execution_cache = ToolExecutionCache( trans )
+    if collection_info:
+        history = history or tool.get_default_history_by_trans( trans, create=True )
     for params in execution_tracker.param_combinations:
         if workflow_invocation_uuid:
             params[ '__workflow_invocation_uuid__' ] = workflow_invocation_uuid
@@ -24,14 +32,16 @@ def execute( trans, tool, param_combinations, history, rerun_remap_job_id=None,
             # Only workflow invocation code gets to set this, ignore user supplied
             # values or rerun parameters.
             del params[ '__workflow_invocation_uuid__' ]
-        job, result = tool.handle_single_execution( trans, rerun_remap_job_id, params, history, collection_info )
+        job, result = tool.handle_single_execution( trans, rerun_remap_job_id, params, history, collection_info, execution_cache=execution_cache )
         if job:
             execution_tracker.record_success( job, result )
         else:
             execution_tracker.record_error( result )
+        if len( execution_cache.unqueued_jobs ) >= EXECUTION_FLUSH_BATCH_SIZE:
+            execution_cache.flush_and_queue_jobs()
+    execution_cache.flush_and_queue_jobs()
 
     if collection_info:
-        history = history or tool.get_default_history_by_trans( trans )
         execution_tracker.create_output_collections( trans, history, params )
 
     return execution_tracker
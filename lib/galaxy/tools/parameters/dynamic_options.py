@@ -3,7 +3,9 @@ Support for generating the options for a SelectToolParameter dynamically (based
 on the values of other parameters or other aspects of the current state)
 """
 
-import operator, sys, os, logging
+import operator, sys, os, logging, threading
+import StringIO
+from collections import OrderedDict
 import basic, validation
 from galaxy.util import string_as_bool
 from galaxy.model import User
@@ -11,6 +13,12 @@ import galaxy.tools
 
 log = logging.getLogger(__name__)
 
+# Upper bound on the total size of the options files and datasets whose parsed
+# fields are cached
+PARSED_FIELDS_CACHE_SIZE = 32 * 1048576
+# Only this much of a dataset is parsed for options
+MAX_DATASET_OPTIONS_SIZE = 1048576
+
 class Filter( object ):
     """
     A filter takes the current options list and modifies it.
@@ -30,6 +38,13 @@ class Filter( object ):
     def filter_options( self, options, trans, other_values ):
         """Returns a list of options after the filter is applied"""
         raise TypeError( "Abstract Method" )
+    def filter_indexed( self, parsed_fields, trans, other_values ):
+        """
+        Returns the set of positions in parsed_fields of the options kept by
+        this filter, looked up in the column indexes, or None if the options
+        have to be filtered by filter_options.
+        """
+        return None
 
 class StaticValueFilter( Filter ):
     """
@@ -52,13 +67,20 @@ class StaticValueFilter( Filter ):
         assert column is not None, "Required 'column' attribute missing from filter, when loading from file"
         self.column = d_option.column_spec_to_index( column )
         self.keep = string_as_bool( elem.get( "keep", 'True' ) )
-    def filter_options( self, options, trans, other_values ):
-        rval = []
+    def get_filter_value( self, trans ):
         filter_value = self.value
         try:
             filter_value = User.expand_user_properties( trans.user, filter_value)
         except:
             pass
+        return filter_value
+    def filter_indexed( self, parsed_fields, trans, other_values ):
+        if not self.keep:
+            return None
+        return parsed_fields.positions( self.column, [ self.get_filter_value( trans ) ] )
+    def filter_options( self, options, trans, other_values ):
+        rval = []
+        filter_value = self.get_filter_value( trans )
         for fields in options:
             if ( self.keep and fields[self.column] == filter_value ) or ( not self.keep and fields[self.column] != filter_value ):
                 rval.append( fields )
@@ -101,6 +123,25 @@ class DataMetaFilter( Filter ):
         self.separator = elem.get( "separator", "," )
     def get_dependency_name( self ):
         return self.ref_name
+    def get_ref( self, trans, other_values ):
+        """Returns the referenced dataset, or None if it is not a valid dataset."""
+        assert self.ref_name in other_values or ( trans is not None and trans.workflow_building_mode), "Required dependency '%s' not found in incoming values" % self.ref_name
+        ref = other_values.get( self.ref_name, None )
+        if not isinstance( ref, self.dynamic_option.tool_param.tool.app.model.HistoryDatasetAssociation ) and not ( isinstance( ref, galaxy.tools.DatasetFilenameWrapper ) ):
+            return None
+        return ref
+    def filter_indexed( self, parsed_fields, trans, other_values ):
+        if self.column is None or self.multiple:
+            return None
+        ref = self.get_ref( trans, other_values )
+        if ref is None:
+            return set() #not a valid dataset
+        meta_value = ref.metadata.get( self.key, None )
+        if meta_value is None:
+            return None
+        if not isinstance( meta_value, list ):
+            meta_value = [ meta_value ]
+        return parsed_fields.positions( self.column, meta_value )
     def filter_options( self, options, trans, other_values ):
         def compare_meta_value( file_value, dataset_value ):
             if isinstance( dataset_value, list ):
@@ -114,9 +155,8 @@ class DataMetaFilter( Filter ):
             if self.multiple:
                 return dataset_value in file_value.split( self.separator )
             return file_value == dataset_value
-        assert self.ref_name in other_values or ( trans is not None and trans.workflow_building_mode), "Required dependency '%s' not found in incoming values" % self.ref_name
-        ref = other_values.get( self.ref_name, None )
-        if not isinstance( ref, self.dynamic_option.tool_param.tool.app.model.HistoryDatasetAssociation ) and not ( isinstance( ref, galaxy.tools.DatasetFilenameWrapper ) ):
+        ref = self.get_ref( trans, other_values )
+        if ref is None:
             return [] #not a valid dataset
         meta_value = ref.metadata.get( self.key, None )
         if meta_value is None: #assert meta_value is not None, "Required metadata value '%s' not found in referenced dataset" % self.key
@@ -175,15 +215,28 @@ class ParamValueFilter( Filter ):
             self.ref_attribute = []
     def get_dependency_name( self ):
         return self.ref_name
-    def filter_options( self, options, trans, other_values ):
-        if trans is not None and trans.workflow_building_mode: return []
+    def get_ref_value( self, other_values ):
+        """Returns the value to filter by, or None if the ref does not have the attribute."""
         assert self.ref_name in other_values, "Required dependency '%s' not found in incoming values" % self.ref_name
         ref = other_values.get( self.ref_name, None )
         for ref_attribute in self.ref_attribute:
             if not hasattr( ref, ref_attribute ):
-                return [] #ref does not have attribute, so we cannot filter, return empty list
+                return None
             ref = getattr( ref, ref_attribute )
-        ref = str( ref )
+        return str( ref )
+    def filter_indexed( self, parsed_fields, trans, other_values ):
+        if not self.keep:
+            return None
+        if trans is not None and trans.workflow_building_mode: return set()
+        ref = self.get_ref_value( other_values )
+        if ref is None:
+            return set()
+        return parsed_fields.positions( self.column, [ ref ] )
+    def filter_options( self, options, trans, other_values ):
+        if trans is not None and trans.workflow_building_mode: return []
+        ref = self.get_ref_value( other_values )
+        if ref is None:
+            return [] #ref does not have attribute, so we cannot filter, return empty list
         rval = []
         for fields in options:
             if ( self.keep and fields[self.column] == ref ) or ( not self.keep and fields[self.column] != ref ):
@@ -208,11 +261,11 @@ class UniqueValueFilter( Filter ):
         return self.dynamic_option.dataset_ref_name
     def filter_options( self, options, trans, other_values ):
         rval = []
-        skip_list = []
+        skip_values = set()
         for fields in options:
-            if fields[self.column] not in skip_list:
+            if fields[self.column] not in skip_values:
                 rval.append( fields )
-                skip_list.append( fields[self.column] )
+                skip_values.add( fields[self.column] )
         return rval
 
 class MultipleSplitterFilter( Filter ):
@@ -378,15 +431,8 @@ class SortByColumnFilter( Filter ):
         assert column is not None, "Required 'column' attribute missing from filter"
         self.column = d_option.column_spec_to_index( column )
     def filter_options( self, options, trans, other_values ):
-        rval = []
-        for i, fields in enumerate( options ):
-            for j in range( 0, len( rval ) ):
-                if fields[self.column] < rval[j][self.column]:
-                    rval.insert( j, fields )
-                    break
-            else:
-                rval.append( fields )
-        return rval
+        # Stable, so options with equal values keep their order
+        return sorted( options, key=operator.itemgetter( self.column ) )
 
 
 filter_types = dict( data_meta = DataMetaFilter,
@@ -399,6 +445,86 @@ filter_types = dict( data_meta = DataMetaFilter,
                      remove_value = RemoveValueFilter,
                      sort_by = SortByColumnFilter )
 
+class ParsedFields( object ):
+    """
+    The fields parsed from an options file or dataset, with indexes of the
+    column values that are built when first used. The fields may be shared by
+    many tools and requests and must not be modified.
+    """
+    def __init__( self, fields ):
+        self.fields = fields
+        self._indexes = {}
+    def index( self, column ):
+        """
+        Returns { value: [ positions of the fields with value in column ] }, or
+        None if some fields have no such column.
+        """
+        index = self._indexes.get( column )
+        if index is None:
+            index = {}
+            try:
+                for position, fields in enumerate( self.fields ):
+                    index.setdefault( fields[ column ], [] ).append( position )
+            except IndexError:
+                return None
+            self._indexes[ column ] = index
+        return index
+    def positions( self, column, values ):
+        """
+        Returns the set of positions of the fields with any of values in
+        column, or None if the index cannot be used.
+        """
+        index = self.index( column )
+        if index is None:
+            return None
+        positions = set()
+        try:
+            for value in values:
+                positions.update( index.get( value, () ) )
+        except TypeError:
+            # Unhashable values can only be compared by filter_options
+            return None
+        return positions
+
+class ParsedFieldsCache( object ):
+    """
+    LRU cache of ParsedFields, bounded by the total size of the text they were
+    parsed from. Keys include the size and modification time of the parsed
+    file, so a changed file is parsed again and the old entry ages out.
+    """
+    def __init__( self, max_size ):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    def get( self, key ):
+        with self._lock:
+            entry = self._entries.pop( key, None )
+            if entry is None:
+                return None
+            self._entries[ key ] = entry
+            return entry[ 0 ]
+    def put( self, key, parsed_fields, size ):
+        if size > self.max_size / 4:
+            # Files this large would just flush the cache
+            return
+        with self._lock:
+            old_entry = self._entries.pop( key, None )
+            if old_entry is not None:
+                self.size -= old_entry[ 1 ]
+            self._entries[ key ] = ( parsed_fields, size )
+            self.size += size
+            while self.size > self.max_size:
+                evicted_fields, evicted_size = self._entries.popitem( last=False )[ 1 ]
+                self.size -= evicted_size
+    def clear( self ):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+# Shared by the dynamic options of all tools
+parsed_fields_cache = ParsedFieldsCache( PARSED_FIELDS_CACHE_SIZE )
+
 class DynamicOptions( object ):
     """Handles dynamically generated SelectToolParameter options"""
     def __init__( self, elem, tool_param  ):
@@ -413,6 +539,7 @@ class DynamicOptions( object ):
         self.columns = {}
         self.filters = []
         self.file_fields = None
+        self.parsed_file_fields = None
         self.largest_index = 0
         self.dataset_ref_name = None
         # True if the options generation depends on one or more other parameters
@@ -426,6 +553,7 @@ class DynamicOptions( object ):
         self.line_startswith = elem.get( 'startswith', None )
         data_file = elem.get( 'from_file', None )
         self.index_file = None
+        self.index_file_path = None
         self.missing_index_file = None
         dataset_file = elem.get( 'from_dataset', None )
         from_parameter = elem.get( 'from_parameter', None )
@@ -459,7 +587,9 @@ class DynamicOptions( object ):
                     full_path = os.path.join( self.tool_param.tool.app.config.tool_data_path, data_file )
                     if os.path.exists( full_path ):
                         self.index_file = data_file
-                        self.file_fields = self.parse_file_fields( open( full_path ) )
+                        self.index_file_path = full_path
+                        self.parsed_file_fields = self.parse_cached_file_fields( full_path )
+                        self.file_fields = self.parsed_file_fields.fields
                     else:
                         self.missing_index_file = data_file
             elif dataset_file is not None:
@@ -469,6 +599,7 @@ class DynamicOptions( object ):
             elif from_parameter is not None:
                 transform_lines = elem.get( 'transform_lines', None )
                 self.file_fields = list( load_from_parameter( from_parameter, transform_lines ) )
+                self.parsed_file_fields = ParsedFields( self.file_fields )
 
         # Load filters
         for filter_elem in elem.findall( 'filter' ):
@@ -518,6 +649,30 @@ class DynamicOptions( object ):
                     rval.append( fields )
         return rval
 
+    def parse_cached_file_fields( self, path, max_size=None ):
+        """
+        Returns the ParsedFields of the file at path (of just its first
+        max_size bytes), taken from the cache unless the file has changed.
+        """
+        stat = os.stat( path )
+        size = stat.st_size
+        if max_size is not None:
+            size = min( size, max_size )
+        key = ( path, stat.st_size, stat.st_mtime, max_size, self.separator, self.line_startswith, self.largest_index )
+        parsed_fields = parsed_fields_cache.get( key )
+        if parsed_fields is None:
+            reader = open( path )
+            try:
+                if size < stat.st_size:
+                    log.warn( "Attempting to load options from large file, reading just the first %d bytes" % size )
+                    parsed_fields = ParsedFields( self.parse_file_fields( StringIO.StringIO( reader.read( size ) ) ) )
+                else:
+                    parsed_fields = ParsedFields( self.parse_file_fields( reader ) )
+            finally:
+                reader.close()
+            parsed_fields_cache.put( key, parsed_fields, size )
+        return parsed_fields
+
     def get_dependency_names( self ):
         """
         Return the names of parameters these options depend on -- both data
@@ -538,24 +693,49 @@ class DynamicOptions( object ):
             assert dataset is not None, "Required dataset '%s' missing from input" % self.dataset_ref_name
             if not dataset: return [] #no valid dataset in history
             # Ensure parsing dynamic options does not consume more than a megabyte worth memory.
-            path = dataset.file_name
-            file_size = os.path.getsize( path )
-            if os.path.getsize( path ) < 1048576:
-                options = self.parse_file_fields( open( path ) )
-            else:
-                # Pass just the first megabyte to parse_file_fields.
-                import StringIO
-                log.warn( "Attempting to load options from large file, reading just first megabyte" )
-                contents = open( path, 'r' ).read( 1048576 )
-                options = self.parse_file_fields( StringIO.StringIO( contents ) )
+            parsed_fields = self.parse_cached_file_fields( dataset.file_name, max_size=MAX_DATASET_OPTIONS_SIZE )
         elif self.tool_data_table:
+            parsed_fields = None
+        elif self.index_file_path:
+            try:
+                parsed_fields = self.parse_cached_file_fields( self.index_file_path )
+            except ( IOError, OSError ):
+                # Keep the options loaded with the tool
+                parsed_fields = self.parsed_file_fields
+        else:
+            parsed_fields = self.parsed_file_fields
+        if parsed_fields is None:
             options = self.tool_data_table.get_fields()
+            filters = self.filters
         else:
-            options = list( self.file_fields )
-        for filter in self.filters:
+            options, filters = self.apply_indexed_filters( parsed_fields, trans, other_values )
+        for filter in filters:
             options = filter.filter_options( options, trans, other_values )
         return options
 
+    def apply_indexed_filters( self, parsed_fields, trans, other_values ):
+        """
+        Applies the leading filters that can look up the options they keep in
+        the column indexes of parsed_fields. Returns the options kept and the
+        filters still to apply.
+        """
+        positions = None
+        applied = 0
+        for filter in self.filters:
+            filter_positions = filter.filter_indexed( parsed_fields, trans, other_values )
+            if filter_positions is None:
+                break
+            if positions is None:
+                positions = filter_positions
+            else:
+                positions &= filter_positions
+            applied += 1
+        if positions is None:
+            options = list( parsed_fields.fields )
+        else:
+            options = [ parsed_fields.fields[ position ] for position in sorted( positions ) ]
+        return options, self.filters[ applied: ]
+
     def get_fields_by_value( self, value, trans, other_values ):
         """
         Return a list of fields with column 'value' matching provided value.
@@ -0,0 +1,358 @@
+"""
+Columnar evaluation of tabular data with NumPy, used by the Filter and Group
+tools: lines are read in chunks, split into columns that are converted to
+arrays according to the column types of the dataset's metadata, and filter
+expressions and grouped aggregates are computed on whole arrays instead of
+line by line.
+"""
+from __future__ import division
+import ast
+import itertools
+import operator
+import re
+
+try:
+    import numpy
+except:
+    from galaxy import eggs
+    eggs.require( "numpy" )
+    import numpy
+
+DEFAULT_CHUNK_LINES = 100000
+# ints up to this magnitude are exactly representable as floats, so int64
+# arrays of them compare with floats and divide as Python ints do
+INT_LIMIT = 2 ** 53
+
+NUMBER = 'number'
+STRING = 'string'
+BOOLEAN = 'boolean'
+# kinds of the values of columns of the types set by Tabular.set_meta
+COLUMN_KINDS = { 'int': NUMBER, 'float': NUMBER, 'str': STRING }
+
+
+class NotVectorizable( Exception ):
+    pass
+
+
+def iter_chunks( iterable, size=DEFAULT_CHUNK_LINES ):
+    """Yields lists of at most size items of iterable."""
+    iterator = iter( iterable )
+    while True:
+        chunk = list( itertools.islice( iterator, size ) )
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_column( values, column_type ):
+    """
+    Returns ( array, invalid ) for a list of the strings of a column of the
+    given type; invalid is None or a boolean array of the values that cannot
+    be converted to the type. Integers are converted to an int64 array, or
+    kept as (unbounded) Python ints in an object array if any of them is
+    larger than INT_LIMIT.
+    """
+    if column_type == 'str':
+        return numpy.array( values, dtype=object ), None
+    elif column_type == 'int':
+        convert = int
+    elif column_type == 'float':
+        convert = float
+    else:
+        raise NotVectorizable( "Columns of type %s are not supported" % column_type )
+    try:
+        converted = map( convert, values )
+        invalid = None
+    except ( ValueError, OverflowError ):
+        converted = []
+        invalid = numpy.zeros( len( values ), dtype=bool )
+        for i, value in enumerate( values ):
+            try:
+                converted.append( convert( value ) )
+            except ( ValueError, OverflowError ):
+                converted.append( convert( 0 ) )
+                invalid[ i ] = True
+    if convert is float:
+        return numpy.array( converted, dtype=float ), invalid
+    try:
+        array = numpy.array( converted, dtype=numpy.int64 )
+    except OverflowError:
+        array = None
+    if array is None or ( ( array > INT_LIMIT ) | ( array < -INT_LIMIT ) ).any():
+        return numpy.array( converted, dtype=object ), invalid
+    return array, invalid
+
+
+def truth( value, count=None ):
+    """Returns the truth values of the rows of value (or, given count, of a scalar value repeated count times)."""
+    if isinstance( value, numpy.ndarray ):
+        if value.dtype != bool:
+            value = value.astype( bool )
+        return value
+    if count is None:
+        return bool( value )
+    return numpy.repeat( bool( value ), count )
+
+
+def _or( invalid, more_invalid ):
+    if invalid is None:
+        return more_invalid
+    if more_invalid is None:
+        return invalid
+    return invalid | more_invalid
+
+
+def _is_integral( value ):
+    if isinstance( value, numpy.ndarray ):
+        return value.dtype.kind in 'iO'
+    return isinstance( value, ( int, long ) ) and not isinstance( value, bool )
+
+
+def _as_objects( value ):
+    if isinstance( value, numpy.ndarray ):
+        return value.astype( object )
+    return value
+
+
+def _int_op( op, left, right ):
+    """
+    Applies op to integral operands, in int64 where the result stays within
+    INT_LIMIT and in Python ints (which do not overflow) otherwise.
+    """
+    if isinstance( left, numpy.ndarray ) and left.dtype == object or \
+       isinstance( right, numpy.ndarray ) and right.dtype == object:
+        return op( _as_objects( left ), _as_objects( right ) )
+    try:
+        estimate = op( numpy.asarray( left, dtype=float ), numpy.asarray( right, dtype=float ) )
+    except OverflowError:
+        estimate = None
+    if estimate is not None and ( numpy.abs( estimate ) < INT_LIMIT ).all():
+        return op( left, right )
+    return op( _as_objects( left ), _as_objects( right ) )
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Mod: operator.mod,
+}
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+class VectorizedExpression( object ):
+    """
+    A (checked) filter expression such as "c1=='chr1' and c3-c2>=2000"
+    compiled to NumPy operations on whole columns. Only columns, numbers and
+    strings combined with arithmetic, comparisons of values of the same kind,
+    'in' lists of constants and boolean operators are supported;
+    NotVectorizable is raised for anything else, which is then to be
+    evaluated line by line.
+    """
+
+    def __init__( self, text, column_types ):
+        """column_types maps the (1 based) columns to their types."""
+        self.text = text
+        self.column_types = column_types
+        self.columns = set()
+        try:
+            body = ast.parse( text ).body
+        except SyntaxError:
+            raise NotVectorizable( text )
+        if len( body ) != 1 or not isinstance( body[0], ast.Expr ):
+            raise NotVectorizable( text )
+        self._evaluate = self._compile( body[0].value )[0]
+
+    def evaluate( self, columns, count ):
+        """
+        Evaluates the expression for count rows, given { column: array } of
+        the columns used. Returns the boolean arrays ( keep, invalid ) of the
+        rows that pass the filter and of those for which evaluating the
+        expression line by line would have raised an error (such as a
+        division by zero).
+        """
+        # comparisons with NaN are just false, as in Python
+        errors = numpy.seterr( all='ignore' )
+        try:
+            value, invalid = self._evaluate( columns )
+        finally:
+            numpy.seterr( **errors )
+        keep = truth( value, count )
+        if invalid is None:
+            return keep, numpy.zeros( count, dtype=bool )
+        return keep & ~invalid, invalid
+
+    def _compile( self, node ):
+        # Returns ( function( columns ) -> ( value, invalid ), kind of value )
+        method = getattr( self, '_compile_%s' % node.__class__.__name__, None )
+        if method is None:
+            raise NotVectorizable( "%s in %s" % ( node.__class__.__name__, self.text ) )
+        return method( node )
+
+    def _compile_Name( self, node ):
+        match = re.match( r'^c(\d+)$', node.id )
+        if not match:
+            raise NotVectorizable( node.id )
+        column = int( match.group( 1 ) )
+        kind = COLUMN_KINDS.get( self.column_types.get( column ) )
+        if kind is None:
+            raise NotVectorizable( "Column %s of type %s" % ( column, self.column_types.get( column ) ) )
+        self.columns.add( column )
+        return lambda columns: ( columns[ column ], None ), kind
+
+    def _compile_Num( self, node ):
+        value = node.n
+        if not isinstance( value, ( int, long, float ) ):
+            raise NotVectorizable( repr( value ) )
+        return lambda columns: ( value, None ), NUMBER
+
+    def _compile_Str( self, node ):
+        value = node.s
+        return lambda columns: ( value, None ), STRING
+
+    def _compile_UnaryOp( self, node ):
+        operand, kind = self._compile( node.operand )
+        if isinstance( node.op, ast.Not ):
+            def evaluate( columns ):
+                value, invalid = operand( columns )
+                return numpy.logical_not( truth( value ) ), invalid
+            return evaluate, BOOLEAN
+        if kind != NUMBER or not isinstance( node.op, ( ast.USub, ast.UAdd ) ):
+            raise NotVectorizable( node.op.__class__.__name__ )
+        op = isinstance( node.op, ast.USub ) and operator.neg or operator.pos
+        def evaluate( columns ):
+            value, invalid = operand( columns )
+            return op( value ), invalid
+        return evaluate, NUMBER
+
+    def _compile_BinOp( self, node ):
+        op = BINARY_OPERATORS.get( node.op.__class__ )
+        left, left_kind = self._compile( node.left )
+        right, right_kind = self._compile( node.right )
+        if op is None or left_kind != NUMBER or right_kind != NUMBER:
+            raise NotVectorizable( node.op.__class__.__name__ )
+        divides = op in ( operator.truediv, operator.mod )
+        def evaluate( columns ):
+            left_value, invalid = left( columns )
+            right_value, right_invalid = right( columns )
+            invalid = _or( invalid, right_invalid )
+            if divides:
+                zero = right_value == 0
+                if isinstance( zero, numpy.ndarray ):
+                    zero = truth( zero )
+                    if zero.any():
+                        # Python raises for these rows
+                        right_value = numpy.where( zero, 1, right_value )
+                        invalid = _or( invalid, zero )
+                elif zero:
+                    raise ZeroDivisionError( self.text )
+            if op is not operator.truediv and _is_integral( left_value ) and _is_integral( right_value ):
+                return _int_op( op, left_value, right_value ), invalid
+            return op( left_value, right_value ), invalid
+        return evaluate, NUMBER
+
+    def _compile_Compare( self, node ):
+        left, left_kind = self._compile( node.left )
+        comparisons = []
+        for op, comparator in zip( node.ops, node.comparators ):
+            if isinstance( op, ( ast.In, ast.NotIn ) ):
+                if not isinstance( comparator, ast.List ):
+                    raise NotVectorizable( "in %s" % comparator.__class__.__name__ )
+                constants = [ self._compile( element ) for element in comparator.elts ]
+                if [ kind for function, kind in constants if kind != left_kind ] or \
+                   [ element for element in comparator.elts if not isinstance( element, ( ast.Num, ast.Str ) ) ]:
+                    raise NotVectorizable( "in list of other values than constants of the same kind" )
+                values = [ function( None )[0] for function, kind in constants ]
+                comparisons.append( ( self._in( values, isinstance( op, ast.NotIn ) ), None ) )
+                # the last operand of a chain is a list of constants, so nothing to compare it with
+                left_kind = None
+            else:
+                function, kind = self._compile( comparator )
+                if left_kind != kind or kind not in ( NUMBER, STRING ) or op.__class__ not in COMPARISON_OPERATORS:
+                    raise NotVectorizable( "comparison of %s with %s" % ( left_kind, kind ) )
+                comparisons.append( ( COMPARISON_OPERATORS[ op.__class__ ], function ) )
+                left_kind = kind
+        def evaluate( columns ):
+            # a chain of comparisons is the conjunction of its comparisons
+            left_value, invalid = left( columns )
+            result = True
+            for op, right in comparisons:
+                if right is None:
+                    right_value = right_invalid = None
+                else:
+                    right_value, right_invalid = right( columns )
+                    if right_invalid is not None:
+                        # evaluated only where the previous comparisons hold
+                        invalid = _or( invalid, result & right_invalid )
+                result = result & truth( op( left_value, right_value ) )
+                left_value = right_value
+            return result, invalid
+        return evaluate, BOOLEAN
+
+    @staticmethod
+    def _in( values, negate ):
+        def op( left_value, ignored ):
+            result = False
+            for value in values:
+                result = result | truth( left_value == value )
+            if negate:
+                return numpy.logical_not( result )
+            return result
+        return op
+
+    def _compile_BoolOp( self, node ):
+        operands = [ self._compile( value )[0] for value in node.values ]
+        is_and = isinstance( node.op, ast.And )
+        def evaluate( columns ):
+            value, invalid = operands[0]( columns )
+            result = truth( value )
+            for operand in operands[1:]:
+                value, more_invalid = operand( columns )
+                if more_invalid is not None:
+                    # operands are evaluated only until the result is known
+                    if is_and:
+                        invalid = _or( invalid, result & more_invalid )
+                    else:
+                        invalid = _or( invalid, numpy.logical_not( result ) & more_invalid )
+                if is_and:
+                    result = result & truth( value )
+                else:
+                    result = result | truth( value )
+            return result, invalid
+        return evaluate, BOOLEAN
+
+
+def group_sizes( starts, count ):
+    """Returns the number of rows of each group, given the starts of the groups of count sorted rows."""
+    return numpy.diff( numpy.concatenate( ( starts, [ count ] ) ) )
+
+
+def split_groups( values, starts ):
+    """Returns the values (sorted by group) of each group."""
+    return numpy.split( values, starts[ 1: ] )
+
+
+def aggregate( op, values, starts ):
+    """
+    Returns the array of the numpy aggregate op (sum, mean, min, max,
+    median, std) of the float values of each group, given the values sorted
+    by group and the starts of the groups.
+    """
+    if op == 'sum':
+        return numpy.add.reduceat( values, starts )
+    elif op == 'mean':
+        return numpy.add.reduceat( values, starts ) / group_sizes( starts, len( values ) )
+    elif op == 'min':
+        return numpy.minimum.reduceat( values, starts )
+    elif op == 'max':
+        return numpy.maximum.reduceat( values, starts )
+    function = getattr( numpy, op )
+    return numpy.array( [ function( group ) for group in split_groups( values, starts ) ], dtype=float )
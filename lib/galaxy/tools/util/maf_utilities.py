@@ -7,8 +7,9 @@ import pkg_resources; pkg_resources.require( "bx-python" )
 import bx.align.maf
 import bx.intervals
 import bx.interval_index_file
-import sys, os, string, tempfile
+import sys, os, string, tempfile, time
 import logging
+import hashlib
 from errno import EMFILE
 import resource
 from copy import deepcopy
@@ -21,6 +22,13 @@ log = logging.getLogger(__name__)
 GAP_CHARS = [ '-' ]
 SRC_SPLIT_CHAR = '.'
 
+# Directory and size (in bytes) of the cache of MAF indexes built for MAF
+# files that have no (usable) maf_index metadata; set these in the job
+# environment (e.g. with <env> in job_conf.xml) to enable the cache.
+MAF_INDEX_CACHE_DIR_ENV = 'GALAXY_MAF_INDEX_CACHE_DIR'
+MAF_INDEX_CACHE_SIZE_ENV = 'GALAXY_MAF_INDEX_CACHE_SIZE'
+DEFAULT_MAF_INDEX_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+
 def src_split( src ):
     fields = src.split( SRC_SPLIT_CHAR, 1 )
     spec = fields.pop( 0 )
@@ -276,11 +284,19 @@ def maf_index_by_uid( maf_uid, index_location_file ):
     return None
 
 #return ( index, temp_index_filename ) for user maf, if available, or build one and return it, return None when no tempfile is created
-def open_or_build_maf_index( maf_file, index_filename, species = None ):
+def open_or_build_maf_index( maf_file, index_filename, species = None, cache = None ):
     try:
         return ( bx.align.maf.Indexed( maf_file, index_filename = index_filename, keep_open = True, parse_e_rows = False ), None )
     except:
-        return build_maf_index( maf_file, species = species )
+        pass
+    if cache is None:
+        cache = MafIndexCache.from_environment()
+    if cache is not None:
+        #cached indexes cover all species and are shared, so no tempfile is created
+        entry = cache.get_or_build( maf_file )
+        if entry is not None:
+            return ( bx.align.maf.Indexed( maf_file, index_filename = entry.index_filename, keep_open = True, parse_e_rows = False ), None )
+    return build_maf_index( maf_file, species = species )
 
 def build_maf_index_species_chromosomes( filename, index_species = None ):
     species = []
@@ -335,6 +351,171 @@ def build_maf_index( maf_file, species = None ):
         return ( bx.align.maf.Indexed( maf_file, index_filename = index_filename, keep_open = True, parse_e_rows = False ), index_filename )
     return ( None, None )
 
+
+def write_species_chromosomes( out, species, species_chromosomes ):
+    """Writes species_chromosomes as in the species_chromosomes metadata file of MAF datasets."""
+    for spec in species:
+        out.write( "%s\t%s\n" % ( spec, "\t".join( species_chromosomes.get( spec, [] ) ) ) )
+
+def read_species_chromosomes( filename ):
+    """Returns ( species, species_chromosomes ) from a file written by write_species_chromosomes."""
+    species = []
+    species_chromosomes = {}
+    for line in open( filename ):
+        fields = line.rstrip( "\r\n" ).split( "\t" )
+        if not fields[0]:
+            continue
+        species.append( fields[0] )
+        species_chromosomes[ fields[0] ] = [ chrom for chrom in fields[1:] if chrom ]
+    return ( species, species_chromosomes )
+
+
+class MafIndexCacheEntry( object ):
+
+    def __init__( self, index_filename, species_filename ):
+        self.index_filename = index_filename
+        self.species_filename = species_filename
+
+    def get_species_chromosomes( self ):
+        return read_species_chromosomes( self.species_filename )
+
+
+class MafIndexCache( object ):
+    """
+    Directory of MAF indexes (covering all species) and species chromosome
+    lists, keyed by the path, size and modification time of the MAF files,
+    so that jobs on the same MAF dataset index it only once. Entries are
+    written atomically, so concurrent jobs may share the directory; the
+    least recently used entries are removed once the directory holds more
+    than max_size bytes, and files left by unfinished writes after a day.
+    """
+    INDEX_SUFFIX = '.index'
+    SPECIES_SUFFIX = '.species'
+    TEMP_PREFIX = 'tmp'
+    #age (in seconds) after which files of unfinished writes (e.g. of killed jobs) are removed
+    ABANDONED_FILE_AGE = 24 * 60 * 60
+
+    def __init__( self, cache_dir, max_size = DEFAULT_MAF_INDEX_CACHE_SIZE ):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    @classmethod
+    def from_environment( cls, environ = None ):
+        """Returns the cache configured in the (job) environment, or None."""
+        if environ is None:
+            environ = os.environ
+        cache_dir = environ.get( MAF_INDEX_CACHE_DIR_ENV )
+        if not cache_dir:
+            return None
+        try:
+            max_size = int( environ.get( MAF_INDEX_CACHE_SIZE_ENV, DEFAULT_MAF_INDEX_CACHE_SIZE ) )
+        except ValueError:
+            max_size = DEFAULT_MAF_INDEX_CACHE_SIZE
+        return cls( cache_dir, max_size = max_size )
+
+    def key( self, maf_file ):
+        stat = os.stat( maf_file )
+        return hashlib.sha1( "%s\t%d\t%d" % ( os.path.realpath( maf_file ), stat.st_size, int( stat.st_mtime ) ) ).hexdigest()
+
+    def _entry( self, key ):
+        base = os.path.join( self.cache_dir, key )
+        return MafIndexCacheEntry( base + self.INDEX_SUFFIX, base + self.SPECIES_SUFFIX )
+
+    def get( self, maf_file ):
+        """Returns the MafIndexCacheEntry of maf_file, or None when it is not cached."""
+        try:
+            entry = self._entry( self.key( maf_file ) )
+            #the index is written last, so an entry with an index is complete
+            if not os.path.exists( entry.index_filename ):
+                return None
+            #mark the entry as recently used
+            os.utime( entry.index_filename, None )
+        except OSError:
+            return None
+        return entry
+
+    def get_or_build( self, maf_file ):
+        """Returns the MafIndexCacheEntry of maf_file, building it when needed; None for bad MAF files."""
+        entry = self.get( maf_file )
+        if entry is not None:
+            return entry
+        try:
+            key = self.key( maf_file )
+        except OSError:
+            return None
+        indexes, species, species_chromosomes, blocks = build_maf_index_species_chromosomes( maf_file )
+        if indexes is None:
+            return None
+        entry = self._entry( key )
+        try:
+            if not os.path.isdir( self.cache_dir ):
+                os.makedirs( self.cache_dir )
+            self._write( entry.species_filename, lambda out: write_species_chromosomes( out, species, species_chromosomes ) )
+            self._write( entry.index_filename, indexes.write )
+        except ( IOError, OSError ), e:
+            log.debug( 'Unable to cache MAF index of %s in %s: %s' % ( maf_file, self.cache_dir, e ) )
+            return None
+        self.evict( keep = key )
+        return entry
+
+    def _write( self, filename, writer ):
+        fd, temp_filename = tempfile.mkstemp( dir = self.cache_dir, prefix = self.TEMP_PREFIX )
+        try:
+            out = os.fdopen( fd, 'wb' )
+            try:
+                writer( out )
+            finally:
+                out.close()
+            os.rename( temp_filename, filename )
+        except:
+            remove_temp_index_file( temp_filename )
+            raise
+
+    def evict( self, keep = None ):
+        """Removes the least recently used entries (other than keep) while the cache is too large."""
+        entries = []
+        total_size = 0
+        now = time.time()
+        for filename in os.listdir( self.cache_dir ):
+            if not filename.endswith( self.INDEX_SUFFIX ):
+                self._remove_abandoned( filename, now )
+                continue
+            key = filename[ :-len( self.INDEX_SUFFIX ) ]
+            entry = self._entry( key )
+            try:
+                size = os.path.getsize( entry.index_filename )
+                last_use = os.path.getmtime( entry.index_filename )
+                if os.path.exists( entry.species_filename ):
+                    size += os.path.getsize( entry.species_filename )
+            except OSError:
+                #removed by another job
+                continue
+            total_size += size
+            if key != keep:
+                entries.append( ( last_use, size, entry ) )
+        entries.sort( key = lambda entry: entry[0] )
+        for last_use, size, entry in entries:
+            if total_size <= self.max_size:
+                break
+            remove_temp_index_file( entry.index_filename )
+            remove_temp_index_file( entry.species_filename )
+            total_size -= size
+
+    def _remove_abandoned( self, filename, now ):
+        """Removes filename if it is an old temp file, or an old species file whose index was never written."""
+        path = os.path.join( self.cache_dir, filename )
+        if filename.endswith( self.SPECIES_SUFFIX ):
+            if os.path.exists( path[ :-len( self.SPECIES_SUFFIX ) ] + self.INDEX_SUFFIX ):
+                return
+        elif not filename.startswith( self.TEMP_PREFIX ):
+            return
+        try:
+            if now - os.path.getmtime( path ) > self.ABANDONED_FILE_AGE:
+                remove_temp_index_file( path )
+        except OSError:
+            #removed by another job
+            pass
+
 def component_overlaps_region( c, region ):
     if c is None: return False
     start, end = c.get_forward_strand_start(), c.get_forward_strand_end()
@@ -603,7 +784,14 @@ def sort_block_components_by_block( block1, block2 ):
     #occurs in-place
     return block1.components.sort( cmp = lambda x, y: block2.components.index( x ) - block2.components.index( y ) )
 
-def get_species_in_maf( maf_filename ):
+def get_species_in_maf( maf_filename, cache = None ):
+    if cache is None:
+        cache = MafIndexCache.from_environment()
+    if cache is not None:
+        #the species are listed alongside the cached index
+        entry = cache.get_or_build( maf_filename )
+        if entry is not None:
+            return entry.get_species_chromosomes()[0]
     species = []
     for block in bx.align.maf.Reader( open( maf_filename ) ):
         for spec in get_species_in_block( block ):
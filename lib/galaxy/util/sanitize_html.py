@@ -76,15 +76,47 @@ class _BaseHTMLProcessor(sgmllib.SGMLParser):
         return j
 
     def feed(self, data):
-        data = re.compile(r'<!((?!DOCTYPE|--|\[))', re.IGNORECASE).sub(r'&lt;!\1', data)
+        sgmllib.SGMLParser.feed(self, self.preprocess(data))
+        sgmllib.SGMLParser.close(self)
+
+    def preprocess(self, data):
+        for step in self.preprocess_steps():
+            data = step(data)
+        return data
+
+    def preprocess_steps(self):
+        '''Return the replacements made by preprocess, in order'''
+        return [self._escape_declarations, self._expand_shorttags, self._replace_quote_references, self._encode]
+
+    def _escape_declarations(self, data):
+        return re.compile(r'<!((?!DOCTYPE|--|\[))', re.IGNORECASE).sub(r'&lt;!\1', data)
+
+    def _expand_shorttags(self, data):
         #data = re.sub(r'<(\S+?)\s*?/>', self._shorttag_replace, data) # bug [ 1399464 ] Bad regexp for _shorttag_replace
-        data = re.sub(r'<([^<>\s]+?)\s*/>', self._shorttag_replace, data)
+        return re.sub(r'<([^<>\s]+?)\s*/>', self._shorttag_replace, data)
+
+    def _replace_quote_references(self, data):
         data = data.replace('&#39;', "'")
-        data = data.replace('&#34;', '"')
+        return data.replace('&#34;', '"')
+
+    def _encode(self, data):
         if self.encoding and type(data) == type(u''):
             data = data.encode(self.encoding)
+        return data
+
+    def feed_chunk(self, data):
+        '''Feeds part of the preprocessed document, see iter_sanitized_html'''
         sgmllib.SGMLParser.feed(self, data)
-        sgmllib.SGMLParser.close(self)
+
+    def buffered_size(self):
+        '''Return the size of the data fed but not yet processed (e.g. an unterminated tag)'''
+        return len(self.rawdata)
+
+    def pop_output(self):
+        '''Return the HTML processed since the last call'''
+        output = ''.join([str(p) for p in self.pieces])
+        self.pieces = []
+        return output
 
     def normalize_attrs(self, attrs):
         if not attrs: return attrs
@@ -439,3 +471,84 @@ def sanitize_html(htmlSource, encoding="utf-8", type="text/html"):
     data = p.output()
     data = data.strip().replace('\r\n', '\n')
     return data
+
+# Where the text starts that each step of preprocess may still replace
+# differently once more of the document follows
+def _unfinished_declaration(data):
+    # '<!DOCTYPE' is the longest text the declaration pattern looks at
+    i = data.find('<', max(len(data) - 8, 0))
+    return i if i >= 0 else len(data)
+
+_shorttag_prefix = re.compile(r'([^<>\s]+\s*/?)?\Z')
+
+def _unfinished_shorttag(data):
+    # a short tag cannot contain another '<', e.g. '<br /' before the '>'
+    i = data.rfind('<')
+    if i >= 0 and _shorttag_prefix.match(data, i + 1):
+        return i
+    return len(data)
+
+def _unfinished_reference(data):
+    # '&#39;' and '&#34;'
+    i = data.find('&', max(len(data) - 4, 0))
+    return i if i >= 0 else len(data)
+
+def iter_sanitized_html(chunks, encoding="utf-8", type="text/html"):
+    """
+    Sanitizes the HTML document read in chunks (e.g. from a file), yielding
+    the sanitized HTML as it is produced; joined, the output is that of
+    sanitize_html for the whole document.
+    """
+    p = _HTMLSanitizer(encoding, type)
+    # Each step of preprocess is applied to the text before where it may
+    # still replace differently; the rest is held back (as it was before
+    # the step) until more of the document follows
+    steps = zip(p.preprocess_steps(), [_unfinished_declaration, _unfinished_shorttag, _unfinished_reference, len])
+    held = [''] * len(steps)
+    # Held text and unterminated tags are scanned again with every chunk,
+    # so while they are long, chunks are collected until they are as long
+    waiting = []
+    waiting_size = 0
+    # Whitespace is only output once it is followed by more output, as the
+    # whole output is stripped; a '\r' may be followed by a '\n'
+    pending = ''
+    started = False
+    for chunk in chunks:
+        waiting.append(chunk)
+        waiting_size += len(chunk)
+        if waiting_size < sum(map(len, held)) + p.buffered_size():
+            continue
+        data = ''.join(waiting)
+        waiting = []
+        waiting_size = 0
+        for i, (step, find_unfinished) in enumerate(steps):
+            data = held[i] + data
+            cut = find_unfinished(data)
+            data, held[i] = step(data[:cut]), data[cut:]
+        if data:
+            p.feed_chunk(data)
+        output = p.pop_output()
+        if not output:
+            continue
+        if not started:
+            output = output.lstrip()
+            if not output:
+                continue
+            started = True
+        output = pending + output
+        stripped = output.rstrip()
+        pending = output[len(stripped):]
+        if stripped:
+            yield stripped.replace('\r\n', '\n')
+    data = ''.join(waiting)
+    for text, (step, find_unfinished) in zip(held, steps):
+        data = step(text + data)
+    if data:
+        p.feed_chunk(data)
+    p.close()
+    output = p.pop_output()
+    if not started:
+        output = output.lstrip()
+    output = (pending + output).rstrip()
+    if output:
+        yield output.replace('\r\n', '\n')
@@ -1,9 +1,12 @@
 """
-A simple wrapper for writing tarballs as a stream.
+Simple wrappers for writing tarballs and zip archives as a stream.
 """
 import os
 import logging
+import struct
 import tarfile
+import time
+import zlib
 from galaxy.exceptions import ObjectNotFound
 
 log = logging.getLogger( __name__ )
@@ -40,19 +43,198 @@ class StreamBall( object ):
         return []
 
 
-class ZipBall(object):
-    def __init__(self, tmpf, tmpd):
-        self._tmpf = tmpf
-        self._tmpd = tmpd
+# Zip archive records, see the .ZIP File Format Specification (APPNOTE.TXT)
+LOCAL_FILE_HEADER = struct.Struct( '<IHHHHHIIIHH' )
+LOCAL_FILE_HEADER_SIGNATURE = 0x04034b50
+DATA_DESCRIPTOR = struct.Struct( '<IIII' )
+ZIP64_DATA_DESCRIPTOR = struct.Struct( '<IIQQ' )
+DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+CENTRAL_DIRECTORY_HEADER = struct.Struct( '<IHHHHHHIIIHHHHHII' )
+CENTRAL_DIRECTORY_HEADER_SIGNATURE = 0x02014b50
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct( '<IQHHIIQQQQ' )
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06064b50
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct( '<IIQI' )
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE = 0x07064b50
+END_OF_CENTRAL_DIRECTORY = struct.Struct( '<IHHHHIIH' )
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = 0x06054b50
+ZIP64_EXTRA_ID = 0x0001
+# Sizes and offsets from here on are stored in zip64 extra fields, as by zipfile
+ZIP64_LIMIT = ( 1 << 31 ) - 1
+ZIP_FILECOUNT_LIMIT = ( 1 << 16 ) - 1
+ZIP_MAX = 0xffffffff
+# version 2.0 (deflate, data descriptors), 4.5 (zip64); made on unix
+VERSION = 20
+ZIP64_VERSION = 45
+CREATE_SYSTEM = 3
+# general purpose flags: sizes and CRC follow the data, UTF-8 names
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+STORED = 0
+DEFLATED = 8
 
-    def stream(self, environ, start_response):
-        response_write = start_response( self.wsgi_status, self.wsgi_headeritems )
-        tmpfh = open( self._tmpf )
-        response_write(tmpfh.read())
-        tmpfh.close()
+DEFAULT_COMPRESSION_LEVEL = 6
+# The first chunk of each file is compressed on trial; if it does not shrink
+# to this fraction of its size, the file (BAM, gzipped, ...) is stored
+# instead of spending CPU time on deflating it.
+MIN_COMPRESSION_RATIO = 0.9
+CHUNK_SIZE = 1048576
+
+
+class ZipStreamBall( object ):
+    """
+    Writes a zip archive of files as a stream, while reading the files, so
+    neither temporary space nor time to build the archive is needed before
+    the first bytes are sent. Entries are deflated with compression_level
+    (0 stores them); the CRC and sizes of each entry follow its data in a
+    data descriptor, and zip64 records are used for large files and
+    archives. Used like StreamBall.
+    """
+
+    def __init__( self, compression_level=DEFAULT_COMPRESSION_LEVEL ):
+        self.compression_level = compression_level
+        self.members = []
+        self.wsgi_status = None
+        self.wsgi_headeritems = None
+
+    def add( self, file, relpath, check_file=False ):
+        # Missing files are reported now, since errors cannot be reported once streaming
+        if not os.path.isfile( file ):
+            if check_file:
+                raise ObjectNotFound
+            raise IOError( "No such file: %s" % file )
+        self.members.append( ( file, relpath ) )
+
+    def stream( self, environ, start_response ):
+        start_response( self.wsgi_status, self.wsgi_headeritems )
+        return self.iter_archive()
+
+    def iter_archive( self ):
+        """Yields the archive in chunks."""
+        offset = 0
+        central_directory = []
+        for file, relpath in self.members:
+            entry = _ZipEntry( file, relpath, offset )
+            for data in entry.write( self.compression_level ):
+                offset += len( data )
+                yield data
+            central_directory.append( entry.central_directory_header() )
+        directory_offset = offset
+        directory_size = sum( len( header ) for header in central_directory )
+        for header in central_directory:
+            yield header
+        count = len( central_directory )
+        if count > ZIP_FILECOUNT_LIMIT or directory_offset > ZIP64_LIMIT or directory_size > ZIP64_LIMIT:
+            yield ZIP64_END_OF_CENTRAL_DIRECTORY.pack( ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE, ZIP64_END_OF_CENTRAL_DIRECTORY.size - 12,
+                                                       ZIP64_VERSION, ZIP64_VERSION, 0, 0, count, count, directory_size, directory_offset )
+            yield ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.pack( ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE, 0,
+                                                               directory_offset + directory_size, 1 )
+            count = min( count, 0xffff )
+            directory_size = min( directory_size, ZIP_MAX )
+            directory_offset = min( directory_offset, ZIP_MAX )
+        yield END_OF_CENTRAL_DIRECTORY.pack( END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, 0, count, count, directory_size, directory_offset, 0 )
+
+
+class _ZipEntry( object ):
+    """A file being written to a ZipStreamBall, starting at offset."""
+
+    def __init__( self, file, relpath, offset ):
+        self.file = file
+        self.offset = offset
+        self.name, self.flags = _encode_name( relpath )
+        self.flags |= FLAG_DATA_DESCRIPTOR
+        stat = os.stat( file )
+        self.external_attr = ( stat.st_mode & 0xffff ) << 16
+        self.date_time = time.localtime( stat.st_mtime )[ :6 ]
+        # Whether the sizes (deflating might even grow them) can exceed the zip limits is known in advance
+        self.zip64 = stat.st_size > ZIP64_LIMIT
+        self.method = STORED
+        self.crc = 0
+        self.compressed_size = 0
+        self.size = 0
+
+    def write( self, compression_level ):
+        """Yields the local file header, the (compressed) file and the data descriptor."""
+        fh = open( self.file, 'rb' )
         try:
-            os.unlink( self._tmpf )
-            os.rmdir( self._tmpd )
-        except OSError:
-            log.exception( "Unable to remove temporary library download archive and directory" )
-        return []
+            chunk = fh.read( CHUNK_SIZE )
+            compressor = None
+            data = chunk
+            if compression_level and chunk:
+                compressor = zlib.compressobj( compression_level, zlib.DEFLATED, -15 )
+                data = compressor.compress( chunk ) + compressor.flush( zlib.Z_SYNC_FLUSH )
+                if len( data ) > len( chunk ) * MIN_COMPRESSION_RATIO:
+                    compressor = None
+                    data = chunk
+                else:
+                    self.method = DEFLATED
+            yield self.local_file_header()
+            while chunk:
+                self.crc = zlib.crc32( chunk, self.crc )
+                self.size += len( chunk )
+                if data:
+                    self.compressed_size += len( data )
+                    yield data
+                chunk = fh.read( CHUNK_SIZE )
+                data = chunk
+                if compressor is not None:
+                    data = compressor.compress( chunk )
+            if compressor is not None:
+                data = compressor.flush()
+                self.compressed_size += len( data )
+                yield data
+        finally:
+            fh.close()
+        self.crc &= 0xffffffff
+        if self.zip64:
+            yield ZIP64_DATA_DESCRIPTOR.pack( DATA_DESCRIPTOR_SIGNATURE, self.crc, self.compressed_size, self.size )
+        else:
+            yield DATA_DESCRIPTOR.pack( DATA_DESCRIPTOR_SIGNATURE, self.crc, self.compressed_size, self.size )
+
+    def local_file_header( self ):
+        version = VERSION
+        extra = ''
+        size = 0
+        if self.zip64:
+            version = ZIP64_VERSION
+            size = ZIP_MAX
+            extra = struct.pack( '<HHQQ', ZIP64_EXTRA_ID, 16, 0, 0 )
+        dos_time, dos_date = _dos_date_time( self.date_time )
+        return LOCAL_FILE_HEADER.pack( LOCAL_FILE_HEADER_SIGNATURE, version, self.flags, self.method, dos_time, dos_date,
+                                       0, size, size, len( self.name ), len( extra ) ) + self.name + extra
+
+    def central_directory_header( self ):
+        version = VERSION
+        sizes = []
+        size, compressed_size, offset = self.size, self.compressed_size, self.offset
+        if self.zip64 or size > ZIP64_LIMIT or compressed_size > ZIP64_LIMIT:
+            sizes = [ size, compressed_size ]
+            size = compressed_size = ZIP_MAX
+        if offset > ZIP64_LIMIT:
+            sizes.append( offset )
+            offset = ZIP_MAX
+        extra = ''
+        if sizes:
+            version = ZIP64_VERSION
+            extra = struct.pack( '<HH%dQ' % len( sizes ), ZIP64_EXTRA_ID, 8 * len( sizes ), *sizes )
+        dos_time, dos_date = _dos_date_time( self.date_time )
+        return CENTRAL_DIRECTORY_HEADER.pack( CENTRAL_DIRECTORY_HEADER_SIGNATURE, CREATE_SYSTEM << 8 | version, version,
+                                              self.flags, self.method, dos_time, dos_date, self.crc, compressed_size, size,
+                                              len( self.name ), len( extra ), 0, 0, 0, self.external_attr, offset ) + self.name + extra
+
+
+def _encode_name( name ):
+    # Returns the name as stored in the archive and the flags for its encoding (CP437 if possible, like the zip
+    # archives built before, otherwise UTF-8)
+    if not isinstance( name, unicode ):
+        name = name.decode( 'utf-8', 'replace' )
+    try:
+        return name.encode( 'CP437' ), 0
+    except UnicodeEncodeError:
+        return name.encode( 'utf-8' ), FLAG_UTF8
+
+
+def _dos_date_time( date_time ):
+    year, month, day, hour, minute, second = date_time
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    return hour << 11 | minute << 5 | second // 2, ( year - 1980 ) << 9 | month << 5 | day
@@ -1,9 +1,40 @@
+import hashlib
+import threading
+
 import pkg_resources
 pkg_resources.require( "Cheetah" )
 
 from Cheetah.Template import Template
 
+from galaxy.util.lrucache import LRUCache
+
+# Compiled template classes keyed by a hash of their text, so that templates
+# filled over and over (such as tool command lines for every job) are only
+# parsed and compiled once.
+COMPILED_TEMPLATE_CACHE_SIZE = 1000
+_compiled_templates = LRUCache( COMPILED_TEMPLATE_CACHE_SIZE )
+_compiled_templates_lock = threading.Lock()
+
+
+def compile_template( template_text ):
+    """
+    Return the compiled Cheetah class for `template_text`, compiling it only
+    if it isn't in the cache. Instantiate it with a `searchList` to fill it.
+    """
+    is_unicode = isinstance( template_text, unicode )
+    text = template_text.encode( 'utf-8' ) if is_unicode else template_text
+    key = ( is_unicode, hashlib.sha1( text ).hexdigest() )
+    with _compiled_templates_lock:
+        template_class = _compiled_templates[ key ]
+    if template_class is None:
+        # Cheetah's own compile cache is unbounded, leave the caching to the LRU
+        template_class = Template.compile( source=template_text, cacheCompilationResults=False, keepRefToGeneratedCode=False )
+        with _compiled_templates_lock:
+            _compiled_templates[ key ] = template_class
+    return template_class
+
+
 def fill_template( template_text, context=None, **kwargs ):
     if not context:
         context = kwargs
-    return str( Template( source=template_text, searchList=[context] ) )
+    return str( compile_template( template_text )( searchList=[context] ) )
@@ -0,0 +1,204 @@
+"""
+Caches for the data that visualizations read from datasets.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from galaxy.util.json import dumps, loads
+
+import logging
+log = logging.getLogger( __name__ )
+
+
+class RegionDataCache( object ):
+    """
+    LRU cache of region data results, bounded by the total (serialized) size
+    of the results. Keys should identify the dataset version and the
+    conversions used, so that changed datasets are simply never hit again and
+    age out of the cache.
+
+    Results are kept serialized, so every get returns a new copy that callers
+    are free to change.
+    """
+
+    # Request parameters that do not change the result: the API key and, as
+    # anything starting with '_', the cache busters added by the client.
+    IGNORED_PARAMS = ( 'key', )
+
+    def __init__( self, max_size ):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dataset_key( dataset ):
+        """
+        Returns a key identifying the current state of dataset and of the
+        converted datasets that data is read from.
+        """
+        conversions = tuple( sorted( ( assoc.type, assoc.id ) for assoc in dataset.implicitly_converted_datasets
+                                     if not assoc.deleted ) )
+        return ( dataset.__class__.__name__, dataset.id, str( dataset.update_time ), conversions )
+
+    @classmethod
+    def region_key( cls, dataset, chrom, low, high, start_val, max_vals, params ):
+        """
+        Returns the key of the data read from a region of dataset with the
+        request parameters params.
+        """
+        params = tuple( sorted( ( k, str( v ) ) for k, v in params.items()
+                                if k not in cls.IGNORED_PARAMS and not k.startswith( '_' ) ) )
+        return ( cls.dataset_key( dataset ), chrom, low, high, start_val, max_vals, params )
+
+    def get( self, key ):
+        """Returns the result cached for key, or None."""
+        if not self.max_size:
+            return None
+        with self._lock:
+            entry = self._entries.pop( key, None )
+            if entry is None:
+                return None
+            self._entries[ key ] = entry
+        return loads( entry[ 0 ] )
+
+    def put( self, key, result ):
+        if not self.max_size:
+            return
+        try:
+            serialized = dumps( result )
+        except Exception:
+            log.debug( "Not caching region data that cannot be serialized" )
+            return
+        size = len( serialized )
+        if size > self.max_size / 4:
+            # Results this large would just flush the cache
+            return
+        with self._lock:
+            old_entry = self._entries.pop( key, None )
+            if old_entry is not None:
+                self.size -= old_entry[ 1 ]
+            self._entries[ key ] = ( serialized, size )
+            self.size += size
+            while self.size > self.max_size:
+                evicted_size = self._entries.popitem( last=False )[ 1 ][ 1 ]
+                self.size -= evicted_size
+
+    def clear( self ):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class FileHandlePool( object ):
+    """
+    Process-wide pool of open, indexed files (tabix, BAM, bigWig, 2bit, ...)
+    so that their indexes and headers are not read again for every request.
+
+    A checked out handle is used by one thread only until it is checked in
+    again. Handles are keyed by their files' paths, sizes and modification
+    times, so a file that changes on disk is opened anew. At most
+    max_idle_handles are kept open while idle, and none longer than
+    max_idle_time seconds.
+    """
+
+    def __init__( self, max_idle_handles=64, max_idle_time=300 ):
+        self.max_idle_handles = max_idle_handles
+        self.max_idle_time = max_idle_time
+        # key -> list of ( handle, closer, last use )
+        self._idle = {}
+        # id( handle ) -> ( key, handle, closer ) for checked out handles
+        self._checked_out = {}
+        self._lock = threading.Lock()
+
+    def checkout( self, filenames, opener, closer=None ):
+        """
+        Returns an idle handle for filenames, or opener( *filenames ) if there
+        is none. closer( handle ) closes the handle (default: handle.close()).
+        """
+        filenames = tuple( filenames )
+        key = ( opener, filenames, tuple( self._file_version( filename ) for filename in filenames ) )
+        handle = None
+        with self._lock:
+            expired = self._expire( time.time() )
+            idle = self._idle.get( key )
+            if idle:
+                handle, closer, last_use = idle.pop()
+                if not idle:
+                    del self._idle[ key ]
+        for entry in expired:
+            self._close( entry[ 0 ], entry[ 1 ] )
+        if handle is None:
+            handle = opener( *filenames )
+        with self._lock:
+            self._checked_out[ id( handle ) ] = ( key, handle, closer )
+        return handle
+
+    def checkin( self, handle ):
+        """Returns a checked out handle to the pool."""
+        now = time.time()
+        with self._lock:
+            key, handle, closer = self._checked_out.pop( id( handle ) )
+            self._idle.setdefault( key, [] ).append( ( handle, closer, now ) )
+            to_close = self._expire( now )
+            entries = [ ( entry[ 2 ], key, entry ) for key, idle in self._idle.items() for entry in idle ]
+            if len( entries ) > self.max_idle_handles:
+                entries.sort()
+                for last_use, key, entry in entries[ :len( entries ) - self.max_idle_handles ]:
+                    self._idle[ key ].remove( entry )
+                    if not self._idle[ key ]:
+                        del self._idle[ key ]
+                    to_close.append( entry )
+        for entry in to_close:
+            self._close( entry[ 0 ], entry[ 1 ] )
+
+    def discard( self, handle ):
+        """Closes a checked out handle instead of returning it to the pool."""
+        with self._lock:
+            key, handle, closer = self._checked_out.pop( id( handle ) )
+        self._close( handle, closer )
+
+    def clear( self ):
+        """Closes all idle handles."""
+        with self._lock:
+            entries = [ entry for idle in self._idle.values() for entry in idle ]
+            self._idle.clear()
+        for entry in entries:
+            self._close( entry[ 0 ], entry[ 1 ] )
+
+    def _expire( self, now ):
+        # Must be called with the lock held; returns the entries to close.
+        expired = []
+        for key, idle in self._idle.items():
+            fresh = [ entry for entry in idle if now - entry[ 2 ] <= self.max_idle_time ]
+            if len( fresh ) < len( idle ):
+                expired.extend( entry for entry in idle if now - entry[ 2 ] > self.max_idle_time )
+                if fresh:
+                    self._idle[ key ] = fresh
+                else:
+                    del self._idle[ key ]
+        return expired
+
+    @staticmethod
+    def _file_version( filename ):
+        try:
+            stat = os.stat( filename )
+        except OSError:
+            return None
+        return ( stat.st_size, stat.st_mtime )
+
+    @staticmethod
+    def _close( handle, closer ):
+        try:
+            if closer is not None:
+                closer( handle )
+            else:
+                handle.close()
+        except Exception:
+            log.debug( "Unable to close pooled file handle %s", handle, exc_info=True )
+
+
+# Shared by all data providers and genomes of the process.
+file_handle_pool = FileHandlePool()
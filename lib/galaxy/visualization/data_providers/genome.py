@@ -19,6 +19,8 @@ from pysam import csamtools, ctabix
 from galaxy.datatypes.util.gff_util import convert_gff_coords_to_bed, GFFFeature, GFFInterval, GFFReaderWrapper, parse_gff_attributes
 from galaxy.util.json import loads
 from galaxy.visualization.data_providers.basic import BaseDataProvider
+from galaxy.visualization.data_providers.cache import file_handle_pool
+from galaxy.visualization.data_providers.summary_pyramid import SummaryPyramid
 from galaxy.visualization.data_providers.cigar import get_ref_based_read_seq_and_cigar
 from galaxy.datatypes.interval import Bed, Gff, Gtf
 
@@ -60,6 +62,31 @@ def _convert_between_ucsc_and_ensemble_naming( chrom ):
         # Convert from Ensembl to UCSC
         return 'chr' + chrom
 
+#
+# Openers for the file handle pool; they are part of the pool keys, so they
+# have to be module level functions.
+#
+
+def _open_tabix( filename, index_filename ):
+    return ctabix.Tabixfile( filename, index_filename=index_filename )
+
+def _open_bam( filename, index_filename ):
+    return csamtools.Samfile( filename=filename, mode='rb', index_filename=index_filename )
+
+def _open_bigwig( filename ):
+    f = open( filename )
+    return f, BigWigFile( file=f )
+
+def _open_bigbed( filename ):
+    f = open( filename )
+    return f, BigBedFile( file=f )
+
+def _close_bbi( handle ):
+    handle[ 0 ].close()
+
+def _open_summary_pyramid( filename ):
+    return SummaryPyramid( open( filename, 'rb' ) )
+
 def _chrom_naming_matches( chrom1, chrom2 ):
     return ( chrom1.startswith( 'chr' ) and chrom2.startswith( 'chr' ) ) or ( not chrom1.startswith( 'chr' ) and not chrom2.startswith( 'chr' ) )
 
@@ -137,8 +164,28 @@ class GenomeDataProvider( BaseDataProvider ):
 
         # File/pointer where data is obtained from. It is useful to set this for repeated
         # queries, such as is necessary for genome-wide data.
-        # TODO: add functions to (a) create data_file and (b) clean up data_file.
         self.data_file = None
+        # Handles checked out from the file handle pool.
+        self.pooled_files = []
+
+    def open_data_file( self, filenames, opener, closer=None ):
+        """
+        Returns opener( *filenames ), reusing an idle handle of the process-wide
+        file handle pool if there is one. The handle is this provider's until
+        release_data_files is called.
+        """
+        handle = file_handle_pool.checkout( filenames, opener, closer=closer )
+        self.pooled_files.append( handle )
+        return handle
+
+    def release_data_files( self ):
+        """
+        Returns the handles from open_data_file to the pool; iterators over
+        them must not be used afterwards.
+        """
+        self.data_file = None
+        while self.pooled_files:
+            file_handle_pool.checkin( self.pooled_files.pop() )
 
     def write_data_to_file( self, regions, filename ):
         """
@@ -181,8 +228,11 @@ class GenomeDataProvider( BaseDataProvider ):
             dataset_type, data
         """
         start, end = int( low ), int( high )
-        iterator = self.get_iterator( chrom, start, end, **kwargs )
-        return self.process_data( iterator, start_val, max_vals, start=start, end=end, **kwargs )
+        try:
+            iterator = self.get_iterator( chrom, start, end, **kwargs )
+            return self.process_data( iterator, start_val, max_vals, start=start, end=end, **kwargs )
+        finally:
+            self.release_data_files()
 
     def get_genome_data( self, chroms_info, **kwargs ):
         """
@@ -355,7 +405,7 @@ class TabixDataProvider( FilterableMixin, GenomeDataProvider ):
         bgzip_fname = self.dependencies['bgzip'].file_name
 
         if not self.data_file:
-            self.data_file = ctabix.Tabixfile(bgzip_fname, index_filename=self.converted_dataset.file_name)
+            self.data_file = self.open_data_file( ( bgzip_fname, self.converted_dataset.file_name ), _open_tabix )
 
         # Get iterator using either naming scheme.
         iterator = iter( [] )
@@ -373,14 +423,17 @@ class TabixDataProvider( FilterableMixin, GenomeDataProvider ):
     def write_data_to_file( self, regions, filename ):
         out = open( filename, "w" )
 
-        for region in regions:
-            # Write data in region.
-            chrom = region.chrom
-            start = region.start
-            end = region.end
-            iterator = self.get_iterator( chrom, start, end )
-            for line in iterator:
-                out.write( "%s\n" % line )
+        try:
+            for region in regions:
+                # Write data in region.
+                chrom = region.chrom
+                start = region.start
+                end = region.end
+                iterator = self.get_iterator( chrom, start, end )
+                for line in iterator:
+                    out.write( "%s\n" % line )
+        finally:
+            self.release_data_files()
 
         out.close()
 
@@ -882,7 +935,7 @@ class BamDataProvider( GenomeDataProvider, FilterableMixin ):
         index_filename = self.converted_dataset.file_name
 
         # Attempt to open the BAM file with index
-        bamfile = csamtools.Samfile( filename=orig_data_filename, mode='rb', index_filename=index_filename )
+        bamfile = self.open_data_file( ( orig_data_filename, index_filename ), _open_bam )
         try:
             data = bamfile.fetch( start=start, end=end, reference=chrom )
         except ValueError, e:
@@ -1141,12 +1194,21 @@ class BBIDataProvider( GenomeDataProvider ):
 
     def has_data( self, chrom ):
         f, bbi = self._get_dataset()
-        all_dat = bbi.query( chrom, 0, 2147483647, 1 ) or \
-                  bbi.query( _convert_between_ucsc_and_ensemble_naming( chrom ), 0, 2147483647, 1 )
-        f.close()
+        try:
+            all_dat = bbi.query( chrom, 0, 2147483647, 1 ) or \
+                      bbi.query( _convert_between_ucsc_and_ensemble_naming( chrom ), 0, 2147483647, 1 )
+        finally:
+            self.release_data_files()
         return all_dat is not None
 
     def get_data( self, chrom, start, end, start_val=0, max_vals=None, num_samples=1000, **kwargs ):
+        try:
+            return self._get_data( chrom, start, end, start_val=start_val, max_vals=max_vals,
+                                   num_samples=num_samples, **kwargs )
+        finally:
+            self.release_data_files()
+
+    def _get_data( self, chrom, start, end, start_val=0, max_vals=None, num_samples=1000, **kwargs ):
         start = int( start )
         end = int( end )
 
@@ -1166,7 +1228,6 @@ class BBIDataProvider( GenomeDataProvider ):
         # to determine the default range.
         if 'stats' in kwargs:
             summary = _summarize_bbi( bbi, chrom, start, end, 1 )
-            f.close()
 
             min_val = 0
             max_val = 0
@@ -1250,8 +1311,6 @@ class BBIDataProvider( GenomeDataProvider ):
 
         result = summarize_region( bbi, chrom, start, end, num_points )
 
-        # Cleanup and return.
-        f.close()
         return {
             'data': result,
             'dataset_type': self.dataset_type
@@ -1260,8 +1319,7 @@ class BBIDataProvider( GenomeDataProvider ):
 class BigBedDataProvider( BBIDataProvider ):
     def _get_dataset( self ):
         # Nothing converts to bigBed so we don't consider converted dataset
-        f = open( self.original_dataset.file_name )
-        return f, BigBedFile(file=f)
+        return self.open_data_file( ( self.original_dataset.file_name, ), _open_bigbed, closer=_close_bbi )
 
 class BigWigDataProvider ( BBIDataProvider ):
     """
@@ -1270,10 +1328,54 @@ class BigWigDataProvider ( BBIDataProvider ):
     """
     def _get_dataset( self ):
         if self.converted_dataset is not None:
-            f = open( self.converted_dataset.file_name )
+            filename = self.converted_dataset.file_name
         else:
-            f = open( self.original_dataset.file_name )
-        return f, BigWigFile(file=f)
+            filename = self.original_dataset.file_name
+        return self.open_data_file( ( filename, ), _open_bigwig, closer=_close_bbi )
+
+class SummaryPyramidDataProvider( GenomeDataProvider ):
+    """
+    Provides coverage data and stats from summary pyramids, in the same
+    format as the BigWig data provider.
+    """
+
+    dataset_type = 'bigwig'
+
+    def _get_pyramid( self, chrom ):
+        """
+        Returns the summary pyramid and the name it uses for chrom (or None if
+        it has no data for chrom under either naming convention).
+        """
+        pyramid = self.open_data_file( ( self.converted_dataset.file_name, ), _open_summary_pyramid )
+        if chrom not in pyramid.chroms:
+            chrom = _convert_between_ucsc_and_ensemble_naming( chrom )
+            if chrom not in pyramid.chroms:
+                chrom = None
+        return pyramid, chrom
+
+    def has_data( self, chrom ):
+        try:
+            return self._get_pyramid( chrom )[ 1 ] is not None
+        finally:
+            self.release_data_files()
+
+    def get_data( self, chrom, start, end, start_val=0, max_vals=None, num_samples=1000, **kwargs ):
+        start, end = int( start ), int( end )
+        try:
+            pyramid, pyramid_chrom = self._get_pyramid( chrom )
+            if 'stats' in kwargs:
+                if pyramid_chrom is None:
+                    return dict( data=dict( min=0, max=0, mean=0, sd=0 ) )
+                return dict( data=pyramid.stats( pyramid_chrom, start, end ) )
+            data = []
+            if pyramid_chrom is not None:
+                data = pyramid.summarize( pyramid_chrom, start, end, int( num_samples ) )
+        finally:
+            self.release_data_files()
+        return {
+            'data': data,
+            'dataset_type': self.dataset_type
+        }
 
 class IntervalIndexDataProvider( FilterableMixin, GenomeDataProvider ):
     """
@@ -31,6 +31,7 @@ class DataProviderRegistry( object ):
             "bam": genome.SamDataProvider,
             "bigwig": genome.BigWigDataProvider,
             "bigbed": genome.BigBedDataProvider,
+            "summary_pyramid": genome.SummaryPyramidDataProvider,
 
             "column_with_stats": ColumnDataProvider
         }
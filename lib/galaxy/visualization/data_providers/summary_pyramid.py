@@ -0,0 +1,237 @@
+"""
+Summary pyramids: precomputed coverage summaries of interval datasets at
+power-of-two resolutions, so that coverage and stats queries for large
+regions only read a number of bins proportional to the size of the answer.
+
+File layout (little endian):
+
+    header:     magic 'GSPY', version (uint32), base shift (uint32),
+                number of chroms (uint32), directory offset (uint64)
+    levels:     per chrom and level, the non-empty bins sorted by index as
+                records of index (uint32), covered bases (uint32), sum and
+                sum of squares of the per-base depth (float64), minimum and
+                maximum depth (float32)
+    directory:  per chrom, its name (uint16 length + bytes), number of
+                levels (uint16) and per level the offset (uint64) and number
+                of bins (uint32)
+
+Bins of level L span 2 ** ( base shift + L ) bases; bin i of a level covers
+[ i * span, ( i + 1 ) * span ). Only covered bases are summarized, as in
+bigWig files.
+"""
+import math
+import struct
+
+MAGIC = 'GSPY'
+VERSION = 1
+# Bins of the finest level span 2 ** 8 = 256 bases
+DEFAULT_BASE_SHIFT = 8
+MAX_LEVELS = 32
+
+HEADER = struct.Struct( '<4sIIIQ' )
+RECORD = struct.Struct( '<IIddff' )
+LEVEL = struct.Struct( '<QI' )
+COUNT = struct.Struct( '<H' )
+
+
+def write_summary_pyramid( out, chrom_intervals, base_shift=DEFAULT_BASE_SHIFT ):
+    """
+    Writes the summary pyramid of chrom_intervals, an iterable of
+    ( chrom, starts, ends ) with the (half-open) intervals of each chrom, to
+    the binary file out.
+    """
+    out.write( HEADER.pack( MAGIC, VERSION, base_shift, 0, 0 ) )
+    directory = []
+    for chrom, starts, ends in chrom_intervals:
+        levels = []
+        bins = _coverage_bins( starts, ends, base_shift )
+        while bins:
+            indexes = sorted( bins )
+            levels.append( ( out.tell(), len( indexes ) ) )
+            for index in indexes:
+                valid, total, squares, min_depth, max_depth = bins[ index ]
+                out.write( RECORD.pack( index, valid, total, squares, min_depth, max_depth ) )
+            if indexes[ -1 ] == 0 or len( levels ) == MAX_LEVELS:
+                break
+            bins = _merge_bins( bins )
+        directory.append( ( chrom, levels ) )
+    directory_offset = out.tell()
+    for chrom, levels in directory:
+        out.write( COUNT.pack( len( chrom ) ) + chrom )
+        out.write( COUNT.pack( len( levels ) ) )
+        for offset, count in levels:
+            out.write( LEVEL.pack( offset, count ) )
+    out.seek( 0 )
+    out.write( HEADER.pack( MAGIC, VERSION, base_shift, len( directory ), directory_offset ) )
+
+
+def _coverage_bins( starts, ends, base_shift ):
+    """
+    Returns { bin index: [ covered bases, sum, sum of squares, min, max ] } of
+    the per-base depth of the intervals, found by sweeping over the sorted
+    starts and ends.
+    """
+    bins = {}
+    starts = sorted( starts )
+    ends = sorted( ends )
+    count = len( starts )
+    i = j = 0
+    depth = 0
+    position = 0
+    while j < count:
+        # At equal positions, intervals end before the next ones start.
+        if i < count and starts[ i ] < ends[ j ]:
+            next_position = starts[ i ]
+            delta = 1
+            i += 1
+        else:
+            next_position = ends[ j ]
+            delta = -1
+            j += 1
+        if depth > 0 and next_position > position:
+            _add_segment( bins, position, next_position, depth, base_shift )
+        depth += delta
+        position = next_position
+    return bins
+
+
+def _add_segment( bins, start, end, depth, base_shift ):
+    span = 1 << base_shift
+    for index in xrange( start >> base_shift, ( ( end - 1 ) >> base_shift ) + 1 ):
+        length = min( end, ( index + 1 ) * span ) - max( start, index * span )
+        summary = bins.get( index )
+        if summary is None:
+            bins[ index ] = [ length, depth * length, depth * depth * length, depth, depth ]
+        else:
+            summary[ 0 ] += length
+            summary[ 1 ] += depth * length
+            summary[ 2 ] += depth * depth * length
+            summary[ 3 ] = min( summary[ 3 ], depth )
+            summary[ 4 ] = max( summary[ 4 ], depth )
+
+
+def _merge_bins( bins ):
+    parents = {}
+    for index, summary in bins.iteritems():
+        parent = parents.get( index >> 1 )
+        if parent is None:
+            parents[ index >> 1 ] = list( summary )
+        else:
+            parent[ 0 ] += summary[ 0 ]
+            parent[ 1 ] += summary[ 1 ]
+            parent[ 2 ] += summary[ 2 ]
+            parent[ 3 ] = min( parent[ 3 ], summary[ 3 ] )
+            parent[ 4 ] = max( parent[ 4 ], summary[ 4 ] )
+    return parents
+
+
+class SummaryPyramid( object ):
+    """
+    Reads summaries from a summary pyramid file.
+    """
+
+    def __init__( self, file ):
+        self.file = file
+        magic, version, self.base_shift, chrom_count, directory_offset = HEADER.unpack( file.read( HEADER.size ) )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError( "Not a summary pyramid (version %d) file" % VERSION )
+        file.seek( directory_offset )
+        # chrom -> [ ( offset, number of bins ) of each level ]
+        self.chroms = {}
+        for i in range( chrom_count ):
+            name = file.read( COUNT.unpack( file.read( COUNT.size ) )[ 0 ] )
+            level_count = COUNT.unpack( file.read( COUNT.size ) )[ 0 ]
+            self.chroms[ name ] = [ LEVEL.unpack( file.read( LEVEL.size ) ) for level in range( level_count ) ]
+
+    def close( self ):
+        self.file.close()
+
+    def bin_size( self, level ):
+        return 1 << ( self.base_shift + level )
+
+    def level_for( self, chrom, bin_size ):
+        """Returns the coarsest level of chrom whose bins are at most bin_size bases."""
+        levels = self.chroms.get( chrom, [] )
+        level = 0
+        while level + 1 < len( levels ) and self.bin_size( level + 1 ) <= bin_size:
+            level += 1
+        return level
+
+    def bins( self, chrom, level, start, end ):
+        """
+        Returns ( index, covered bases, sum, sum of squares, min, max ) of the
+        non-empty bins of a level that overlap [ start, end ).
+        """
+        levels = self.chroms.get( chrom )
+        if not levels or level >= len( levels ) or end <= start:
+            return []
+        offset, count = levels[ level ]
+        shift = self.base_shift + level
+        first, last = start >> shift, ( end - 1 ) >> shift
+        # Binary search for the first bin at or after the first index.
+        low, high = 0, count
+        while low < high:
+            middle = ( low + high ) // 2
+            if self._read_index( offset, middle ) < first:
+                low = middle + 1
+            else:
+                high = middle
+        bins = []
+        self.file.seek( offset + low * RECORD.size )
+        for i in range( low, count ):
+            record = RECORD.unpack( self.file.read( RECORD.size ) )
+            if record[ 0 ] > last:
+                break
+            bins.append( record )
+        return bins
+
+    def _read_index( self, offset, i ):
+        self.file.seek( offset + i * RECORD.size )
+        return struct.unpack( '<I', self.file.read( 4 ) )[ 0 ]
+
+    def summarize( self, chrom, start, end, num_points ):
+        """
+        Returns ( position, mean depth ) for the bins of the smallest power of
+        two size (but at least a bin of the finest level) that give at most
+        num_points points for [ start, end ); the mean is None for bins
+        without coverage.
+        """
+        if end <= start:
+            return []
+        shift = self.base_shift
+        while ( ( end - 1 ) >> shift ) - ( start >> shift ) >= max( num_points, 1 ):
+            shift += 1
+        # Levels are only written up to the extent of the data, so for wider
+        # regions the bins of the coarsest level are merged here.
+        level = min( shift - self.base_shift, max( len( self.chroms.get( chrom, [] ) ) - 1, 0 ) )
+        merge_shift = shift - self.base_shift - level
+        sums = {}
+        for record in self.bins( chrom, level, start, end ):
+            index = record[ 0 ] >> merge_shift
+            valid, total = sums.get( index, ( 0, 0 ) )
+            sums[ index ] = ( valid + record[ 1 ], total + record[ 2 ] )
+        return [ ( index << shift, sums[ index ][ 1 ] / sums[ index ][ 0 ] if index in sums else None )
+                 for index in range( start >> shift, ( ( end - 1 ) >> shift ) + 1 ) ]
+
+    def stats( self, chrom, start, end ):
+        """
+        Returns dict( min, max, mean, sd ) of the depth of the covered bases
+        in [ start, end ), read from bins of about a sixteenth of the region
+        (so bins on the edges may extend beyond it).
+        """
+        level = self.level_for( chrom, max( ( end - start ) // 16, 1 ) )
+        valid = total = squares = 0
+        min_depth = max_depth = 0
+        for index, bin_valid, bin_total, bin_squares, bin_min, bin_max in self.bins( chrom, level, start, end ):
+            if not valid:
+                min_depth, max_depth = bin_min, bin_max
+            else:
+                min_depth, max_depth = min( min_depth, bin_min ), max( max_depth, bin_max )
+            valid += bin_valid
+            total += bin_total
+            squares += bin_squares
+        mean = sd = 0
+        if valid:
+            mean = total / valid
+            sd = math.sqrt( max( squares / valid - mean * mean, 0 ) )
+        return dict( min=min_depth, max=max_depth, mean=mean, sd=sd )
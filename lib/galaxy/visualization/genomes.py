@@ -3,6 +3,7 @@ from bx.seq.twobit import TwoBitFile
 from galaxy.util.json import loads
 from galaxy import model, util
 from galaxy.util.bunch import Bunch
+from galaxy.visualization.data_providers.cache import file_handle_pool
 
 log = logging.getLogger( __name__ )
 
@@ -19,6 +20,13 @@ messages = Bunch(
     OK = "ok"
 )
 
+def _open_twobit( filename ):
+    f = open( filename )
+    return f, TwoBitFile( f )
+
+def _close_twobit( handle ):
+    handle[ 0 ].close()
+
 def decode_dbkey( dbkey ):
     """ Decodes dbkey and returns tuple ( username, dbkey )"""
     if ':' in dbkey:
@@ -208,7 +216,10 @@ class Genomes( object ):
             except IOError, e:
                 # Thrown if twobit.loc does not exist.
                 log.exception( "Error reading twobit.loc: %s", e )
-        for key, description in self.app.genome_builds.get_genome_build_names():
+        genome_build_names = self.app.genome_builds.get_genome_build_names()
+        if twobit_table is not None:
+            twobit_fields = twobit_table.get_entry_map( 'value', [ key for key, description in genome_build_names ], 'path' )
+        for key, description in genome_build_names:
             self.genomes[ key ] = Genome( key, description )
             # Add len files to genomes.
             self.genomes[ key ].len_file = self.app.genome_builds.get_chrom_info( key )[0]
@@ -216,9 +227,7 @@ class Genomes( object ):
                 if not os.path.exists( self.genomes[ key ].len_file ):
                     self.genomes[ key ].len_file = None
             # Add genome data (twobit files) to genomes.
-            if twobit_table is not None:
-                self.genomes[ key ].twobit_file = twobit_table.get_entry( 'value', key, 'path', default=None )
-            elif key in twobit_fields:
+            if key in twobit_fields:
                 self.genomes[ key ].twobit_file = twobit_fields[ key ]
                 
 
@@ -380,11 +389,16 @@ class Genomes( object ):
                 twobit_dataset = fasta_dataset.get_converted_dataset( trans, 'twobit' )
                 twobit_file_name = twobit_dataset.file_name
 
-        # Read and return reference data.
+        # Read and return reference data, keeping the twobit file open for
+        # the next request.
         try:
-            twobit = TwoBitFile( open( twobit_file_name ) )
-            if chrom in twobit:
-                seq_data = twobit[chrom].get( int(low), int(high) )
-                return GenomeRegion( chrom=chrom, start=low, end=high, sequence=seq_data )
+            handle = file_handle_pool.checkout( ( twobit_file_name, ), _open_twobit, closer=_close_twobit )
+            try:
+                f, twobit = handle
+                if chrom in twobit:
+                    seq_data = twobit[chrom].get( int(low), int(high) )
+                    return GenomeRegion( chrom=chrom, start=low, end=high, sequence=seq_data )
+            finally:
+                file_handle_pool.checkin( handle )
         except IOError:
             return None
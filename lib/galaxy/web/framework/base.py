@@ -8,6 +8,7 @@ import os.path
 import socket
 import tarfile
 import types
+from email.utils import formatdate
 
 import pkg_resources
 
@@ -376,6 +377,19 @@ class Response( object ):
     def get_content_type( self ):
         return self.headers[ "content-type" ]
 
+    def set_file_validators( self, path ):
+        """
+        Sets the ETag and Last-Modified headers for the contents of the file
+        at path (from its size and modification time) and declares that byte
+        ranges of it are accepted, so that send_file answers conditional
+        (If-None-Match) and range (Range, If-Range) requests when the file is
+        returned as the body.
+        """
+        stat = os.stat( path )
+        self.headers[ "etag" ] = '"%x-%x-%x"' % ( stat.st_ino, stat.st_size, int( stat.st_mtime ) )
+        self.headers[ "last-modified" ] = formatdate( stat.st_mtime, usegmt=True )
+        self.headers[ "accept-ranges" ] = "bytes"
+
     def send_redirect( self, url ):
         """
         Send an HTTP redirect response to (target `url`)
@@ -409,6 +423,16 @@ class Response( object ):
 CHUNK_SIZE = 2**16
 
 def send_file( start_response, trans, body ):
+    headers = trans.response.headers
+    etag = headers.get( "etag" )
+    if etag and etag_matches( etag, trans.environ.get( "HTTP_IF_NONE_MATCH" ), weak=True ):
+        trans.response.status = "304 Not Modified"
+        if "content-length" in headers:
+            del headers[ "content-length" ]
+        body.close()
+        start_response( trans.response.wsgi_status(),
+                        trans.response.wsgi_headeritems() )
+        return [ "" ]
     # If configured use X-Accel-Redirect header for nginx
     base = trans.app.config.nginx_x_accel_redirect_base
     apache_xsendfile = trans.app.config.apache_xsendfile
@@ -421,19 +445,107 @@ def send_file( start_response, trans, body ):
         body = [ "" ]
     # Fall back on sending the file in chunks
     else:
-        body = iterate_file( body )
+        byte_range = None
+        # (the front end servers above answer range requests themselves)
+        if headers.get( "accept-ranges" ) == "bytes":
+            if_range = trans.environ.get( "HTTP_IF_RANGE" )
+            if not if_range or ( etag and etag_matches( etag, if_range ) ):
+                size = os.fstat( body.fileno() ).st_size
+                try:
+                    byte_range = parse_byte_range( trans.environ.get( "HTTP_RANGE" ), size )
+                except ValueError:
+                    trans.response.status = "416 Requested Range Not Satisfiable"
+                    headers[ "content-range" ] = "bytes */%d" % size
+                    headers[ "content-length" ] = "0"
+                    body.close()
+                    start_response( trans.response.wsgi_status(),
+                                    trans.response.wsgi_headeritems() )
+                    return [ "" ]
+        if byte_range is None:
+            body = iterate_file( body )
+        else:
+            start, end = byte_range
+            trans.response.status = "206 Partial Content"
+            headers[ "content-range" ] = "bytes %d-%d/%d" % ( start, end - 1, size )
+            headers[ "content-length" ] = str( end - start )
+            body = iterate_file( body, start, end - start )
     start_response( trans.response.wsgi_status(),
                     trans.response.wsgi_headeritems() )
     return body
 
-def iterate_file( file ):
+def etag_matches( etag, header, weak=False ):
+    """
+    Returns True if etag is one of the entity tags listed in an If-None-Match
+    or If-Range header; weak tags only match with weak comparison.
+    """
+    if not header:
+        return False
+    if weak and header.strip() == "*":
+        return True
+    for tag in header.split( "," ):
+        tag = tag.strip()
+        if weak and tag.startswith( "W/" ):
+            tag = tag[ 2: ]
+        if tag == etag:
+            return True
+    return False
+
+def parse_byte_range( header, size ):
+    """
+    Returns ( start, end ) (end exclusive) of the single byte range requested
+    by the HTTP Range header for a body of size bytes, or None if the whole
+    body is to be sent (no header, an invalid one or several ranges). Raises
+    ValueError if the range cannot be satisfied.
+
+    >>> parse_byte_range( "bytes=0-99", 1000 ), parse_byte_range( "bytes=900-", 1000 ), parse_byte_range( "bytes=-100", 1000 )
+    ((0, 100), (900, 1000), (900, 1000))
+    >>> parse_byte_range( "bytes=990-1999", 1000 ), parse_byte_range( "bytes=0-1,5-6", 1000 ), parse_byte_range( "bytes=5-1", 1000 )
+    ((990, 1000), None, None)
+    >>> parse_byte_range( "bytes=1000-", 1000 )
+    Traceback (most recent call last):
+    ...
+    ValueError: bytes=1000-
+    """
+    if not header:
+        return None
+    units, equals, ranges = header.partition( "=" )
+    first, dash, last = ranges.partition( "-" )
+    if units.strip().lower() != "bytes" or not dash or "," in ranges:
+        return None
+    first, last = first.strip(), last.strip()
+    try:
+        if first:
+            start = int( first )
+            end = size
+            if last:
+                end = int( last ) + 1
+        else:
+            # The last bytes
+            start, end = max( size - int( last ), 0 ), size
+    except ValueError:
+        return None
+    if first and ( start < 0 or ( last and end <= start ) ):
+        return None
+    if start >= size or start == end:
+        raise ValueError( header )
+    return start, min( end, size )
+
+def iterate_file( file, start=None, length=None ):
     """
-    Progressively return chunks from `file`.
+    Progressively return chunks from `file` (or of its `length` bytes from
+    `start` on).
     """
-    while 1:
-        chunk = file.read( CHUNK_SIZE )
+    if start is not None:
+        file.seek( start )
+    while length is None or length > 0:
+        chunk_size = CHUNK_SIZE
+        if length is not None:
+            chunk_size = min( chunk_size, length )
+        chunk = file.read( chunk_size )
         if not chunk:
             break
+        if length is not None:
+            length -= len( chunk )
         yield chunk
 
 def flatten( seq ):
@@ -8,6 +8,7 @@ from galaxy import util
 from galaxy.visualization.data_providers.genome import FeatureLocationIndexDataProvider
 from galaxy.visualization.data_providers.genome import SamDataProvider
 from galaxy.visualization.data_providers.genome import BamDataProvider
+from galaxy.visualization.data_providers.cache import RegionDataCache
 from galaxy.datatypes import dataproviders
 
 from galaxy.web.base.controller import BaseAPIController
@@ -24,6 +25,7 @@ class DatasetsController( BaseAPIController, UsesVisualizationMixin ):
         super( DatasetsController, self ).__init__( app )
         self.hda_manager = managers.hdas.HDAManager( app )
         self.hda_serializer = managers.hdas.HDASerializer( self.app )
+        self.data_cache = RegionDataCache( app.config.visualization_data_cache_size )
 
     @web.expose_api
     def index( self, trans, **kwd ):
@@ -151,10 +153,25 @@ class DatasetsController( BaseAPIController, UsesVisualizationMixin ):
         if return_message:
             return return_message
 
+        # Visualizations request the same regions (tiles) over and over, so
+        # results are cached by everything they depend on.
+        cache_key = self.data_cache.region_key( dataset, chrom, low, high, start_val, max_vals, kwargs )
+        result = self.data_cache.get( cache_key )
+        if result is None:
+            result = self._region_data( trans, dataset, chrom, low, high, start_val, max_vals, **kwargs )
+            if isinstance( result, dict ):
+                self.data_cache.put( cache_key, result )
+        return result
+
+    def _region_data( self, trans, dataset, chrom, low, high, start_val=0, max_vals=None, **kwargs ):
+        """
+        Reads a block of data from a dataset whose datasources are ready.
+        """
         extra_info = None
         mode = kwargs.get( "mode", "Auto" )
         data_provider_registry = trans.app.data_provider_registry
         indexer = None
+        stats = None
 
         # Coverage mode uses index data.
         if mode == "Coverage":
@@ -214,10 +231,11 @@ class DatasetsController( BaseAPIController, UsesVisualizationMixin ):
                                                      low=( max( 0, int( low  ) - 1000000 ) ),
                                                      high=( int( high ) + 1000000 ) )
 
-            # Get mean depth.
+            # Get mean depth, reusing the stats of Auto mode.
             if not indexer:
                 indexer = data_provider_registry.get_data_provider( trans, original_dataset=dataset, source='index' )
-            stats = indexer.get_data( chrom, low, high, stats=True )
+            if stats is None:
+                stats = indexer.get_data( chrom, low, high, stats=True )
             mean_depth = stats[ 'data' ][ 'mean' ]
 
         # Get and return data from data_provider.
@@ -288,6 +306,7 @@ class DatasetsController( BaseAPIController, UsesVisualizationMixin ):
                         extra_dir=( 'dataset_%s_files' % hda.dataset.id ), alt_name=filename)
                 else:
                     file_path = hda.file_name
+                trans.response.set_file_validators( file_path )
                 rval = open( file_path )
 
             else:
@@ -210,6 +210,10 @@ class FolderContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrary
                 #         subfolder.api_type = 'folder'
                 #         content_items.append( subfolder )
 
+        if not is_admin:
+            # Evaluate the access permissions of all of the folder's datasets at once.
+            dataset_access = trans.app.security_agent.can_access_datasets( current_user_roles,
+                [ dataset.library_dataset_dataset_association.dataset_id for dataset in folder.datasets if not dataset.deleted ] )
         for dataset in folder.datasets:
             if dataset.deleted:
                 if include_deleted:
@@ -228,7 +232,7 @@ class FolderContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrary
                     dataset.api_type = 'file'
                     content_items.append( dataset )
                 else:
-                    can_access = trans.app.security_agent.can_access_dataset( current_user_roles, dataset.library_dataset_dataset_association.dataset )
+                    can_access = dataset_access[ dataset.library_dataset_dataset_association.dataset_id ]
                     if can_access:
                         dataset.api_type = 'file'
                         content_items.append( dataset )
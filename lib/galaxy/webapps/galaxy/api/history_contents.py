@@ -1,6 +1,9 @@
 """
 API operations on the contents of a history.
 """
+import datetime
+import operator
+from itertools import islice
 
 from galaxy import exceptions
 from galaxy import util
@@ -62,6 +65,14 @@ class HistoryContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrar
         :param  types:      (optional) kinds of contents to index (currently just
                             dataset, but dataset_collection will be added shortly).
         :type   types:      str
+        :type   hid_gt:     int
+        :param  hid_gt:     (optional) only return contents with a greater hid, to
+                            fetch large histories a page at a time
+        :type   limit:      int
+        :param  limit:      (optional) return at most this many contents
+        :type   since:      str
+        :param  since:      (optional) ISO 8601 UTC timestamp; only return datasets
+                            updated after it (collections are always returned)
 
         :rtype:     list
         :returns:   dictionaries containing summary or detailed HDA information
@@ -80,6 +91,7 @@ class HistoryContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrar
             types = [ 'dataset', "dataset_collection" ]
 
         contents_kwds = { 'types': types }
+        contents_kwds.update( self._parse_paging_params( kwd ) )
         if ids:
             ids = map( lambda id: self.decode_id( id ), ids.split( ',' ) )
             contents_kwds[ 'ids' ] = ids
@@ -95,6 +107,8 @@ class HistoryContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrar
             details = kwd.get( 'details', None ) or kwd.get( 'dataset_details', None ) or []
             if details and details != 'all':
                 details = util.listify( details )
+            if not details and 'dataset' in types:
+                return self.__summaries( trans, history, **contents_kwds )
 
         for content in history.contents_iter( **contents_kwds ):
             encoded_content_id = trans.security.encode_id( content.id )
@@ -112,6 +126,46 @@ class HistoryContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrar
 
         return rval
 
+    def _parse_paging_params( self, kwd ):
+        paging_kwds = {}
+        for key in ( 'hid_gt', 'limit' ):
+            value = kwd.get( key, None )
+            if value is not None:
+                try:
+                    paging_kwds[ key ] = int( value )
+                except ValueError:
+                    raise exceptions.RequestParameterInvalidException( "The value of '%s' must be an integer: %s" % ( key, value ) )
+        since = kwd.get( 'since', None )
+        if since:
+            paging_kwds[ 'since' ] = self._parse_timestamp( since )
+        return paging_kwds
+
+    def _parse_timestamp( self, timestamp ):
+        # as serialized by ModelSerializer.serialize_date, with or without fractional seconds
+        for format in ( '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S' ):
+            try:
+                return datetime.datetime.strptime( timestamp, format )
+            except ValueError:
+                pass
+        raise exceptions.RequestParameterInvalidException( "The value of 'since' must be an ISO 8601 timestamp: %s" % timestamp )
+
+    def __summaries( self, trans, history, types=None, limit=None, **contents_kwds ):
+        """
+        Return the summaries of the history's contents, serializing the datasets
+        from one column-projected query instead of loading each HDA.
+        """
+        rows = self.hda_manager.summary_rows( history, deleted=contents_kwds.get( 'deleted', None ),
+            visible=contents_kwds.get( 'visible', None ), hid_gt=contents_kwds.get( 'hid_gt', None ),
+            since=contents_kwds.get( 'since', None ), limit=limit )
+        summaries = [ self.hda_serializer.serialize_summary_rows( trans, rows ) ]
+        if 'dataset_collection' in types:
+            collections = history.contents_iter( types=[ 'dataset_collection' ], limit=limit, **contents_kwds )
+            summaries.append( [ self.__collection_dict( trans, collection, view='collection' ) for collection in collections ] )
+        summaries = util.merge_sorted_iterables( operator.itemgetter( 'hid' ), *summaries )
+        if limit is not None:
+            summaries = islice( summaries, limit )
+        return list( summaries )
+
     def __collection_dict( self, trans, dataset_collection_instance, view="collection" ):
         return dictify_dataset_collection_instance( dataset_collection_instance,
             security=trans.security, parent=dataset_collection_instance.history, view=view )
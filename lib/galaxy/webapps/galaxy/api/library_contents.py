@@ -60,12 +60,13 @@ class LibraryContentsController( BaseAPIController, UsesLibraryMixin, UsesLibrar
                     subfolder.api_type = 'folder'
                     rval.append( subfolder )
                     rval.extend( traverse( subfolder ) )
+            if not admin:
+                # Evaluate the access permissions of all of the folder's datasets at once.
+                dataset_access = trans.app.security_agent.can_access_datasets( current_user_roles,
+                    [ ld.library_dataset_dataset_association.dataset_id for ld in folder.datasets ] )
             for ld in folder.datasets:
                 if not admin:
-                    can_access = trans.app.security_agent.can_access_dataset(
-                        current_user_roles,
-                        ld.library_dataset_dataset_association.dataset
-                    )
+                    can_access = dataset_access[ ld.library_dataset_dataset_association.dataset_id ]
                 if (admin or can_access) and not ld.deleted:
                     ld.api_path = folder.api_path + '/' + ld.name
                     ld.api_type = 'file'
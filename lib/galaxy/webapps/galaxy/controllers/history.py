@@ -866,10 +866,13 @@ class HistoryController( BaseUIController, SharableMixin, UsesAnnotations, UsesI
                     send_to_err += "History (%s) already shared with user (%s)" % ( history.name, send_to_user.email )
                 else:
                     # Only deal with datasets that have not been purged
-                    for hda in history.activatable_datasets:
+                    hdas = history.activatable_datasets
+                    dataset_access = trans.app.security_agent.can_access_datasets( send_to_user.all_roles(),
+                        [ hda.dataset_id for hda in hdas ] )
+                    for hda in hdas:
                         # If the current dataset is not public, we may need to perform an action on it to
                         # make it accessible by the other user.
-                        if not trans.app.security_agent.can_access_dataset( send_to_user.all_roles(), hda.dataset ):
+                        if not dataset_access[ hda.dataset_id ]:
                             # The user with which we are sharing the history does not have access permission on the current dataset
                             if trans.app.security_agent.can_manage_dataset( user_roles, hda.dataset ) and not hda.dataset.library_associations:
                                 # The current user has authority to change permissions on the current dataset because
@@ -982,8 +985,11 @@ class HistoryController( BaseUIController, SharableMixin, UsesAnnotations, UsesI
                     send_to_err += "History (%s) already shared with user (%s)" % ( history.name, send_to_user.email )
                 else:
                     # Only deal with datasets that have not been purged
-                    for hda in history.activatable_datasets:
-                        if trans.app.security_agent.can_access_dataset( send_to_user.all_roles(), hda.dataset ):
+                    hdas = history.activatable_datasets
+                    dataset_access = trans.app.security_agent.can_access_datasets( send_to_user.all_roles(),
+                        [ hda.dataset_id for hda in hdas ] )
+                    for hda in hdas:
+                        if dataset_access[ hda.dataset_id ]:
                             # The no_change_needed dictionary is a special case.  If both of can_change
                             # and cannot_change are empty, no_change_needed will used for sharing.  Otherwise
                             # unique_no_change_needed will be used for displaying, so we need to populate both.
@@ -17,7 +17,7 @@
 import sys, os
 
 from galaxy.web.base.controller import *
-import logging, sets, time
+import logging, sets, threading, time
 
 log = logging.getLogger( __name__ )
 
@@ -67,6 +67,13 @@ class ProtoController( BaseUIController ):
         response.send_bytes(html)
         response.close()
 
+        # option boxes shown as loading are stored for the next reload of the form
+        if hasattr(toolController, 'finishLoadingOptionsBoxes'):
+            try:
+                toolController.finishLoadingOptionsBoxes()
+            except Exception:
+                traceback.print_exc()
+
 
     @web.expose
     def index(self, trans, mako = 'generictool', **kwd):
@@ -78,6 +85,7 @@ class ProtoController( BaseUIController ):
         
         trans.sa_session.flush()
         trans.sa_session.close()
+        self._refresh_tool_registry()
 
         my_end, your_end = Pipe()
         proc = Process(target=self.__index_pipe, args=(your_end,trans,str(mako)))
@@ -92,14 +100,35 @@ class ProtoController( BaseUIController ):
         else:
             log.warn('fork died on startup')
         proc.join(1)
+        if proc.is_alive():
+            # the fork may still be finishing option boxes shown as loading
+            reaper = threading.Thread(target=self.__reap, args=(proc,))
+            reaper.daemon = True
+            reaper.start()
+        return html
+
+    @staticmethod
+    def __reap(proc, timeout=60):
+        proc.join(timeout)
         if proc.is_alive():
             proc.terminate()
             log.warn('fork did not exit, terminated.')
-        return html
 
 
+    @staticmethod
+    def _refresh_tool_registry():
+        # read the tool shelve in this process, so that the forked request
+        # processes inherit its entries instead of each opening the shelve.
+        # The tool modules themselves are only imported by the forked processes.
+        try:
+            from proto.ToolRegistry import getToolRegistry
+            getToolRegistry().refresh()
+        except Exception:
+            log.exception('Could not refresh ProTo tool registry')
+
     @web.json
     def json(self, trans, module = None, **kwd):
+        self._refresh_tool_registry()
         response = Queue()
         proc = Process(target=self.__json, args=(response,trans,module,kwd))
         proc.start()
@@ -0,0 +1,182 @@
+# Copyright (C) 2009, Geir Kjetil Sandve, Sveinung Gundersen and Morten Johansen
+# This file is part of The Genomic HyperBrowser.
+#
+#    The Genomic HyperBrowser is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    The Genomic HyperBrowser is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with The Genomic HyperBrowser.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Server-side store for the option box state of ProTo tool forms. Every web
+# request is handled in a forked process (see web/controllers/proto.py), so the
+# state is kept in a local sqlite file that all worker processes share. The
+# form itself only carries the random token identifying a stored state.
+#
+# Option boxes still being computed after a page is sent are registered as
+# loading, together with the process computing them, so that reloads of the
+# form wait for that process instead of computing the boxes again.
+
+import os, time, uuid, sqlite3
+import cPickle as pickle
+
+from config.Config import GALAXY_BASE_DIR, PROTO_OPTIONS_CACHE_SIZE, PROTO_OPTIONS_CACHE_TTL
+
+OPTIONS_CACHE_FN = GALAXY_BASE_DIR + '/database/proto-options-cache.sqlite'
+
+
+class OptionsCache(object):
+    '''
+    Session-keyed store of (cachedParams, cachedOptions, cachedExtra) states,
+    bounded to maxEntries states. States not accessed for ttl seconds are
+    expired, and the least recently used states are evicted when full.
+    '''
+
+    def __init__(self, fn=OPTIONS_CACHE_FN, maxEntries=PROTO_OPTIONS_CACHE_SIZE, ttl=PROTO_OPTIONS_CACHE_TTL):
+        self._fn = fn
+        self._maxEntries = maxEntries
+        self._ttl = ttl
+        self._conn = None
+
+    def _getConnection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._fn, timeout=30)
+            self._conn.text_factory = str
+            self._conn.execute('CREATE TABLE IF NOT EXISTS state (token TEXT PRIMARY KEY, '
+                               'session_key TEXT, last_access REAL, data BLOB)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS state_last_access ON state (last_access)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS counter (name TEXT PRIMARY KEY, value INTEGER)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS loading (token TEXT, box TEXT, pid INTEGER, '
+                               'params BLOB, PRIMARY KEY (token, box))')
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def newToken():
+        return uuid.uuid4().hex
+
+    def get(self, token, sessionKey=None):
+        '''
+        Returns the state stored for token, or None if it is missing, expired
+        or belongs to another session. A sessionKey of None (as in the job
+        runner) skips the session check.
+        '''
+        if not token:
+            return None
+        conn = self._getConnection()
+        now = time.time()
+        data = self._getData(conn, token, sessionKey, now)
+        if data is None:
+            return None
+        with conn:
+            conn.execute('UPDATE state SET last_access = ? WHERE token = ?', (now, token))
+        return pickle.loads(str(data))
+
+    def _getData(self, conn, token, sessionKey, now):
+        row = conn.execute('SELECT session_key, last_access, data FROM state WHERE token = ?',
+                           (token,)).fetchone()
+        if row is None:
+            return None
+        storedSessionKey, lastAccess, data = row
+        if sessionKey is not None and storedSessionKey != sessionKey:
+            return None
+        if now - lastAccess > self._ttl:
+            return None
+        return data
+
+    def put(self, token, sessionKey, state):
+        conn = self._getConnection()
+        now = time.time()
+        with conn:
+            self._put(conn, token, sessionKey, state, now)
+
+    def update(self, token, sessionKey, fn):
+        '''
+        Replaces the state stored for token by fn(state), without any other
+        process storing a state for token in between. state is None if get()
+        would return None. Nothing is stored if fn returns None.
+        '''
+        conn = self._getConnection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            data = self._getData(conn, token, sessionKey, now)
+            state = fn(pickle.loads(str(data)) if data is not None else None)
+            if state is not None:
+                self._put(conn, token, sessionKey, state, now)
+        except:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _put(self, conn, token, sessionKey, state, now):
+        data = sqlite3.Binary(pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
+        conn.execute('INSERT OR REPLACE INTO state (token, session_key, last_access, data) '
+                     'VALUES (?, ?, ?, ?)', (token, sessionKey, now, data))
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM state WHERE last_access < ?', (now - self._ttl,))
+        conn.execute('DELETE FROM state WHERE token NOT IN '
+                     '(SELECT token FROM state ORDER BY last_access DESC LIMIT ?)', (self._maxEntries,))
+        conn.execute('DELETE FROM loading WHERE token NOT IN (SELECT token FROM state)')
+
+    def setLoadingBoxes(self, token, boxes):
+        '''
+        Registers the boxes, a dict from box id to the choices the box is
+        computed from, as being computed for token by this process.
+        '''
+        conn = self._getConnection()
+        pid = os.getpid()
+        with conn:
+            for box, params in boxes.iteritems():
+                conn.execute('INSERT OR REPLACE INTO loading (token, box, pid, params) VALUES (?, ?, ?, ?)',
+                             (token, box, pid, sqlite3.Binary(pickle.dumps(params, pickle.HIGHEST_PROTOCOL))))
+
+    def getLoadingBoxes(self, token):
+        '''
+        Returns a dict from box id to the choices the box is computed from,
+        for the boxes of token that a live process is computing.
+        '''
+        if not token:
+            return {}
+        rows = self._getConnection().execute('SELECT box, pid, params FROM loading WHERE token = ?',
+                                             (token,)).fetchall()
+        return dict((box, pickle.loads(str(params))) for box, pid, params in rows if self._isAlive(pid))
+
+    def clearLoadingBoxes(self, token, boxes):
+        '''Unregisters the boxes of token that this process was computing.'''
+        conn = self._getConnection()
+        pid = os.getpid()
+        with conn:
+            for box in boxes:
+                conn.execute('DELETE FROM loading WHERE token = ? AND box = ? AND pid = ?', (token, box, pid))
+
+    @staticmethod
+    def _isAlive(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return False
+        return True
+
+    def incrementCounters(self, **counts):
+        conn = self._getConnection()
+        with conn:
+            for name, value in counts.iteritems():
+                conn.execute('INSERT OR IGNORE INTO counter (name, value) VALUES (?, 0)', (name,))
+                conn.execute('UPDATE counter SET value = value + ? WHERE name = ?', (value, name))
+
+    def getCounters(self):
+        return dict(self._getConnection().execute('SELECT name, value FROM counter').fetchall())
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
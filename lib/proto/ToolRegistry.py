@@ -0,0 +1,103 @@
+# Copyright (C) 2009, Geir Kjetil Sandve, Sveinung Gundersen and Morten Johansen
+# This file is part of The Genomic HyperBrowser.
+#
+#    The Genomic HyperBrowser is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    The Genomic HyperBrowser is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with The Genomic HyperBrowser.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Process-wide view of the ProTo tool shelve (tool id -> (module, class)), which
+# is written by HyperBrowserGenericTool.parse when tools are loaded. The shelve
+# is read once and only re-read when one of its files changes on disk.
+#
+# The web process only reads the shelve. Tool modules are imported by the
+# forked request processes, so that changes to a tool are seen by the next
+# request, and a failing tool import does not affect the web process.
+
+import os, shelve, threading
+from importlib import import_module
+
+from config.Config import GALAXY_BASE_DIR
+
+TOOL_SHELVE = GALAXY_BASE_DIR + '/database/proto-tool-cache.shelve'
+SOURCE_CODE_BASE_DIR = GALAXY_BASE_DIR + '/lib'
+
+# depending on the dbm implementation, the shelve is stored under one of these names
+SHELVE_FILE_SUFFIXES = ('', '.db', '.dat', '.dir')
+
+
+class ToolRegistry(object):
+    def __init__(self, shelveFn=TOOL_SHELVE):
+        self._shelveFn = shelveFn
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._entries = {}
+        self._installed = {}
+
+    def _getShelveMtime(self):
+        mtimes = [os.path.getmtime(self._shelveFn + suffix) for suffix in SHELVE_FILE_SUFFIXES
+                  if os.path.exists(self._shelveFn + suffix)]
+        return max(mtimes) if mtimes else None
+
+    def refresh(self):
+        '''Re-reads the shelve if it has changed since it was last read.'''
+        mtime = self._getShelveMtime()
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            entries = {}
+            if mtime is not None:
+                tool_shelve = shelve.open(self._shelveFn, 'r')
+                try:
+                    entries = dict((toolId, tuple(tool_shelve[toolId])) for toolId in tool_shelve.keys())
+                finally:
+                    tool_shelve.close()
+            self._entries = entries
+            self._installed = dict((toolId, entry) for toolId, entry in entries.iteritems()
+                                   if self._sourceExists(entry[0]))
+            self._mtime = mtime
+
+    @staticmethod
+    def _sourceExists(moduleName):
+        return os.path.exists(os.path.join(SOURCE_CODE_BASE_DIR, moduleName.replace('.', os.path.sep)) + '.py')
+
+    def getEntry(self, toolId):
+        '''Returns (module name, class name) for toolId. Raises KeyError for unknown tools.'''
+        self.refresh()
+        return self._entries[str(toolId)]
+
+    def getInstalledEntries(self):
+        '''Returns {tool id: (module name, class name)} for tools whose source file exists.'''
+        self.refresh()
+        return dict(self._installed)
+
+    def getInstalledClassNames(self):
+        return [className for moduleName, className in self.getInstalledEntries().itervalues()]
+
+    def getAllClassNames(self):
+        self.refresh()
+        return [className for moduleName, className in self._entries.itervalues()]
+
+    def getPrototypeClass(self, toolId):
+        '''
+        Imports and returns the prototype class of toolId. Raises KeyError for
+        unknown tools. Should only be called in the forked request processes.
+        '''
+        moduleName, className = self.getEntry(toolId)
+        return getattr(import_module(moduleName), className)
+
+
+_toolRegistry = ToolRegistry()
+
+def getToolRegistry():
+    return _toolRegistry
@@ -35,6 +35,10 @@ STATIC_REL_PATH = URL_PREFIX + '/static/proto'
 STATIC_PATH = GALAXY_BASE_DIR + '/' + STATIC_REL_PATH
 GALAXY_URL = URL_PREFIX
 GALAXY_FILE_PATH = GALAXY_BASE_DIR + '/' + getFromConfig(config, 'file_path', 'database/files')
+PROTO_OPTIONS_CACHE_SIZE = int(getFromConfig(config, 'proto_options_cache_size', 10000))
+PROTO_OPTIONS_CACHE_TTL = int(getFromConfig(config, 'proto_options_cache_ttl', 86400))
+PROTO_OPTIONS_BOX_THREADS = int(getFromConfig(config, 'proto_options_box_threads', 1))
+PROTO_OPTIONS_BOX_TIMEOUT = float(getFromConfig(config, 'proto_options_box_timeout', 30))
 
 
 def userHasFullAccess(galaxyUserName):
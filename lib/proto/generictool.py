@@ -16,7 +16,7 @@
 #
 # instance is dynamically imported into namespace of <modulename>.mako template (see web/controllers/hyper.py)
 
-import sys, os, json, shelve
+import sys, os, json, time
 import cPickle as pickle
 from zlib import compress, decompress
 from base64 import urlsafe_b64decode, urlsafe_b64encode
@@ -27,14 +27,66 @@ from urllib import quote, unquote
 #from quick.webtools.GeneralGuiTool import HistElement
 #from quick.util.StaticFile import StaticImage
 #from gold.result.HtmlCore import HtmlCore
-from config.Config import URL_PREFIX, GALAXY_BASE_DIR
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from config.Config import URL_PREFIX, GALAXY_BASE_DIR, PROTO_OPTIONS_BOX_THREADS, PROTO_OPTIONS_BOX_TIMEOUT
 #from gold.application.LogSetup import usageAndErrorLogging
 #from gold.util.CommonFunctions import getClassName
 from BaseToolController import BaseToolController
+from OptionsCache import OptionsCache
+from ToolRegistry import getToolRegistry
 
 def getClassName(obj):
     return obj.__class__.__name__
 
+class ChoiceNotKnownError(Exception):
+    pass
+
+def makeTracingChoiceTuple(fields, values, accessed, unknown=()):
+    '''
+    Returns a ChoiceTuple of values that adds the names of the fields read
+    through it to the set accessed. Any other use of the tuple (iteration,
+    comparison, _asdict() etc.) counts as reading all fields. Reading any of
+    the fields in unknown, whose values are not yet known, raises
+    ChoiceNotKnownError.
+    '''
+    ChoiceTuple = namedtuple('ChoiceTuple', fields)
+
+    def read(names):
+        accessed.update(names)
+        for name in names:
+            if name in unknown:
+                raise ChoiceNotKnownError(name)
+
+    class TracingChoiceTuple(ChoiceTuple):
+        __slots__ = ()
+
+        def __getattribute__(self, name):
+            if name in fields:
+                read((name,))
+            elif name not in ('_fields', '__class__'):
+                read(fields)
+            return ChoiceTuple.__getattribute__(self, name)
+
+        def __getitem__(self, key):
+            if isinstance(key, (int, long)):
+                read((fields[key],))
+            else:
+                read(fields)
+            return ChoiceTuple.__getitem__(self, key)
+
+    def readsAll(method):
+        def wrapper(self, *args):
+            read(fields)
+            return method(self, *args)
+        return wrapper
+
+    # created before tracing the special methods, as _make() calls len()
+    choices = TracingChoiceTuple._make(values)
+    for name in ('__iter__', '__len__', '__contains__', '__getslice__', '__eq__', '__ne__', '__repr__'):
+        setattr(TracingChoiceTuple, name, readsAll(getattr(ChoiceTuple, name)))
+    return choices
+
 class GenericToolController(BaseToolController):
     initChoicesDict = None
 
@@ -55,19 +107,12 @@ class GenericToolController(BaseToolController):
         self.subClassId = unquote(self.params.get('sub_class_id', ''))
         self.prototype = None
 
-        tool_shelve = None
         try:
-            tool_shelve = shelve.open(GALAXY_BASE_DIR + '/database/proto-tool-cache.shelve', 'r')
-            module_name, class_name = tool_shelve[str(self.toolId)]
-            module = __import__(module_name, fromlist=[class_name])
-            self.prototype = getattr(module, class_name)(self.toolId)
+            self.prototype = getToolRegistry().getPrototypeClass(self.toolId)(self.toolId)
             #print "Loaded proto tool:", class_name
         except KeyError as exc:
             #print exc, 'trying GeneralGuiToolsFactory'
             self.prototype = GeneralGuiToolsFactory.getWebTool(self.toolId)
-        finally:
-            if tool_shelve:
-                tool_shelve.close()
 
         self._monkeyPatchAttr('userName', self.params.get('userEmail'))
 
@@ -156,24 +201,33 @@ class GenericToolController(BaseToolController):
                     raise IndexError('List index out of range: %d >= %d' % (idx, len(self.inputIds)))
         return idxList
 
-    def _getOptionsBox(self, i, val = None):
+    def _getOptionsBox(self, i, val = None, accessed = None, prevValues = None, unknown = ()):
         id = self.inputIds[i]
         id = id[0].upper() + id[1:]
         info = None
         if i > 0:
-            ChoiceTuple = namedtuple('ChoiceTuple', self.inputIds[:(i+1)])
-            prevchoices = ChoiceTuple._make(self.inputValues + [val])
+            if prevValues is None:
+                prevValues = self.inputValues
+            if accessed is not None:
+                prevchoices = makeTracingChoiceTuple(self.inputIds[:(i+1)], prevValues + [val], accessed, unknown)
+            else:
+                ChoiceTuple = namedtuple('ChoiceTuple', self.inputIds[:(i+1)])
+                prevchoices = ChoiceTuple._make(prevValues + [val])
             #self.choices = prevchoices
             if id.startswith('Box'):
                 opts = getattr(self.prototype, 'getOptions' + id)(prevchoices)
                 try:
                     info = getattr(self.prototype, 'getInfoForOptions' + id)(prevchoices)
+                except ChoiceNotKnownError:
+                    raise
                 except:
                     pass
             else:
                 opts = getattr(self.prototype, 'getOptionsBox' + id)(prevchoices)
                 try:
                     info = getattr(self.prototype, 'getInfoForOptionsBox' + id)(prevchoices)
+                except ChoiceNotKnownError:
+                    raise
                 except:
                     pass
         else:
@@ -193,21 +247,103 @@ class GenericToolController(BaseToolController):
 
 
     def _initCache(self):
-        self.input_changed = False
-        try:
-            self.cachedParams = json.loads(decompress(urlsafe_b64decode(str(self.params.get('cached_params')))))
-        except:
-            self.cachedParams = {}
-            
-        try:
-            self.cachedOptions = json.loads(decompress(urlsafe_b64decode(str(self.params.get('cached_options')))))
-        except:
-            self.cachedOptions = {}
+        self.changedIds = set()
+        # boxes computed from a placeholder of a box that is still loading
+        self.taintedIds = set()
+        self.pendingBoxes = {}
+        self.loadingBoxes = {}
+        # the choices that the boxes shown as loading are computed from
+        self.loadingParams = {}
+        self.optionsBoxPool = None
+        # all waits for prefetched boxes of the request share one timeout
+        self.optionsBoxDeadline = self._getOptionsBoxDeadline()
+        self.declaredDeps = self._getDeclaredDependencies()
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.optionsCache = OptionsCache()
+        # in the job runner there is no session; the random token is then trusted as is
+        self.sessionKey = (self.galaxy.getSessionKey() or '') if hasattr(self, 'galaxy') else None
+        self.cacheToken = self.params.get('cache_token')
+
+        state = None
+        # the cached boxes of another sub tool are of no use
+        if not self.resetAll:
+            try:
+                state = self.optionsCache.get(self.cacheToken, self.sessionKey)
+                if state is not None:
+                    self.cachedParams, self.cachedOptions, self.cachedExtra, self.cachedDeps = state
+            except Exception as e:
+                print 'options cache load fail', e
+                state = None
 
+        if state is None:
+            self.cacheToken = OptionsCache.newToken()
+            self.cachedParams, self.cachedOptions, self.cachedExtra, self.cachedDeps = {}, {}, {}, {}
+
+        # the job gets the extra data of the form it was submitted from, as the
+        # cached state may have been evicted or overwritten by another form
+        if not hasattr(self, 'galaxy'):
+            try:
+                self.cachedExtra = json.loads(decompress(urlsafe_b64decode(str(self.params.get('cached_extra')))))
+            except:
+                self.cachedExtra = {}
+
+        # boxes that the process of an earlier request is still computing
+        self.boxesLoadingElsewhere = {}
+        if state is not None:
+            try:
+                self.boxesLoadingElsewhere = self.optionsCache.getLoadingBoxes(self.cacheToken)
+            except Exception as e:
+                print 'options cache load fail', e
+
+    def _getDeclaredDependencies(self):
+        declaredDeps = {}
+        boxDeps = getattr(self.prototype, 'getInputBoxDependencies', lambda: None)()
+        if boxDeps:
+            for box, deps in boxDeps.iteritems():
+                id = self.inputIds[self._getIdxList([box])[0]]
+                declaredDeps[id] = [self.inputIds[idx] for idx in self._getIdxList(deps)]
+        return declaredDeps
+
+    def _storeCache(self):
         try:
-            self.cachedExtra = json.loads(decompress(urlsafe_b64decode(str(self.params.get('cached_extra')))))
-        except:
-            self.cachedExtra = {}
+            self.optionsCache.update(self.cacheToken, self.sessionKey, self._mergeLoadedBoxes)
+            if self.loadingBoxes:
+                self.optionsCache.setLoadingBoxes(self.cacheToken, dict(
+                    (id, self.loadingParams[id]) for id in self.loadingBoxes))
+            self.optionsCache.incrementCounters(hits=self.cacheHits, misses=self.cacheMisses)
+        except Exception as e:
+            print 'options cache store fail', e
+
+    def _mergeLoadedBoxes(self, stored):
+        '''
+        Returns the state of this request, including the boxes it shows as
+        loading that another process has stored meanwhile.
+        '''
+        if stored is not None:
+            cachedParams, cachedOptions, cachedExtra, cachedDeps = stored
+            for id, params in self.loadingParams.iteritems():
+                if id not in self.cachedOptions and id in cachedOptions and id in cachedDeps and \
+                        id in cachedParams and self._isComputedFrom(cachedParams, id, cachedDeps[id], params):
+                    self.cachedParams[id] = cachedParams[id]
+                    self.cachedOptions[id] = cachedOptions[id]
+                    self.cachedDeps[id] = cachedDeps[id]
+        return (self.cachedParams, self.cachedOptions, self.cachedExtra, self.cachedDeps)
+
+    @staticmethod
+    def _isComputedFrom(cachedParams, id, deps, params):
+        '''
+        Returns True if the choices of the boxes deps, which box id depends
+        on, are in cachedParams the same as in params. The choice of box id
+        itself may be missing from cachedParams.
+        '''
+        if cachedParams.get(id, params[id]) != params[id]:
+            return False
+        return all(dep == id or (dep in cachedParams and dep in params and cachedParams[dep] == params[dep])
+                   for dep in deps)
+
+    def getEncodedCachedExtra(self):
+        return urlsafe_b64encode(compress(json.dumps(self.cachedExtra)))
 
     def putCacheData(self, id, data):
         self.cachedExtra[id] = pickle.dumps(data)
@@ -215,28 +351,220 @@ class GenericToolController(BaseToolController):
     def getCacheData(self, id):
         return pickle.loads(str(self.cachedExtra[id]))
 
+    def _dependsOnChanges(self, id):
+        if id not in self.cachedOptions or id not in self.cachedDeps:
+            return True
+        return any(dep in self.changedIds for dep in self.cachedDeps[id])
+
+    def _getBoxDependencies(self, id, accessed):
+        return self.declaredDeps.get(id, sorted(accessed))
+
+    def _computeOptionsBox(self, id, i, val):
+        accessed = set()
+        opts, info = self._getOptionsBox(i, val, accessed)
+        self._setComputedOptionsBox(id, self._getBoxDependencies(id, accessed))
+        return opts, info
+
+    def _setComputedOptionsBox(self, id, deps):
+        self.cachedDeps[id] = deps
+        if any(dep in self.taintedIds for dep in deps):
+            self.taintedIds.add(id)
+        # the options, and thereby the selected value, may have changed
+        self.changedIds.add(id)
+        self.cacheMisses += 1
+
+    def _computeOptionsBoxInPool(self, id, i, val, prevValues, unknown):
+        accessed = set()
+        opts, info = self._getOptionsBox(i, val, accessed, prevValues, unknown)
+        # a box that read an unknown choice (and swallowed the ChoiceNotKnownError) must be recomputed
+        if accessed & unknown:
+            raise ChoiceNotKnownError(', '.join(sorted(accessed & unknown)))
+        return opts, info, self._getBoxDependencies(id, accessed)
+
+    @staticmethod
+    def _getOptionsBoxDeadline():
+        if not PROTO_OPTIONS_BOX_TIMEOUT:
+            return None
+        return time.time() + PROTO_OPTIONS_BOX_TIMEOUT
+
+    @staticmethod
+    def _getTimeLeft(deadline):
+        if deadline is None:
+            return None
+        return max(deadline - time.time(), 0)
+
+    def _prefetchOptionsBoxes(self, numKnown):
+        '''
+        Starts computing, in the thread pool, the later boxes that will be
+        recomputed and whose known dependencies are among the numKnown first
+        boxes. Should such a box read another choice this time, it is
+        recomputed in order when reached.
+        '''
+        if PROTO_OPTIONS_BOX_THREADS <= 1:
+            return
+        knownIds = self.inputIds[:numKnown]
+        for j in range(numKnown + 1, len(self.inputIds)):
+            id = self.inputIds[j]
+            deps = self.declaredDeps.get(id, self.cachedDeps.get(id))
+            if id in self.pendingBoxes or id in self.boxesLoadingElsewhere or deps is None:
+                continue
+            if not all(dep in knownIds or dep == id for dep in deps):
+                continue
+            val = self._getInputValue(id)
+            ownChanged = id not in self.cachedParams or val != self.cachedParams[id]
+            if id in self.cachedOptions and id in self.cachedDeps and not any(
+                    dep in self.changedIds or (dep == id and ownChanged) for dep in self.cachedDeps[id]):
+                continue
+            if self.optionsBoxPool is None:
+                self.optionsBoxPool = ThreadPool(PROTO_OPTIONS_BOX_THREADS)
+            prevValues = self.inputValues + [None] * (j - numKnown)
+            unknown = frozenset(self.inputIds[numKnown:j])
+            params = dict((knownId, self.cachedParams.get(knownId)) for knownId in knownIds)
+            params[id] = val
+            self.pendingBoxes[id] = (self.optionsBoxPool.apply_async(
+                self._computeOptionsBoxInPool, (id, j, val, prevValues, unknown)), params)
+
+    def _getPendingOptionsBox(self, id, i, val):
+        pending, params = self.pendingBoxes.pop(id)
+        try:
+            opts, info, deps = pending.get(self._getTimeLeft(self.optionsBoxDeadline))
+        except ChoiceNotKnownError:
+            return self._computeOptionsBox(id, i, val)
+        except TimeoutError:
+            self.loadingBoxes[id] = (pending, val)
+            return self._setLoadingOptionsBox(id, params)
+        self._setComputedOptionsBox(id, deps)
+        return opts, info
+
+    def _setLoadingOptionsBox(self, id, params):
+        self.loadingParams[id] = params
+        self.taintedIds.add(id)
+        self.changedIds.add(id)
+        return '__loading__', None
+
+    def _isLoadingElsewhere(self, id, val):
+        params = self.boxesLoadingElsewhere.get(id)
+        if params is None:
+            return False
+        return all((val if dep == id else self.cachedParams.get(dep)) == params[dep] for dep in params)
+
+    def _waitForOptionsBox(self, id, i, val):
+        '''
+        Waits, until the deadline of the request, for the process of an
+        earlier request to store box id, which it computes from the current
+        choices. The box is computed here only if that process is gone
+        without storing it.
+        '''
+        params = self.boxesLoadingElsewhere[id]
+        try:
+            while True:
+                loading = id in self.optionsCache.getLoadingBoxes(self.cacheToken)
+                state = self.optionsCache.get(self.cacheToken, self.sessionKey)
+                if state is not None:
+                    cachedParams, cachedOptions, cachedExtra, cachedDeps = state
+                    if id in cachedOptions and id in cachedDeps and id in cachedParams and \
+                            self._isComputedFrom(cachedParams, id, cachedDeps[id], params):
+                        opts, info = pickle.loads(str(cachedOptions[id]))
+                        self.cachedDeps[id] = cachedDeps[id]
+                        self.cacheHits += 1
+                        return opts, info
+                if not loading:
+                    break
+                timeLeft = self._getTimeLeft(self.optionsBoxDeadline)
+                if timeLeft == 0:
+                    return self._setLoadingOptionsBox(id, params)
+                time.sleep(min(timeLeft, 0.25) if timeLeft is not None else 0.25)
+        except Exception as e:
+            print 'loading options box fail', id, e
+        return self._computeOptionsBox(id, i, val)
+
+    def _dropCachedOptionsBox(self, id):
+        for cache in (self.cachedParams, self.cachedOptions, self.cachedDeps):
+            cache.pop(id, None)
+
     def getOptionsBox(self, id, i, val):
         #print id, '=', val, 'cache=', self.cachedParams[id] if id in self.cachedParams else 'NOT'
-        
-        if self.input_changed or id not in self.cachedParams:
-            opts, info = self._getOptionsBox(i, val)
-            self.input_changed = True
+
+        if id not in self.cachedParams or val != self.cachedParams[id]:
+            self.changedIds.add(id)
+
+        if id in self.pendingBoxes:
+            opts, info = self._getPendingOptionsBox(id, i, val)
+        # only boxes reading a changed choice are recomputed
+        elif self._dependsOnChanges(id):
+            if self._isLoadingElsewhere(id, val):
+                opts, info = self._waitForOptionsBox(id, i, val)
+            else:
+                opts, info = self._computeOptionsBox(id, i, val)
         else:
             try:
                 opts, info = pickle.loads(str(self.cachedOptions[id]))
                 #print 'from cache:',id
-                self.input_changed = (val != self.cachedParams[id])
+                self.cacheHits += 1
             except Exception as e:
                 print 'cache load fail', e
-                opts, info = self._getOptionsBox(i, val)
-                self.input_changed = True
+                opts, info = self._computeOptionsBox(id, i, val)
         
         #print repr(opts)
-        self.cachedParams[id] = val
-        self.cachedOptions[id] = pickle.dumps((opts, info))        
+        if id in self.taintedIds:
+            self._dropCachedOptionsBox(id)
+        else:
+            self.cachedParams[id] = val
+            self.cachedOptions[id] = pickle.dumps((opts, info))
         self.inputInfo.append(info)
         return opts
 
+    def finishLoadingOptionsBoxes(self):
+        '''
+        Is called after the page has been sent. Waits for the boxes that were
+        shown as loading and adds them to the state stored in the options
+        cache, so that they are ready when the form is reloaded. The state
+        may since have been stored by a later request, so a box is only
+        added if the choices it depends on are still the same.
+        '''
+        if not self.loadingBoxes:
+            return
+        deadline = self._getOptionsBoxDeadline()
+        finished = {}
+        try:
+            for id, (pending, val) in self.loadingBoxes.iteritems():
+                try:
+                    opts, info, deps = pending.get(self._getTimeLeft(deadline))
+                except Exception as e:
+                    print 'loading options box fail', id, e
+                    continue
+                if not any(dep in self.taintedIds for dep in deps):
+                    finished[id] = (pickle.dumps((opts, info)), deps)
+            self.optionsBoxPool.terminate()
+            if finished:
+                self.optionsCache.update(self.cacheToken, self.sessionKey,
+                                         lambda stored: self._addFinishedBoxes(stored, finished))
+        except Exception as e:
+            print 'options cache store fail', e
+        finally:
+            try:
+                self.optionsCache.clearLoadingBoxes(self.cacheToken, self.loadingBoxes.keys())
+            except Exception as e:
+                print 'options cache store fail', e
+            self.loadingBoxes = {}
+
+    def _addFinishedBoxes(self, stored, finished):
+        if stored is None:
+            return None
+        cachedParams, cachedOptions, cachedExtra, cachedDeps = stored
+        for id, (options, deps) in finished.iteritems():
+            params = self.loadingParams[id]
+            if self._isComputedFrom(cachedParams, id, deps, params):
+                cachedParams[id] = params[id]
+                cachedOptions[id] = options
+                cachedDeps[id] = deps
+        return stored
+
+    def _getInputValue(self, id):
+        if self.initChoicesDict:
+            return self.initChoicesDict[id]
+        return self.params.get(id)
+
 
     def action(self):
         self.options = []
@@ -245,16 +573,15 @@ class GenericToolController(BaseToolController):
         for i in range(len(self.inputNames)):
             name = self.inputNames[i]
             id = self.inputIds[i]
-            if self.initChoicesDict:
-                val = self.initChoicesDict[id]
-            else:
-                val = self.params.get(id)
+            val = self._getInputValue(id)
                 
             display_only = False
+            self._prefetchOptionsBoxes(i)
             opts = self.getOptionsBox(id, i, val)
 
             if reset and not self.initChoicesDict:
                 val = None
+                self.changedIds.add(id)
 
             if opts == None:
                 self.inputTypes += [None]
@@ -276,7 +603,12 @@ class GenericToolController(BaseToolController):
                     val = values
 
             elif isinstance(opts, str) or isinstance(opts, unicode):
-                if opts == '__genome__':
+                if opts == '__loading__':
+                    self.inputTypes += ['__loading__']
+                    val = None
+                    display_only = True
+
+                elif opts == '__genome__':
                     self.inputTypes += ['__genome__']
                     try:
                         genomeCache = self.getCacheData(id)
@@ -413,6 +745,9 @@ class GenericToolController(BaseToolController):
 
         ChoiceTuple = namedtuple('ChoiceTuple', self.inputIds)
         self.choices = ChoiceTuple._make(self.inputValues)
+        self._storeCache()
+        if self.optionsBoxPool is not None and not self.loadingBoxes:
+            self.optionsBoxPool.terminate()
         self.validate()
 
     def _action(self):
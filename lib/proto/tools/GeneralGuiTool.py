@@ -53,6 +53,10 @@ class GeneralGuiTool(object):
     def getInputBoxOrder():
         return None
 
+    @staticmethod
+    def getInputBoxDependencies():
+        return None
+
     @staticmethod
     def getInputBoxGroups(choices=None):
         return None
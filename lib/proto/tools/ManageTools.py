@@ -1,6 +1,7 @@
 from proto.tools.GeneralGuiTool import GeneralGuiTool, MultiGeneralGuiTool
 from proto.config.Config import GALAXY_BASE_DIR, GALAXY_REL_TOOL_CONFIG_FILE, URL_PREFIX
-import os, re, shelve, shutil, sys, traceback
+from proto.ToolRegistry import getToolRegistry
+import os, re, shutil, sys, traceback
 from importlib import import_module
 from collections import OrderedDict
 #import xml.etree.ElementTree as ET
@@ -11,7 +12,6 @@ SOURCE_CODE_BASE_DIR = GALAXY_BASE_DIR + '/lib'
 #HB_TOOL_DIR = GALAXY_BASE_DIR + '/tools/hyperbrowser/new-xml/'
 #PROTO_TOOL_DIR = HB_SOURCE_CODE_BASE_DIR + '/quick/webtools/'
 PROTO_TOOL_DIR = GALAXY_BASE_DIR + '/lib/proto/tools/'
-TOOL_SHELVE = GALAXY_BASE_DIR + '/database/proto-tool-cache.shelve'
 TOOL_CONF = GALAXY_BASE_DIR + '/' + GALAXY_REL_TOOL_CONFIG_FILE
 GALAXY_TOOL_XML_PATH = GALAXY_BASE_DIR + '/tools/'
 TOOL_XML_REL_PATH = 'hyperbrowser/'
@@ -118,9 +118,7 @@ class ExploreToolsTool(MultiGeneralGuiTool):
     
     @classmethod
     def getSubToolClasses(cls):
-        tool_shelve = shelve.open(TOOL_SHELVE, 'r')
-        installed_classes = [tool_shelve.get(t)[1] for t in tool_shelve.keys() if os.path.exists(os.path.join(SOURCE_CODE_BASE_DIR, tool_shelve.get(t)[0].replace('.', os.path.sep)) + '.py') ]                
-        tool_shelve.close()
+        installed_classes = getToolRegistry().getInstalledClassNames()
         tool_list = getProtoToolList(installed_classes)[1]
         return sorted(tool_list, key=lambda c: c.__module__)
 
@@ -164,10 +162,7 @@ class InstallToolsTool(GeneralGuiTool):
 
     @classmethod
     def _getToolList(cls):
-        tool_shelve = shelve.open(TOOL_SHELVE, 'r')
-        tool_IDs = set(tool_shelve.keys())
-        installed_classes = [tool_shelve.get(t)[1] for t in tool_IDs]
-        tool_shelve.close()
+        installed_classes = getToolRegistry().getAllClassNames()
         return getProtoToolList(installed_classes)[0]
 
     @classmethod
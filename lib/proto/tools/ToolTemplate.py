@@ -195,6 +195,18 @@ class ToolTemplate(GeneralGuiTool):
     #    return []
     #
     #@staticmethod
+    #def getInputBoxDependencies():
+    #    '''
+    #    Specifies, as a dict from input box to a list of input boxes, which
+    #    previous choices each getOptionsBox method reads. When a choice is
+    #    changed, only the boxes depending on it (directly or indirectly) are
+    #    recomputed. The input boxes are specified by index (starting with 1)
+    #    or by key. Dependencies of boxes not in the dict are traced
+    #    automatically from which elements of prevChoices are accessed.
+    #    '''
+    #    return {}
+    #
+    #@staticmethod
     #def getToolDescription():
     #    '''
     #    Specifies a help text in HTML that is displayed below the tool.
@@ -63,6 +63,10 @@ class ToolTemplate(GeneralGuiTool):
     #    return []
     #
     #@staticmethod
+    #def getInputBoxDependencies():
+    #    return {}
+    #
+    #@staticmethod
     #def getToolDescription():
     #    return ''
     #
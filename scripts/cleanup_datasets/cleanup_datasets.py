@@ -24,6 +24,7 @@ import galaxy.model.mapping
 import sqlalchemy as sa
 from galaxy.model.orm import and_, eagerload
 from galaxy.objectstore import build_object_store_from_config
+from galaxy.datatypes.dataproviders.base import OffsetIndex
 from galaxy.exceptions import ObjectNotFound
 
 assert sys.version_info[:2] >= ( 2, 4 )
@@ -458,6 +459,7 @@ def _purge_dataset( app, dataset, remove_from_disk, info_only = False ):
                         # Remove associated extra files from disk if they exist
                         if dataset.extra_files_path and os.path.exists( dataset.extra_files_path ):
                             shutil.rmtree( dataset.extra_files_path ) #we need to delete the directory and its contents; os.unlink would always fail on a directory
+                        OffsetIndex.remove_for_dataset( dataset )
                         usage_users = []
                         for hda in dataset.history_associations:
                             if not hda.purged and hda.history.user is not None and hda.history.user not in usage_users:
@@ -508,6 +510,8 @@ class CleanupDatasetsApplication( object ):
         if config.database_connection is False:
             config.database_connection = "sqlite:///%s?isolation_level=IMMEDIATE" % config.database
         self.object_store = build_object_store_from_config( config )
+        if config.dataprovider_index_interval > 0:
+            OffsetIndex.index_dir = config.dataprovider_index_path
         # Setup the database engine and ORM
         self.model = galaxy.model.mapping.init( config.file_path, config.database_connection, engine_options={}, create_tables=False, object_store=self.object_store )
     @property
@@ -82,6 +82,14 @@ import proto.hyper_gui as gui
     <div>${value}</div>
 </%def>
 
+<%def name="loading(name, value = None, label = None)">
+    <p><label>${label if label else name}</label><br><i>Loading...</i>
+    %if value is not None:
+        <input type="hidden" name="${name}" id="${name}" value="${escape(value, True)}">
+    %endif
+    </p>
+</%def>
+
 <%def name="text(name, value = '', label = None, rows = 5, readonly = False, reload = False, info = None)">
     <div style="margin: 1em 0px"><label>${label if label else name}<br>
         %if rows > 1:
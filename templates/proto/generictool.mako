@@ -16,9 +16,6 @@
 #    along with The Genomic HyperBrowser.  If not, see <http://www.gnu.org/licenses/>.
 
 import sys, os, traceback, json
-import cPickle as pickle
-from zlib import compress
-from base64 import urlsafe_b64encode
 from cgi import escape
 from urllib import quote, unquote
 
@@ -51,9 +48,8 @@ else:
 
     <form method="post" action="${formAction}">
 
-    <INPUT TYPE="HIDDEN" NAME="cached_options" VALUE="${urlsafe_b64encode(compress(json.dumps(control.cachedOptions)))}">
-    <INPUT TYPE="HIDDEN" NAME="cached_params" VALUE="${urlsafe_b64encode(compress(json.dumps(control.cachedParams)))}">
-    <INPUT TYPE="HIDDEN" NAME="cached_extra" VALUE="${urlsafe_b64encode(compress(json.dumps(control.cachedExtra)))}">
+    <INPUT TYPE="HIDDEN" NAME="cache_token" VALUE="${control.cacheToken}">
+    <INPUT TYPE="HIDDEN" NAME="cached_extra" VALUE="${control.getEncodedCachedExtra()}">
     <INPUT TYPE="HIDDEN" NAME="old_values" VALUE="${quote(json.dumps(control.oldValues))}">
     <INPUT TYPE="HIDDEN" NAME="datatype" VALUE="${control.prototype.getOutputFormat(control.choices)}">
     <INPUT TYPE="HIDDEN" NAME="mako" VALUE="generictool">
@@ -79,6 +75,8 @@ else:
             ${functions.text(control.inputIds[i], control.displayValues[i], control.inputNames[i], control.options[i][1], readonly=True)}
         %elif control.inputTypes[i] == 'rawStr':
             ${functions.rawStr(control.inputIds[i], control.displayValues[i], control.inputNames[i])}
+        %elif control.inputTypes[i] == '__loading__':
+            ${functions.loading(control.inputIds[i], params.get(control.inputIds[i]), control.inputNames[i])}
         %elif control.inputTypes[i] == '__password__':
             ${functions.password(control.inputIds[i], control.displayValues[i], control.inputNames[i], reload=control.prototype.isDynamic(), info=control.inputInfo[i])}
         %elif control.inputTypes[i] == '__genome__':
@@ -103,6 +101,13 @@ else:
 
     </form>
 
+    %if '__loading__' in control.inputTypes:
+        <script type="text/javascript">
+            // the boxes still loading are stored server-side when ready
+            setTimeout(function() { reloadForm(); }, 3000);
+        </script>
+    %endif
+
     %if control.hasErrorMessage():
         <div class="errormessage">${control.errorMessage}</div>
     %endif
@@ -9,6 +9,8 @@ Unit tests for base DataProviders.
 
 import imp
 import os
+import shutil
+import tempfile
 import unittest
 import StringIO
 
@@ -20,7 +22,8 @@ log = utility.set_up_filelogger( __name__ + '.log' )
 utility.add_galaxy_lib_to_path( 'test/unit/datatypes/dataproviders' )
 
 from galaxy import eggs
-from galaxy.datatypes.dataproviders import line
+from galaxy.datatypes.dataproviders import base, line
+from galaxy.util.bunch import Bunch
 
 _TODO = """
 TestCase hierarchy is a bit of mess here.
@@ -103,6 +106,63 @@ class Test_FilteredLineDataProvider( test_base_dataproviders.Test_FilteredDataPr
                                   '# as should blank lines', '# preceding/trailing whitespace too' ] )
         self.assertCounters( provider, 7, 4, 4 )
 
+    def test_offset_index( self ):
+        """should index positions of valid lines and seek to them for offsets
+        """
+        contents = ''.join([ '# comment %d\n%d\n' % ( i, i ) for i in xrange( 50 ) ])
+        filename = self.tmpfiles.create_tmpfile( contents )
+        index_dir = tempfile.mkdtemp()
+        old_settings = ( base.OffsetIndex.index_dir, base.OffsetIndex.interval )
+        base.OffsetIndex.index_dir, base.OffsetIndex.interval = index_dir, 7
+        try:
+            # the first read builds the index, the second seeks using it
+            for i in xrange( 2 ):
+                ( c, provider, data ) = self.contents_provider_and_data( filename=filename, offset=45, limit=3 )
+                self.assertEqual( data, [ '45', '46', '47' ] )
+                self.assertCounters( provider, 96, 48, 3 )
+            self.assertEqual( len( os.listdir( index_dir ) ), 1 )
+
+            offset_index = base.OffsetIndex( filename, provider.filter_signature() )
+            self.assertEqual( len( offset_index.checkpoints ), 6 )
+            position, num_data_read, num_valid_data_read = offset_index.find( 45 )
+            self.assertEqual( ( num_data_read, num_valid_data_read ), ( 84, 42 ) )
+            self.assertTrue( contents[ position: ].startswith( '# comment 42\n' ) )
+
+            # indeces are only used when filtering can be described
+            ( c, provider, data ) = self.contents_provider_and_data( filename=filename, offset=45, limit=3,
+                filter_fn=lambda line: line )
+            self.assertEqual( provider.get_offset_index(), None )
+            self.assertEqual( data, [ '45', '46', '47' ] )
+        finally:
+            base.OffsetIndex.index_dir, base.OffsetIndex.interval = old_settings
+            shutil.rmtree( index_dir )
+
+    def test_offset_index_side_files( self ):
+        """should keep the indeces of a few signatures per file and remove those of purged datasets
+        """
+        filename = self.tmpfiles.create_tmpfile( ''.join([ '%d\n' % i for i in xrange( 50 ) ]) )
+        dataset = Bunch( id=5, file_name=filename )
+        index_dir = tempfile.mkdtemp()
+        old_settings = ( base.OffsetIndex.index_dir, base.OffsetIndex.interval, base.OffsetIndex.max_signatures )
+        base.OffsetIndex.index_dir, base.OffsetIndex.interval, base.OffsetIndex.max_signatures = index_dir, 7, 2
+        try:
+            for signature in ( 'a', 'b', 'c' ):
+                offset_index = base.OffsetIndex.for_dataset( dataset, signature )
+                offset_index.record( 14, 7, 7 )
+                offset_index.save()
+            self.assertEqual( os.listdir( index_dir ), [ 'dataset_5.json' ] )
+            # the least recently saved signature is dropped
+            self.assertEqual( base.OffsetIndex.for_dataset( dataset, 'a' ).checkpoints, [] )
+            self.assertEqual( base.OffsetIndex.for_dataset( dataset, 'b' ).checkpoints, [ ( 14, 7, 7 ) ] )
+            self.assertEqual( base.OffsetIndex.for_dataset( dataset, 'c' ).checkpoints, [ ( 14, 7, 7 ) ] )
+
+            base.OffsetIndex.remove_for_dataset( dataset )
+            self.assertEqual( os.listdir( index_dir ), [] )
+            base.OffsetIndex.remove_for_dataset( dataset )
+        finally:
+            base.OffsetIndex.index_dir, base.OffsetIndex.interval, base.OffsetIndex.max_signatures = old_settings
+            shutil.rmtree( index_dir )
+
 
 class Test_RegexLineDataProvider( Test_FilteredLineDataProvider ):
     provider_class = line.RegexLineDataProvider
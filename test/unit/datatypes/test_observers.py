@@ -0,0 +1,57 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from galaxy.datatypes import observers
+
+
+class CountingObserver( observers.FileObserver ):
+
+    def __init__( self, limit ):
+        self.limit = limit
+        self.lines = []
+        self.finished = False
+
+    def observe( self, line ):
+        self.lines.append( line )
+        return len( self.lines ) >= self.limit
+
+    def finish( self ):
+        self.finished = True
+
+
+class ScanFileTestCase( TestCase ):
+
+    def setUp( self ):
+        fd, self.file_name = tempfile.mkstemp()
+        os.write( fd, "#comment\n1\t2\n\n3\t4\n5\t6\n" )
+        os.close( fd )
+
+    def tearDown( self ):
+        os.remove( self.file_name )
+
+    def test_observers_stop_independently( self ):
+        short, full = CountingObserver( 2 ), CountingObserver( 100 )
+        observers.scan_file( self.file_name, [ short, full ] )
+        assert short.lines == [ "#comment\n", "1\t2\n" ]
+        assert len( full.lines ) == 5
+        assert short.finished and full.finished
+
+    def test_data_lines( self ):
+        data_lines, = observers.scan_file( self.file_name, [ observers.DataLinesObserver() ] )
+        assert data_lines.data_lines == 3
+
+    def test_parallel_scan( self ):
+        fh = open( self.file_name, 'ab' )
+        fh.write( "".join( "%d\t%d\n" % ( i, i ) for i in range( 1000 ) ) )
+        fh.close()
+        short, data_lines = observers.scan_file( self.file_name, [ CountingObserver( 2 ), observers.DataLinesObserver() ], processes=2, min_size=0 )
+        assert len( short.lines ) == 2
+        assert data_lines.data_lines == 1003
+
+    def test_line_ranges( self ):
+        fh = open( self.file_name, 'rb' )
+        ranges = observers.line_ranges( fh, 9, os.path.getsize( self.file_name ), 3 )
+        fh.close()
+        # "1\t2\n" / "\n3\t4\n" / "5\t6\n"
+        assert ranges == [ ( 9, 13 ), ( 13, 18 ), ( 18, 22 ) ]
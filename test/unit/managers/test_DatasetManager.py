@@ -129,6 +129,29 @@ class DatasetManagerTestCase( BaseTestCase ):
         for user in self.user_mgr.list( self.trans ):
             self.assertTrue( self.dataset_mgr.is_accessible( self.trans, dataset, user ) )
 
+    def test_access_in_bulk( self ):
+        owner = self.user_mgr.create( self.trans, **user2_data )
+        non_owner = self.user_mgr.create( self.trans, **user3_data )
+        security_agent = self.app.security_agent
+
+        public = self.dataset_mgr.create( self.trans )
+        private = self.dataset_mgr.create( self.trans )
+        security_agent.privately_share_dataset( private, users=[ owner ] )
+        dataset_ids = [ public.id, private.id ]
+
+        self.log( "should map each dataset id to whether the roles can access it" )
+        self.assertEqual( security_agent.can_access_datasets( owner.all_roles(), dataset_ids ),
+            { public.id: True, private.id: True } )
+        self.assertEqual( security_agent.can_access_datasets( non_owner.all_roles(), dataset_ids ),
+            { public.id: True, private.id: False } )
+
+        self.log( "should agree with checking the datasets one by one" )
+        for user in ( owner, non_owner ):
+            roles = user.all_roles()
+            for dataset in ( public, private ):
+                self.assertEqual( security_agent.can_access_datasets( roles, [ dataset.id ] )[ dataset.id ],
+                    security_agent.can_access_dataset( roles, dataset ) )
+
 
 # =============================================================================
 class DatasetAssociationManagerTestCase( BaseTestCase ):
@@ -211,6 +211,29 @@ class HDAManagerTestCase( BaseTestCase ):
         self.assertRaises( exceptions.ItemOwnershipException,
             self.hda_mgr.error_unless_owner, self.trans, item1, non_owner )
 
+    def test_summary_rows( self ):
+        owner = self.user_mgr.create( self.trans, **user2_data )
+        history1 = self.history_mgr.create( self.trans, name='history1', user=owner )
+        hdas = [ self.hda_mgr.create( self.trans, history=history1, hid=hid ) for hid in range( 1, 6 ) ]
+        self.hda_mgr.delete( self.trans, hdas[ 1 ] )
+
+        self.log( "should return the columns of every hda, ordered by hid" )
+        rows = self.hda_mgr.summary_rows( history1 )
+        self.assertEqual( [ row.id for row in rows ], [ hda.id for hda in hdas ] )
+        self.assertEqual( [ row.state for row in rows ], [ hda.state for hda in hdas ] )
+
+        self.log( "should be able to page by hid" )
+        rows = self.hda_mgr.summary_rows( history1, hid_gt=2, limit=2 )
+        self.assertEqual( [ row.hid for row in rows ], [ 3, 4 ] )
+
+        self.log( "should be able to filter deleted" )
+        rows = self.hda_mgr.summary_rows( history1, deleted='False' )
+        self.assertEqual( [ row.hid for row in rows ], [ 1, 3, 4, 5 ] )
+
+        self.log( "should only return hdas updated since a given time" )
+        since = max( hda.update_time for hda in hdas )
+        self.assertEqual( self.hda_mgr.summary_rows( history1, since=since ), [] )
+
 
 # =============================================================================
 if __name__ == '__main__':
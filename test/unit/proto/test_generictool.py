@@ -0,0 +1,275 @@
+""" Tests for the option box handling of the ProTo generic tool controller.
+"""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from unittest import TestCase
+
+import mock
+
+# proto.config.Config reads config/galaxy.ini when imported, so the tests
+# provide the few settings used by the controller themselves.
+if 'proto.config.Config' not in sys.modules:
+    import proto.config
+    Config = types.ModuleType( 'proto.config.Config' )
+    Config.GALAXY_BASE_DIR = tempfile.gettempdir()
+    Config.URL_PREFIX = ''
+    Config.PROTO_OPTIONS_CACHE_SIZE = 10000
+    Config.PROTO_OPTIONS_CACHE_TTL = 86400
+    Config.PROTO_OPTIONS_BOX_THREADS = 1
+    Config.PROTO_OPTIONS_BOX_TIMEOUT = 30
+    Config.userHasFullAccess = lambda galaxyUserName: False
+    sys.modules[ 'proto.config.Config' ] = proto.config.Config = Config
+
+from proto import generictool
+from proto.OptionsCache import OptionsCache
+from proto.tools.GeneralGuiTool import GeneralGuiTool
+
+
+class MockTool( GeneralGuiTool ):
+    calls = []
+
+    @staticmethod
+    def getToolName():
+        return 'Mock tool'
+
+    @staticmethod
+    def getInputBoxNames():
+        return [ ( 'Genome', 'genome' ), ( 'Track', 'track' ), ( 'Statistic', 'statistic' ) ]
+
+    @classmethod
+    def getOptionsBoxGenome( cls ):
+        cls.calls.append( 'genome' )
+        return [ 'hg18', 'hg19' ]
+
+    @classmethod
+    def getOptionsBoxTrack( cls, prevChoices ):
+        cls.calls.append( 'track' )
+        return [ prevChoices.genome + ':genes', prevChoices.genome + ':exons' ]
+
+    @classmethod
+    def getOptionsBoxStatistic( cls, prevChoices ):
+        cls.calls.append( 'statistic' )
+        try:
+            # depends on the track for one of the genomes only
+            if prevChoices.genome == 'hg18':
+                return [ prevChoices.track + ':count' ]
+        except Exception:
+            pass
+        return [ prevChoices.genome + ':coverage' ]
+
+
+class SlowMockTool( MockTool ):
+
+    @staticmethod
+    def getInputBoxNames():
+        return MockTool.getInputBoxNames() + [ ( 'Summary', 'summary' ) ]
+
+    @staticmethod
+    def getInputBoxDependencies():
+        return { 'statistic': [ 'genome' ], 'summary': [ 'genome' ] }
+
+    @classmethod
+    def getOptionsBoxStatistic( cls, prevChoices ):
+        cls.calls.append( 'statistic' )
+        time.sleep( 2 )
+        return [ prevChoices.genome + ':coverage' ]
+
+    @classmethod
+    def getOptionsBoxSummary( cls, prevChoices ):
+        cls.calls.append( 'summary' )
+        time.sleep( 2 )
+        return [ prevChoices.genome + ':mean', prevChoices.genome + ':median' ]
+
+
+class MockToolRegistry( object ):
+    tool = MockTool
+
+    def getPrototypeClass( self, toolId ):
+        return self.tool
+
+
+class TestOptionsCache( OptionsCache ):
+    fn = None
+
+    def __init__( self ):
+        OptionsCache.__init__( self, self.fn )
+
+
+class MockTrans( object ):
+
+    def __init__( self, params ):
+        self.params = params
+
+
+class TestGenericToolController( generictool.GenericToolController ):
+
+    def openTransaction( self, trans ):
+        self.transaction = trans
+        self.params = trans.params
+
+    def openJobParams( self, params ):
+        self.jobFile = None
+        self.params = params
+
+
+class GenericToolControllerTestCase( TestCase ):
+
+    def setUp( self ):
+        self.directory = tempfile.mkdtemp()
+        TestOptionsCache.fn = self.directory + '/options-cache.sqlite'
+        MockTool.calls = []
+        MockToolRegistry.tool = MockTool
+        self.patches = [
+            mock.patch.object( generictool, 'getToolRegistry', MockToolRegistry ),
+            mock.patch.object( generictool, 'OptionsCache', TestOptionsCache ),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown( self ):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree( self.directory )
+
+    def test_options_cache_store_and_load( self ):
+        cache = TestOptionsCache()
+        token = cache.newToken()
+        cache.put( token, 'session', ( { 'genome': 'hg19' }, {}, {}, {} ) )
+        assert cache.get( token, 'session' ) == ( { 'genome': 'hg19' }, {}, {}, {} )
+        # the job runner has no session
+        assert cache.get( token ) is not None
+        assert cache.get( token, 'another session' ) is None
+        assert cache.get( cache.newToken(), 'session' ) is None
+
+    def test_options_cache_eviction( self ):
+        cache = OptionsCache( TestOptionsCache.fn, maxEntries=2 )
+        tokens = [ cache.newToken() for i in range( 3 ) ]
+        for token in tokens:
+            cache.put( token, None, ( {}, {}, {}, {} ) )
+        assert cache.get( tokens[ 0 ] ) is None
+        assert cache.get( tokens[ 2 ] ) is not None
+        cache = OptionsCache( TestOptionsCache.fn, ttl=-1 )
+        assert cache.get( tokens[ 2 ] ) is None
+
+    def test_job_uses_submitted_extra_data( self ):
+        controller = self._request( genome='hg19' )
+        controller.putCacheData( 'track', [ 'hg19:genes' ] )
+        cached_extra = controller.getEncodedCachedExtra()
+        # the cached state is gone or belongs to a later form by the time the job runs
+        TestOptionsCache().put( controller.cacheToken, None, ( {}, {}, {}, {} ) )
+        job = TestGenericToolController( None, dict( tool_id='mock', genome='hg19', cache_token=controller.cacheToken,
+                                                     cached_extra=cached_extra ) )
+        assert job.getCacheData( 'track' ) == [ 'hg19:genes' ]
+
+    def test_reload_uses_cached_boxes( self ):
+        controller = self._request( genome='hg19' )
+        assert MockTool.calls == [ 'genome', 'track', 'statistic' ]
+        MockTool.calls = []
+        reloaded = self._request( genome='hg19', cache_token=controller.cacheToken )
+        assert MockTool.calls == []
+        assert reloaded.cacheToken == controller.cacheToken
+        assert reloaded.options == controller.options
+        assert reloaded.cacheHits == 3 and reloaded.cacheMisses == 0
+
+    def test_changed_choice_recomputes_dependent_boxes( self ):
+        controller = self._request( genome='hg19' )
+        MockTool.calls = []
+        controller = self._request( genome='hg19', track='hg19:exons', cache_token=controller.cacheToken )
+        # the statistic box does not read the track for hg19
+        assert MockTool.calls == []
+        assert controller.inputValues == [ 'hg19', 'hg19:exons', 'hg19:coverage' ]
+        controller = self._request( genome='hg18', cache_token=controller.cacheToken )
+        assert MockTool.calls == [ 'track', 'statistic' ]
+        assert controller.inputValues == [ 'hg18', 'hg18:genes', 'hg18:genes:count' ]
+
+    def test_cache_load_failure_recomputes_boxes( self ):
+        controller = self._request( genome='hg19' )
+        MockTool.calls = []
+        with mock.patch.object( OptionsCache, 'get', side_effect=Exception( 'corrupt cache' ) ):
+            reloaded = self._request( genome='hg19', cache_token=controller.cacheToken )
+        assert MockTool.calls == [ 'genome', 'track', 'statistic' ]
+        assert reloaded.cacheToken != controller.cacheToken
+        assert reloaded.options == controller.options
+
+    def test_cached_box_load_failure_recomputes_box( self ):
+        controller = self._request( genome='hg19' )
+        cache = TestOptionsCache()
+        cachedParams, cachedOptions, cachedExtra, cachedDeps = cache.get( controller.cacheToken )
+        cachedOptions[ 'track' ] = 'not a pickle'
+        cache.put( controller.cacheToken, None, ( cachedParams, cachedOptions, cachedExtra, cachedDeps ) )
+        MockTool.calls = []
+        reloaded = self._request( genome='hg19', cache_token=controller.cacheToken )
+        assert MockTool.calls == [ 'track' ]
+        assert reloaded.options == controller.options
+
+    def test_prefetched_box_reading_unknown_choice_is_recomputed( self ):
+        controller = self._request( genome='hg19' )
+        assert controller.inputValues == [ 'hg19', 'hg19:genes', 'hg19:coverage' ]
+        # the statistic box only read the genome last time, so it is
+        # prefetched before the track box is known, but now reads the track
+        with mock.patch.object( generictool, 'PROTO_OPTIONS_BOX_THREADS', 2 ):
+            controller = self._request( genome='hg18', cache_token=controller.cacheToken )
+        assert controller.inputValues == [ 'hg18', 'hg18:genes', 'hg18:genes:count' ]
+        assert controller.cachedDeps[ 'statistic' ] == [ 'genome', 'track' ]
+        assert not controller.loadingBoxes
+
+    def test_one_timeout_per_request( self ):
+        MockToolRegistry.tool = SlowMockTool
+        start = time.time()
+        controller = self._slowRequest( 0.5, genome='hg19' )
+        assert time.time() - start < 0.9
+        assert controller.options[ 2: ] == [ '__loading__', '__loading__' ]
+        # the boxes are stored in the cache once they are ready
+        controller.finishLoadingOptionsBoxes()
+        assert sorted( self._storedOptions( controller ) ) == [ 'genome', 'statistic', 'summary', 'track' ]
+        assert TestOptionsCache().getLoadingBoxes( controller.cacheToken ) == {}
+
+    def test_finished_boxes_keep_later_state( self ):
+        MockToolRegistry.tool = SlowMockTool
+        controller = self._slowRequest( 0.5, genome='hg19' )
+        # the form is changed before the boxes are ready
+        later = self._slowRequest( 5, genome='hg18', cache_token=controller.cacheToken )
+        controller.finishLoadingOptionsBoxes()
+        cachedParams, cachedOptions, cachedExtra, cachedDeps = TestOptionsCache().get( controller.cacheToken )
+        assert cachedParams == later.cachedParams
+        assert cachedParams[ 'genome' ] == 'hg18'
+        assert cachedOptions[ 'summary' ] == later.cachedOptions[ 'summary' ]
+
+    def test_reload_waits_for_loading_boxes( self ):
+        MockToolRegistry.tool = SlowMockTool
+        controller = self._slowRequest( 0.5, genome='hg19' )
+        assert sorted( TestOptionsCache().getLoadingBoxes( controller.cacheToken ) ) == [ 'statistic', 'summary' ]
+        # a reload before the boxes are ready shows them as loading again
+        MockTool.calls = []
+        reloaded = self._slowRequest( 0.5, genome='hg19', cache_token=controller.cacheToken )
+        assert MockTool.calls == []
+        assert reloaded.options[ 2: ] == [ '__loading__', '__loading__' ]
+        assert not reloaded.loadingBoxes
+
+        def finish():
+            controller.optionsCache = TestOptionsCache()
+            controller.finishLoadingOptionsBoxes()
+        finishing = threading.Thread( target=finish )
+        finishing.start()
+        try:
+            reloaded = self._slowRequest( 5, genome='hg19', cache_token=controller.cacheToken )
+        finally:
+            finishing.join()
+        assert MockTool.calls == []
+        assert reloaded.options[ 2: ] == [ [ 'hg19:coverage' ], [ 'hg19:mean', 'hg19:median' ] ]
+
+    def _request( self, **params ):
+        params[ 'tool_id' ] = 'mock_tool'
+        return TestGenericToolController( MockTrans( params ), None )
+
+    def _slowRequest( self, timeout, **params ):
+        with mock.patch.object( generictool, 'PROTO_OPTIONS_BOX_THREADS', 2 ):
+            with mock.patch.object( generictool, 'PROTO_OPTIONS_BOX_TIMEOUT', timeout ):
+                return self._request( **params )
+
+    def _storedOptions( self, controller ):
+        return TestOptionsCache().get( controller.cacheToken )[ 1 ]
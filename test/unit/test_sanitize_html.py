@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from galaxy.util.sanitize_html import iter_sanitized_html, sanitize_html
+
+DOCUMENTS = [
+    '<p>text &amp; <b>bold</b><br/>&#39;quoted&#34;</p>\r\n',
+    '<!DOCTYPE html><!foo /><!-- comment --><![CDATA[x]]>',
+    # the escaped '<!' makes the first '<' start a short tag
+    'x<<!foo />y',
+    '<br /  ><img src="x"/><abc\t/>< br/>',
+    '<script>alert(1)</script><a href="javascript:x">link</a>',
+    'a < b and ' + 'text ' * 1000 + '</p>',
+    '<p>unterminated <abc ' + 'attr ' * 1000,
+    '  \r\n <p> padded </p> \r\n ',
+]
+
+
+class IterSanitizedHtmlTestCase( TestCase ):
+
+    def test_matches_sanitize_html( self ):
+        for document in DOCUMENTS:
+            expected = sanitize_html( document )
+            for size in ( 1, 2, 3, 7, 100, len( document ) ):
+                chunks = [ document[ i:i + size ] for i in range( 0, len( document ), size ) ]
+                assert ''.join( iter_sanitized_html( iter( chunks ) ) ) == expected, ( document, size )
+
+    def test_streams_text_after_lone_lt( self ):
+        consumed = []
+
+        def chunks():
+            for chunk in [ 'a < b' ] + [ ' text' * 100 ] * 10:
+                consumed.append( chunk )
+                yield chunk
+        output = iter_sanitized_html( chunks() )
+        while 'text' not in output.next():
+            pass
+        assert len( consumed ) < 11
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from StringIO import StringIO
+from unittest import TestCase
+
+from galaxy.util import streamball
+
+FILES = [
+    ( 'empty', '' ),
+    ( u'd/r\xe9sum\xe9.txt', 'chr1\t100\t200\n' * 10000 ),
+    ( u'd/\u4e2d.bin', os.urandom( 100000 ) ),
+]
+
+
+class ZipStreamBallTestCase( TestCase ):
+
+    def setUp( self ):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for i, ( name, data ) in enumerate( FILES ):
+            path = os.path.join( self.directory, str( i ) )
+            open( path, 'wb' ).write( data )
+            self.paths.append( path )
+
+    def tearDown( self ):
+        shutil.rmtree( self.directory )
+
+    def test_deflated( self ):
+        archive = self._read( streamball.ZipStreamBall() )
+        # Random data is stored rather than deflated
+        assert [ info.compress_type for info in archive.infolist() ] == [ zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED ]
+
+    def test_stored( self ):
+        archive = self._read( streamball.ZipStreamBall( 0 ) )
+        assert [ info.compress_type for info in archive.infolist() ] == [ zipfile.ZIP_STORED ] * 3
+
+    def test_zip64( self ):
+        zip64_limit, file_count_limit = streamball.ZIP64_LIMIT, streamball.ZIP_FILECOUNT_LIMIT
+        streamball.ZIP64_LIMIT, streamball.ZIP_FILECOUNT_LIMIT = 100, 2
+        try:
+            self._read( streamball.ZipStreamBall() )
+        finally:
+            streamball.ZIP64_LIMIT, streamball.ZIP_FILECOUNT_LIMIT = zip64_limit, file_count_limit
+
+    def test_missing_file( self ):
+        self.assertRaises( IOError, streamball.ZipStreamBall().add, os.path.join( self.directory, 'missing' ), 'missing' )
+
+    def _read( self, ball ):
+        for path, ( name, data ) in zip( self.paths, FILES ):
+            ball.add( path, name )
+        archive = zipfile.ZipFile( StringIO( ''.join( ball.iter_archive() ) ) )
+        assert archive.testzip() is None
+        for info, ( name, data ) in zip( archive.infolist(), FILES ):
+            assert archive.read( info ) == data
+        return archive
@@ -4,6 +4,7 @@ import unittest
 from galaxy import model
 from galaxy.tools import ToolOutput
 from galaxy.tools.actions import DefaultToolAction
+from galaxy.tools.actions import ToolExecutionCache
 from galaxy.tools.actions import on_text_for_names
 from galaxy.tools.actions import determine_output_format
 from xml.etree.ElementTree import XML
@@ -102,6 +103,8 @@ class DefaultToolActionTestCase( unittest.TestCase, tools_support.UsesApp, tools
         _, output = self._simple_execute( contents=TWO_OUTPUTS )
         self.assertEquals( output[ "out1" ].name, "Output (moo)" )
         self.assertEquals( output[ "out2" ].name, "Output 2 (moo)" )
+        self.assertEquals( output[ "out1" ].dataset.object_store_id, "store0" )
+        self.assertEquals( output[ "out2" ].dataset.object_store_id, "store0" )
 
     def test_params_wrapped( self ):
         hda1 = self.__add_dataset()
@@ -116,6 +119,33 @@ class DefaultToolActionTestCase( unittest.TestCase, tools_support.UsesApp, tools
         job, _ = self._simple_execute()
         assert job.handler == TEST_HANDLER_NAME
 
+    def test_execution_cache_queues_jobs_together( self ):
+        self._init_tool( tools_support.SIMPLE_TOOL_CONTENTS )
+        execution_cache = ToolExecutionCache( self.trans )
+        jobs = []
+        outputs = []
+        for i in range( 3 ):
+            job, output = self.action.execute(
+                tool=self.tool,
+                trans=self.trans,
+                history=self.history,
+                incoming=dict(param1="moo"),
+                execution_cache=execution_cache,
+            )
+            jobs.append( job )
+            outputs.append( output )
+        self.assertEquals( execution_cache.unqueued_jobs, jobs )
+        # Output files are created once the batch is flushed
+        assert not self.app.object_store.created_datasets
+        execution_cache.flush_and_queue_jobs()
+        self.assertEquals( execution_cache.unqueued_jobs, [] )
+        assert all( job.id is not None for job in jobs )
+        self.assertEquals( len( self.app.object_store.created_datasets ), 3 )
+        # Each job still gets its own store
+        self.assertEquals( [ job.object_store_id for job in jobs ], [ "store0", "store1", "store2" ] )
+        for job, output in zip( jobs, outputs ):
+            assert all( data.dataset.object_store_id == job.object_store_id for data in output.values() )
+
     def __add_dataset( self, state='ok' ):
         hda = model.HistoryDatasetAssociation()
         hda.dataset = model.Dataset()
@@ -233,14 +263,13 @@ class MockObjectStore( object ):
 
     def __init__( self ):
         self.created_datasets = []
-        self.first_create = True
-        self.object_store_id = "mycoolid"
+        self.object_store_ids = []
 
     def create( self, dataset ):
         self.created_datasets.append( dataset )
-        if self.first_create:
-            self.first_create = False
-            assert dataset.object_store_id is None
-            dataset.object_store_id = self.object_store_id
+        if dataset.object_store_id is None:
+            # Like a distributed object store, picks a store for each job
+            dataset.object_store_id = "store%d" % len( self.object_store_ids )
+            self.object_store_ids.append( dataset.object_store_id )
         else:
-            assert dataset.object_store_id == self.object_store_id
+            assert dataset.object_store_id in self.object_store_ids
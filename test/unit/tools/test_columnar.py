@@ -0,0 +1,77 @@
+from __future__ import division
+from unittest import TestCase
+
+from galaxy.tools.util import columnar
+
+COLUMN_TYPES = { 1: 'str', 2: 'int', 3: 'float', 4: 'int' }
+ROWS = [
+    ( 'chr1', '5', '1.5', '0' ),
+    ( 'chr2', '12', '-0.5', '3' ),
+    ( 'chr1', 'x', '2.0', '2' ),
+    ( 'chrX', '7', 'nan', '7' ),
+]
+
+
+class VectorizedExpressionTestCase( TestCase ):
+
+    def test_matches_line_by_line( self ):
+        for text in [ "c1=='chr1'", "c2>5 and c3<1.5", "c4!=0 and c2/c4>1", "c4==0 or c2/c4>1",
+                      "not c1=='chr2' or -c3>0.5", "c1 in ['chr1','chrX']", "1<c2<=10", "c2+c3*2>c4", "c2%c4==1" ]:
+            keep, invalid = self._evaluate( text )
+            assert ( list( keep ), list( invalid ) ) == self._line_by_line( text ), text
+
+    def test_not_vectorizable( self ):
+        for text in [ "len(c1)>3", "c1.startswith('chr')", "c2>'a'", "c2**2>4", "c5==1" ]:
+            self.assertRaises( columnar.NotVectorizable, columnar.VectorizedExpression, text, COLUMN_TYPES )
+
+    def test_int_columns( self ):
+        values, invalid = columnar.convert_column( [ '5', '-12', '7' ], 'int' )
+        assert values.dtype == columnar.numpy.int64 and invalid is None
+        big = str( 2 ** 70 )
+        values, invalid = columnar.convert_column( [ '5', big, 'x' ], 'int' )
+        assert values.dtype == object and list( values ) == [ 5, 2 ** 70, 0 ] and list( invalid ) == [ False, False, True ]
+
+    def test_int_overflow( self ):
+        # products beyond the range of int64 are those of Python ints
+        rows = [ ( str( 2 ** 40 ), str( 2 ** 40 ) ), ( '3', '-4' ) ]
+        column_types = { 1: 'int', 2: 'int' }
+        columns = {}
+        for column in column_types:
+            columns[ column ] = columnar.convert_column( [ row[ column - 1 ] for row in rows ], 'int' )[0]
+        for text in [ "c1*c2==%d" % 2 ** 80, "c1*c2*c2>0", "c1*c2<0", "c1-c2>=7" ]:
+            keep = columnar.VectorizedExpression( text, column_types ).evaluate( columns, len( rows ) )[0]
+            assert list( keep ) == [ eval( text, dict( c1=int( c1 ), c2=int( c2 ) ) ) for c1, c2 in rows ], text
+
+    def test_grouped_aggregates( self ):
+        # values sorted by group, groups starting at 0, 2 and 4
+        starts = columnar.numpy.array( [ 0, 2, 4 ] )
+        values = columnar.convert_column( [ '2', '4', '1', '3', '5' ], 'float' )[0]
+        assert list( columnar.aggregate( 'sum', values, starts ) ) == [ 6, 4, 5 ]
+        assert list( columnar.aggregate( 'mean', values, starts ) ) == [ 3, 2, 5 ]
+        assert list( columnar.aggregate( 'median', values, starts ) ) == [ 3, 2, 5 ]
+        assert list( columnar.group_sizes( starts, len( values ) ) ) == [ 2, 2, 1 ]
+
+    def _evaluate( self, text ):
+        expression = columnar.VectorizedExpression( text, COLUMN_TYPES )
+        columns = {}
+        invalid = None
+        # all columns are cast, as by _line_by_line
+        for column in COLUMN_TYPES:
+            columns[ column ], invalid_values = columnar.convert_column( [ row[ column - 1 ] for row in ROWS ], COLUMN_TYPES[ column ] )
+            invalid = columnar._or( invalid, invalid_values )
+        keep, invalid_expression = expression.evaluate( columns, len( ROWS ) )
+        invalid = columnar._or( invalid, invalid_expression )
+        return keep & ~invalid, invalid
+
+    def _line_by_line( self, text ):
+        keep = []
+        invalid = []
+        for row in ROWS:
+            try:
+                c1, c2, c3, c4 = str( row[0] ), int( row[1] ), float( row[2] ), int( row[3] )
+                keep.append( bool( eval( text ) ) )
+                invalid.append( False )
+            except ( ValueError, ZeroDivisionError ):
+                keep.append( False )
+                invalid.append( True )
+        return keep, invalid
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from xml.etree.ElementTree import XML
+
+from galaxy.tools.data import TabularToolDataTable
+
+TABLE_XML = '''<table name="test_fasta" comment_char="#">
+    <columns>value, dbkey, name, path</columns>
+    <file path="%s" />
+</table>'''
+
+
+class TabularToolDataTableTestCase( TestCase ):
+
+    def setUp( self ):
+        self.test_directory = tempfile.mkdtemp()
+        self.loc_file = os.path.join( self.test_directory, "all_fasta.loc" )
+        open( self.loc_file, "w" ).write( "#comment\nhg19\thg19\tHuman\t/hg19.fa\nmm9\tmm9\tMouse\t/mm9.fa\nhg19b\thg19\tHuman (b)\t/hg19b.fa\n" )
+        self.table = TabularToolDataTable( XML( TABLE_XML % self.loc_file ), self.test_directory )
+
+    def tearDown( self ):
+        shutil.rmtree( self.test_directory )
+
+    def test_get_entry( self ):
+        assert self.table.get_entry( "value", "mm9", "path" ) == "/mm9.fa"
+        assert self.table.get_entry( "value", "rn4", "path" ) is None
+        assert self.table.get_entry( "dbkey", "hg19", "name" ) == "Human"
+
+    def test_get_entries( self ):
+        assert self.table.get_entries( "dbkey", "hg19", "value" ) == [ "hg19", "hg19b" ]
+        assert self.table.get_entries( "dbkey", "hg19", None, limit=1 ) == [ dict( value="hg19", dbkey="hg19", name="Human", path="/hg19.fa" ) ]
+        assert self.table.get_entries( "dbkey", "rn4", "value" ) is None
+
+    def test_get_entry_map( self ):
+        assert self.table.get_entry_map( "value", [ "hg19", "rn4", "mm9" ], "path" ) == dict( hg19="/hg19.fa", mm9="/mm9.fa" )
+
+    def test_added_entries_are_found( self ):
+        assert self.table.get_entry( "value", "rn4", "path" ) is None
+        self.table.add_entry( [ "rn4", "rn4", "Rat", "/rn4.fa" ] )
+        assert self.table.get_entry( "value", "rn4", "path" ) == "/rn4.fa"
+        self.table.add_entry( [ "rn4", "rn4", "Rat", "/rn4.fa" ], allow_duplicates=False )
+        assert self.table.get_entries( "value", "rn4", "path" ) == [ "/rn4.fa" ]
+
+    def test_removed_entries_are_not_found( self ):
+        self.table.remove_entry( [ "mm9", "mm9", "Mouse", "/mm9.fa" ] )
+        assert self.table.get_entry( "value", "mm9", "path" ) is None
+        assert self.table.get_entry( "value", "hg19", "path" ) == "/hg19.fa"
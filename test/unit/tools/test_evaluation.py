@@ -51,6 +51,17 @@ class ToolEvaluatorTestCase(TestCase, UsesApp):
         command_line, extra_filenames = self.evaluator.build( )
         self.assertEquals( command_line, "bwa --thresh=4 --in=/galaxy/files/dataset_1.dat --out=/galaxy/files/dataset_2.dat" )
 
+    def test_evaluation_with_compiled_command_reused( self ):
+        self._setup_test_bwa_job()
+        self._set_compute_environment()
+        self.evaluator.build( )
+        # a second job for the same tool fills the cached template with its own parameters
+        self.job.parameters = [ JobParameter( name="thresh", value="5" ) ]
+        self.evaluator = ToolEvaluator( self.app, self.tool, self.job, self.test_directory )
+        self._set_compute_environment()
+        command_line, extra_filenames = self.evaluator.build( )
+        self.assertEquals( command_line, "bwa --thresh=5 --in=/galaxy/files/dataset_1.dat --out=/galaxy/files/dataset_2.dat" )
+
     def test_repeat_evaluation( self ):
         repeat = Repeat()
         repeat.name = "r"
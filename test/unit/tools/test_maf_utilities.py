@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import mock
+
+from galaxy.tools.util import maf_utilities
+
+MAF = """##maf version=1
+a score=10.0
+s hg18.chr1 100 10 + 1000 ACGTACGTAC
+s mm8.chr4  200 10 - 2000 ACGTACGTAC
+s rn4       300 10 + 3000 ACGTACGTAC
+
+a score=20.0
+s hg18.chr2 100 10 + 1000 ACGTACGTAC
+s panTro2.chr2 200 10 + 2000 ACGTACGTAC
+
+"""
+
+
+class MafIndexCacheTestCase( TestCase ):
+
+    def setUp( self ):
+        self.directory = tempfile.mkdtemp()
+        self.cache = maf_utilities.MafIndexCache( os.path.join( self.directory, 'cache' ) )
+        self.maf_file = self._write_maf( 'input.maf' )
+        self.builds = []
+        build = maf_utilities.build_maf_index_species_chromosomes
+
+        def counting_build( filename, index_species=None ):
+            self.builds.append( filename )
+            return build( filename, index_species )
+        self.patch = mock.patch.object( maf_utilities, 'build_maf_index_species_chromosomes', counting_build )
+        self.patch.start()
+
+    def tearDown( self ):
+        self.patch.stop()
+        shutil.rmtree( self.directory )
+
+    def test_hit( self ):
+        assert self.cache.get( self.maf_file ) is None
+        entry = self.cache.get_or_build( self.maf_file )
+        assert self.cache.get_or_build( self.maf_file ).index_filename == entry.index_filename
+        assert self.builds == [ self.maf_file ]
+        index, index_filename = maf_utilities.open_or_build_maf_index( self.maf_file, None, cache=self.cache )
+        assert index_filename is None
+        blocks = index.get( 'rn4', 300, 310 )
+        assert [ block.score for block in blocks ] == [ 10.0 ]
+        assert self.builds == [ self.maf_file ]
+
+    def test_species( self ):
+        species = [ 'hg18', 'mm8', 'rn4', 'panTro2' ]
+        assert maf_utilities.get_species_in_maf( self.maf_file, cache=self.cache ) == species
+        entry = self.cache.get( self.maf_file )
+        assert entry.get_species_chromosomes() == ( species, { 'hg18': [ 'chr1', 'chr2' ], 'mm8': [ 'chr4' ], 'rn4': [], 'panTro2': [ 'chr2' ] } )
+        # read from the species file of the cached entry
+        assert maf_utilities.get_species_in_maf( self.maf_file, cache=self.cache ) == species
+        assert self.builds == [ self.maf_file ]
+
+    def test_invalidation( self ):
+        entry = self.cache.get_or_build( self.maf_file )
+        open( self.maf_file, 'a' ).write( MAF.split( '\n', 1 )[1] )
+        assert self.cache.get( self.maf_file ) is None
+        assert self.cache.get_or_build( self.maf_file ).index_filename != entry.index_filename
+        assert len( self.builds ) == 2
+
+    def test_eviction( self ):
+        maf_files = [ self._write_maf( '%d.maf' % i ) for i in range( 3 ) ]
+        self.cache.max_size = 0
+        entries = []
+        for i, maf_file in enumerate( maf_files ):
+            entries.append( self.cache.get_or_build( maf_file ) )
+            # the entry just built is kept even when the cache is too large
+            assert os.path.exists( entries[-1].index_filename )
+            assert not any( os.path.exists( entry.index_filename ) for entry in entries[:-1] )
+        # room for two entries
+        self.cache.max_size = self._size( entries[-1] ) * 2
+        first = self.cache.get_or_build( maf_files[0] )
+        os.utime( entries[-1].index_filename, ( 0, 0 ) )
+        last = self.cache.get_or_build( maf_files[1] )
+        # the least recently used entry is removed first
+        assert not os.path.exists( entries[-1].index_filename )
+        assert os.path.exists( first.index_filename )
+        assert os.path.exists( last.index_filename )
+
+    def test_abandoned_files_removed( self ):
+        entry = self.cache.get_or_build( self.maf_file )
+        old_temp = self._touch( 'tmpold', age=2 * maf_utilities.MafIndexCache.ABANDONED_FILE_AGE )
+        new_temp = self._touch( 'tmpnew', age=0 )
+        old_species = self._touch( 'abc' + maf_utilities.MafIndexCache.SPECIES_SUFFIX, age=2 * maf_utilities.MafIndexCache.ABANDONED_FILE_AGE )
+        os.utime( entry.species_filename, ( 0, 0 ) )
+        self.cache.evict()
+        assert not os.path.exists( old_temp )
+        assert not os.path.exists( old_species )
+        assert os.path.exists( new_temp )
+        assert os.path.exists( entry.species_filename )
+        assert os.path.exists( entry.index_filename )
+
+    def _write_maf( self, name ):
+        path = os.path.join( self.directory, name )
+        open( path, 'w' ).write( MAF )
+        return path
+
+    def _touch( self, name, age ):
+        path = os.path.join( self.cache.cache_dir, name )
+        open( path, 'w' ).close()
+        mtime = time.time() - age
+        os.utime( path, ( mtime, mtime ) )
+        return path
+
+    def _size( self, entry ):
+        return os.path.getsize( entry.index_filename ) + os.path.getsize( entry.species_filename )
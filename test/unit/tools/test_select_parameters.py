@@ -1,3 +1,5 @@
+import os
+
 from galaxy.util import bunch
 from galaxy import model
 from galaxy.tools.parameters import basic
@@ -46,6 +48,32 @@ class SelectToolParameterTestCase( BaseParameterTestCase ):
         assert ("testname2", "testpath2", False) in self.param.get_options( self.trans, { "input_bam": "testpath2" } )
         assert len( self.param.get_options( self.trans, { "input_bam": "testpath3" } ) ) == 0
 
+    def test_filter_param_value_from_dataset( self ):
+        self.options_xml = '''<options from_dataset="input_bam"><column name="name" index="0"/><column name="value" index="1"/><filter type="param_value" ref="input_name" column="0" /></options>'''
+        dataset = self._options_dataset( "testname1\ttestpath1\ntestname2\ttestpath2\ntestname1\ttestpath3\n" )
+        options = self.param.get_options( self.trans, { "input_bam": dataset, "input_name": "testname1" } )
+        assert options == [ ("testname1", "testpath1", False), ("testname1", "testpath3", False) ]
+        assert self.param.get_options( self.trans, { "input_bam": dataset, "input_name": "testname3" } ) == []
+
+    def test_unique_sorted_options_from_dataset( self ):
+        self.options_xml = '''<options from_dataset="input_bam"><column name="value" index="0"/><filter type="unique_value" column="0"/><filter type="sort_by" column="0"/></options>'''
+        dataset = self._options_dataset( "b\t1\na\t2\nb\t3\n" )
+        assert self.param.get_options( self.trans, { "input_bam": dataset } ) == [ ("a", "a", False), ("b", "b", False) ]
+
+    def test_changed_dataset_options_parsed_again( self ):
+        self.options_xml = '''<options from_dataset="input_bam"><column name="value" index="0"/></options>'''
+        dataset = self._options_dataset( "testpath1\n" )
+        assert self.param.get_options( self.trans, { "input_bam": dataset } ) == [ ("testpath1", "testpath1", False) ]
+        self._options_dataset( "testpath2\n", mtime=os.path.getmtime( dataset.file_name ) + 10 )
+        assert self.param.get_options( self.trans, { "input_bam": dataset } ) == [ ("testpath2", "testpath2", False) ]
+
+    def _options_dataset( self, contents, mtime=None ):
+        path = os.path.join( self.test_directory, "options.tabular" )
+        open( path, "w" ).write( contents )
+        if mtime is not None:
+            os.utime( path, ( mtime, mtime ) )
+        return bunch.Bunch( file_name=path )
+
     # TODO: Good deal of overlap here with DataToolParameterTestCase,
     # refactor.
     def setUp( self ):
@@ -0,0 +1,101 @@
+"""
+"""
+import os
+import imp
+import unittest
+
+utility = imp.load_source( 'utility', os.path.join( os.path.dirname( __file__ ), '../../util/utility.py' ) )
+
+relative_test_path = '/test/unit/visualizations/data_providers'
+utility.add_galaxy_lib_to_path( relative_test_path )
+
+from galaxy.util.bunch import Bunch
+from galaxy.util.json import dumps
+from galaxy.visualization.data_providers.cache import RegionDataCache
+
+
+# -----------------------------------------------------------------------------
+class RegionDataCache_TestCase( unittest.TestCase ):
+
+    def result( self, i ):
+        return { 'data': [ [ i, 'chr1', i * 100, i * 100 + 50 ] ], 'message': None }
+
+    def size( self, i ):
+        return len( dumps( self.result( i ) ) )
+
+    def dataset( self, **kwargs ):
+        conversions = [ Bunch( type='tabix', id=10, deleted=False ), Bunch( type='bigwig', id=11, deleted=False ) ]
+        dataset = Bunch( id=1, update_time='2015-01-01 00:00:00', implicitly_converted_datasets=conversions )
+        dataset.__dict__.update( kwargs )
+        return dataset
+
+    def test_get_put( self ):
+        cache = RegionDataCache( 1000 )
+        assert cache.get( 'a' ) is None
+        cache.put( 'a', self.result( 1 ) )
+        assert cache.get( 'a' ) == self.result( 1 )
+        assert cache.size == self.size( 1 )
+        cache.put( 'a', self.result( 2 ) )
+        assert cache.get( 'a' ) == self.result( 2 )
+        assert cache.size == self.size( 2 )
+        cache.clear()
+        assert cache.get( 'a' ) is None
+        assert cache.size == 0
+
+    def test_returns_copies( self ):
+        cache = RegionDataCache( 1000 )
+        result = self.result( 1 )
+        cache.put( 'a', result )
+        result[ 'data' ].append( 'put' )
+        cached = cache.get( 'a' )
+        cached[ 'data' ].append( 'get' )
+        cached[ 'message' ] = 'changed'
+        assert cache.get( 'a' ) == self.result( 1 )
+
+    def test_lru_eviction( self ):
+        # room for four results
+        cache = RegionDataCache( self.size( 1 ) * 4 )
+        for i in range( 4 ):
+            cache.put( i, self.result( i ) )
+        cache.get( 0 )
+        cache.put( 4, self.result( 4 ) )
+        # the least recently used result goes first
+        assert cache.get( 1 ) is None
+        assert [ cache.get( i ) is not None for i in ( 0, 2, 3, 4 ) ] == [ True ] * 4
+        assert cache.size <= cache.max_size
+
+    def test_large_result_not_cached( self ):
+        cache = RegionDataCache( self.size( 1 ) * 3 )
+        cache.put( 'a', self.result( 1 ) )
+        assert cache.get( 'a' ) is None
+        assert cache.size == 0
+
+    def test_disabled( self ):
+        cache = RegionDataCache( 0 )
+        cache.put( 'a', self.result( 1 ) )
+        assert cache.get( 'a' ) is None
+
+    def test_dataset_key( self ):
+        key = RegionDataCache.dataset_key( self.dataset() )
+        reordered = self.dataset()
+        reordered.implicitly_converted_datasets.reverse()
+        assert RegionDataCache.dataset_key( reordered ) == key
+        assert RegionDataCache.dataset_key( self.dataset( update_time='2015-01-02 00:00:00' ) ) != key
+        assert RegionDataCache.dataset_key( self.dataset( id=2 ) ) != key
+        reconverted = self.dataset()
+        reconverted.implicitly_converted_datasets[ 0 ].deleted = True
+        reconverted.implicitly_converted_datasets.append( Bunch( type='tabix', id=12, deleted=False ) )
+        assert RegionDataCache.dataset_key( reconverted ) != key
+
+    def test_region_key( self ):
+        dataset = self.dataset()
+        key = RegionDataCache.region_key( dataset, 'chr1', 0, 1000, 0, 500, { 'mode': 'Auto', 'resolution': 10 } )
+        # the API key and the client's cache busters are ignored
+        params = { 'resolution': '10', 'mode': 'Auto', 'key': 'api key', '_': '12345' }
+        assert RegionDataCache.region_key( dataset, 'chr1', 0, 1000, 0, 500, params ) == key
+        assert RegionDataCache.region_key( dataset, 'chr1', 0, 1000, 0, 500, { 'mode': 'Coverage', 'resolution': 10 } ) != key
+        assert RegionDataCache.region_key( dataset, 'chr1', 1000, 2000, 0, 500, { 'mode': 'Auto', 'resolution': 10 } ) != key
+
+
+if __name__ == '__main__':
+    unittest.main()
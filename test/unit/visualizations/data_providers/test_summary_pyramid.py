@@ -0,0 +1,74 @@
+"""
+"""
+import os
+import imp
+import unittest
+from StringIO import StringIO
+
+utility = imp.load_source( 'utility', os.path.join( os.path.dirname( __file__ ), '../../util/utility.py' ) )
+
+relative_test_path = '/test/unit/visualizations/data_providers'
+utility.add_galaxy_lib_to_path( relative_test_path )
+
+from galaxy.visualization.data_providers import summary_pyramid
+
+
+# -----------------------------------------------------------------------------
+class SummaryPyramid_TestCase( unittest.TestCase ):
+
+    intervals = [ ( 'chr1', [ 0, 100, 300 ], [ 200, 200, 1000 ] ),
+                  ( 'chr2', [ 5000 ], [ 5010 ] ) ]
+
+    def pyramid( self ):
+        out = StringIO()
+        summary_pyramid.write_summary_pyramid( out, self.intervals )
+        return summary_pyramid.SummaryPyramid( StringIO( out.getvalue() ) )
+
+    def depths( self, chrom, start, end ):
+        depths = [ 0 ] * ( end - start )
+        for interval_chrom, starts, ends in self.intervals:
+            if interval_chrom == chrom:
+                for interval_start, interval_end in zip( starts, ends ):
+                    for position in range( max( interval_start, start ), min( interval_end, end ) ):
+                        depths[ position - start ] += 1
+        return [ depth for depth in depths if depth ]
+
+    def test_summarize_finest_level( self ):
+        pyramid = self.pyramid()
+        self.assertEqual( sorted( pyramid.chroms ), [ 'chr1', 'chr2' ] )
+        points = pyramid.summarize( 'chr1', 0, 1024, 4 )
+        self.assertEqual( [ position for position, mean in points ], [ 0, 256, 512, 768 ] )
+        for position, mean in points:
+            depths = self.depths( 'chr1', position, position + 256 )
+            self.assertAlmostEqual( mean, float( sum( depths ) ) / len( depths ) )
+
+    def test_summarize_coarser_level( self ):
+        points = self.pyramid().summarize( 'chr2', 0, 8192, 2 )
+        self.assertEqual( points, [ ( 0, None ), ( 4096, 1.0 ) ] )
+
+    def test_summarize_beyond_data( self ):
+        # the levels of chr1 only reach its data at 0-1000
+        points = self.pyramid().summarize( 'chr1', 0, 250000000, 1000 )
+        self.assertTrue( len( points ) <= 1000 )
+        self.assertEqual( points[ 1 ][ 0 ] - points[ 0 ][ 0 ], 1 << 18 )
+        depths = self.depths( 'chr1', 0, 1000 )
+        self.assertAlmostEqual( points[ 0 ][ 1 ], float( sum( depths ) ) / len( depths ) )
+        self.assertEqual( set( mean for position, mean in points[ 1: ] ), set( [ None ] ) )
+        for num_points in range( 1, 40 ):
+            self.assertTrue( len( self.pyramid().summarize( 'chr2', 1000, 70000, num_points ) ) <= num_points )
+
+    def test_stats( self ):
+        stats = self.pyramid().stats( 'chr1', 0, 1024 )
+        depths = self.depths( 'chr1', 0, 1024 )
+        self.assertEqual( stats[ 'min' ], 1 )
+        self.assertEqual( stats[ 'max' ], 2 )
+        self.assertAlmostEqual( stats[ 'mean' ], float( sum( depths ) ) / len( depths ) )
+
+    def test_no_data( self ):
+        pyramid = self.pyramid()
+        self.assertEqual( pyramid.summarize( 'chrX', 0, 1000, 10 )[ 0 ], ( 0, None ) )
+        self.assertEqual( pyramid.stats( 'chrX', 0, 1000 )[ 'max' ], 0 )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for ``galaxy.web.framework.base.send_file``
+"""
+import os
+import imp
+import shutil
+import tempfile
+import unittest
+
+utility = imp.load_source( 'utility', os.path.join( os.path.dirname( __file__ ), '../../util/utility.py' ) )
+utility.add_galaxy_lib_to_path( 'test/unit/web/framework' )
+
+from galaxy.util.bunch import Bunch
+from galaxy.web.framework.base import Response, send_file
+
+CONTENTS = ''.join([ '%d\n' % i for i in xrange( 1000 ) ])
+
+
+class SendFile_TestCase( unittest.TestCase ):
+
+    def setUp( self ):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join( self.directory, 'dataset.txt' )
+        with open( self.filename, 'w' ) as dataset_file:
+            dataset_file.write( CONTENTS )
+        self.started = []
+
+    def tearDown( self ):
+        shutil.rmtree( self.directory )
+
+    def start_response( self, status, headers ):
+        self.started.append( ( status, dict( headers ) ) )
+
+    def send( self, **environ ):
+        """Returns ( status, headers, body, file ) of sending the file for a request with the given headers."""
+        response = Response()
+        response.set_file_validators( self.filename )
+        response.headers[ 'content-length' ] = str( len( CONTENTS ) )
+        config = Bunch( nginx_x_accel_redirect_base=None, apache_xsendfile=False )
+        trans = Bunch( response=response, environ=environ, app=Bunch( config=config ) )
+        body = open( self.filename, 'rb' )
+        result = ''.join( send_file( self.start_response, trans, body ) )
+        status, headers = self.started[ -1 ]
+        return status, headers, result, body
+
+    def etag( self ):
+        response = Response()
+        response.set_file_validators( self.filename )
+        return response.headers[ 'etag' ]
+
+    def test_whole_file( self ):
+        status, headers, body, dataset_file = self.send()
+        assert status == '200 OK'
+        assert body == CONTENTS
+        assert headers[ 'accept-ranges' ] == 'bytes'
+
+    def test_not_modified( self ):
+        status, headers, body, dataset_file = self.send( HTTP_IF_NONE_MATCH='"other", W/%s' % self.etag() )
+        assert status == '304 Not Modified'
+        assert body == ''
+        assert 'content-length' not in headers
+        assert dataset_file.closed
+        status, headers, body, dataset_file = self.send( HTTP_IF_NONE_MATCH='"other"' )
+        assert status == '200 OK' and body == CONTENTS
+
+    def test_range( self ):
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=10-19' )
+        assert status == '206 Partial Content'
+        assert body == CONTENTS[ 10:20 ]
+        assert headers[ 'content-range' ] == 'bytes 10-19/%d' % len( CONTENTS )
+        assert headers[ 'content-length' ] == '10'
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=-5' )
+        assert status == '206 Partial Content' and body == CONTENTS[ -5: ]
+
+    def test_range_not_satisfiable( self ):
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=%d-' % len( CONTENTS ) )
+        assert status == '416 Requested Range Not Satisfiable'
+        assert body == ''
+        assert headers[ 'content-range' ] == 'bytes */%d' % len( CONTENTS )
+        assert headers[ 'content-length' ] == '0'
+        assert dataset_file.closed
+
+    def test_if_range( self ):
+        # the range is only sent if the file is still the one the client has part of
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=self.etag() )
+        assert status == '206 Partial Content' and body == CONTENTS[ 10:20 ]
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"changed"' )
+        assert status == '200 OK' and body == CONTENTS
+        # weak tags never match an If-Range
+        status, headers, body, dataset_file = self.send( HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='W/' + self.etag() )
+        assert status == '200 OK' and body == CONTENTS
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -64,10 +64,50 @@ def parse_outputs( args ):
         id, files_path, path = arg.split( ':', 2 )
         rval[int( id )] = ( path, files_path )
     return rval
+def write_output_adjacent_file( dataset, source, output_path, tmp_prefix ):
+    """
+    Copies the data read from the open file source (e.g. the decompressed
+    data of a compressed file) to a new file next to output_path, converting
+    its newlines, and optionally spaces to tabs, on the way if the dataset is
+    to have Posix newlines - so that the data is read and written only once.
+    Returns the new file's path and the NewlineConverter used (or None).
+    IOErrors reading source are raised after removing the new file.
+    """
+    CHUNK_SIZE = 2**20 # 1Mb
+    fd, path = tempfile.mkstemp( prefix='data_id_%s_%s' % ( dataset.dataset_id, tmp_prefix ), dir=output_adjacent_tmpdir( output_path ), text=False )
+    out = os.fdopen( fd, 'wb' )
+    converter = None
+    write = out.write
+    if dataset.to_posix_lines:
+        converter = sniff.NewlineConverter( out, sep2tabs=dataset.space_to_tab )
+        write = converter.write
+    try:
+        try:
+            while 1:
+                chunk = source.read( CHUNK_SIZE )
+                if not chunk:
+                    break
+                write( chunk )
+            if converter is not None:
+                converter.flush()
+        finally:
+            out.close()
+    except IOError:
+        os.remove( path )
+        raise
+    return path, converter
+def replace_dataset_file( dataset, path, in_place ):
+    # Replace the uploaded file with the file at path (next to the output) if it's safe to do so
+    if not ( dataset.type in ( 'server_dir', 'path_paste' ) or not in_place ):
+        os.remove( dataset.path )
+    dataset.path = path
+    os.chmod( dataset.path, 0644 )
 def add_file( dataset, registry, json_file, output_path ):
     data_type = None
     line_count = None
     converted_path = None
+    # the NewlineConverter that converted the dataset's file while it was written, if any
+    converter = None
     stdout = None
     link_data_only = dataset.get( 'link_data_only', 'copy_files' )
     in_place = dataset.get( 'in_place', True )
@@ -133,28 +173,14 @@ def add_file( dataset, registry, json_file, output_path ):
             elif is_gzipped and is_valid:
                 if link_data_only == 'copy_files':
                     # We need to uncompress the temp_name file, but BAM files must remain compressed in the BGZF format
-                    CHUNK_SIZE = 2**20 # 1Mb
-                    fd, uncompressed = tempfile.mkstemp( prefix='data_id_%s_upload_gunzip_' % dataset.dataset_id, dir=os.path.dirname( output_path ), text=False )
                     gzipped_file = gzip.GzipFile( dataset.path, 'rb' )
-                    while 1:
-                        try:
-                            chunk = gzipped_file.read( CHUNK_SIZE )
-                        except IOError:
-                            os.close( fd )
-                            os.remove( uncompressed )
-                            file_err( 'Problem decompressing gzipped data', dataset, json_file )
-                            return
-                        if not chunk:
-                            break
-                        os.write( fd, chunk )
-                    os.close( fd )
+                    try:
+                        uncompressed, converter = write_output_adjacent_file( dataset, gzipped_file, output_path, 'upload_gunzip_' )
+                    except IOError:
+                        file_err( 'Problem decompressing gzipped data', dataset, json_file )
+                        return
                     gzipped_file.close()
-                    # Replace the gzipped file with the decompressed file if it's safe to do so
-                    if dataset.type in ( 'server_dir', 'path_paste' ) or not in_place:
-                        dataset.path = uncompressed
-                    else:
-                        shutil.move( uncompressed, dataset.path )
-                    os.chmod(dataset.path, 0644)
+                    replace_dataset_file( dataset, uncompressed, in_place )
                 dataset.name = dataset.name.rstrip( '.gz' )
                 data_type = 'gzip'
             if not data_type and bz2 is not None:
@@ -166,28 +192,14 @@ def add_file( dataset, registry, json_file, output_path ):
                 elif is_bzipped and is_valid:
                     if link_data_only == 'copy_files':
                         # We need to uncompress the temp_name file
-                        CHUNK_SIZE = 2**20 # 1Mb
-                        fd, uncompressed = tempfile.mkstemp( prefix='data_id_%s_upload_bunzip2_' % dataset.dataset_id, dir=os.path.dirname( output_path ), text=False )
                         bzipped_file = bz2.BZ2File( dataset.path, 'rb' )
-                        while 1:
-                            try:
-                                chunk = bzipped_file.read( CHUNK_SIZE )
-                            except IOError:
-                                os.close( fd )
-                                os.remove( uncompressed )
-                                file_err( 'Problem decompressing bz2 compressed data', dataset, json_file )
-                                return
-                            if not chunk:
-                                break
-                            os.write( fd, chunk )
-                        os.close( fd )
+                        try:
+                            uncompressed, converter = write_output_adjacent_file( dataset, bzipped_file, output_path, 'upload_bunzip2_' )
+                        except IOError:
+                            file_err( 'Problem decompressing bz2 compressed data', dataset, json_file )
+                            return
                         bzipped_file.close()
-                        # Replace the bzipped file with the decompressed file if it's safe to do so
-                        if dataset.type in ( 'server_dir', 'path_paste' ) or not in_place:
-                            dataset.path = uncompressed
-                        else:
-                            shutil.move( uncompressed, dataset.path )
-                        os.chmod(dataset.path, 0644)
+                        replace_dataset_file( dataset, uncompressed, in_place )
                     dataset.name = dataset.name.rstrip( '.bz2' )
                     data_type = 'bz2'
             if not data_type:
@@ -195,7 +207,6 @@ def add_file( dataset, registry, json_file, output_path ):
                 is_zipped = check_zip( dataset.path )
                 if is_zipped:
                     if link_data_only == 'copy_files':
-                        CHUNK_SIZE = 2**20 # 1Mb
                         uncompressed = None
                         uncompressed_name = None
                         unzipped = False
@@ -206,25 +217,18 @@ def add_file( dataset, registry, json_file, output_path ):
                             if unzipped:
                                 stdout = 'ZIP file contained more than one file, only the first file was added to Galaxy.'
                                 break
-                            fd, uncompressed = tempfile.mkstemp( prefix='data_id_%s_upload_zip_' % dataset.dataset_id, dir=os.path.dirname( output_path ), text=False )
                             if sys.version_info[:2] >= ( 2, 6 ):
                                 zipped_file = z.open( name )
-                                while 1:
-                                    try:
-                                        chunk = zipped_file.read( CHUNK_SIZE )
-                                    except IOError:
-                                        os.close( fd )
-                                        os.remove( uncompressed )
-                                        file_err( 'Problem decompressing zipped data', dataset, json_file )
-                                        return
-                                    if not chunk:
-                                        break
-                                    os.write( fd, chunk )
-                                os.close( fd )
+                                try:
+                                    uncompressed, converter = write_output_adjacent_file( dataset, zipped_file, output_path, 'upload_zip_' )
+                                except IOError:
+                                    file_err( 'Problem decompressing zipped data', dataset, json_file )
+                                    return
                                 zipped_file.close()
                                 uncompressed_name = name
                                 unzipped = True
                             else:
+                                fd, uncompressed = tempfile.mkstemp( prefix='data_id_%s_upload_zip_' % dataset.dataset_id, dir=os.path.dirname( output_path ), text=False )
                                 # python < 2.5 doesn't have a way to read members in chunks(!)
                                 try:
                                     outfile = open( uncompressed, 'wb' )
@@ -238,13 +242,8 @@ def add_file( dataset, registry, json_file, output_path ):
                                     file_err( 'Problem decompressing zipped data', dataset, json_file )
                                     return
                         z.close()
-                        # Replace the zipped file with the decompressed file if it's safe to do so
                         if uncompressed is not None:
-                            if dataset.type in ( 'server_dir', 'path_paste' ) or not in_place:
-                                dataset.path = uncompressed
-                            else:
-                                shutil.move( uncompressed, dataset.path )
-                            os.chmod(dataset.path, 0644)
+                            replace_dataset_file( dataset, uncompressed, in_place )
                             dataset.name = uncompressed_name
                     data_type = 'zip'
             if not data_type:
@@ -277,16 +276,26 @@ def add_file( dataset, registry, json_file, output_path ):
                         in_place = False
                     # Convert universal line endings to Posix line endings, but allow the user to turn it off,
                     # so that is becomes possible to upload gzip, bz2 or zip files with binary data without
-                    # corrupting the content of those files.
-                    if dataset.to_posix_lines:
-                        tmpdir = output_adjacent_tmpdir( output_path )
-                        tmp_prefix = 'data_id_%s_convert_' % dataset.dataset_id
-                        if dataset.space_to_tab:
-                            line_count, converted_path = sniff.convert_newlines_sep2tabs( dataset.path, in_place=in_place, tmp_dir=tmpdir, tmp_prefix=tmp_prefix )
+                    # corrupting the content of those files. Decompressed files were already converted while
+                    # they were written.
+                    if dataset.to_posix_lines and converter is None:
+                        uploaded_file = open( dataset.path, 'rb' )
+                        try:
+                            converted, converter = write_output_adjacent_file( dataset, uploaded_file, output_path, 'convert_' )
+                        finally:
+                            uploaded_file.close()
+                        if in_place:
+                            replace_dataset_file( dataset, converted, in_place )
                         else:
-                            line_count, converted_path = sniff.convert_newlines( dataset.path, in_place=in_place, tmp_dir=tmpdir, tmp_prefix=tmp_prefix )
+                            converted_path = converted
+                    if converter is not None:
+                        line_count = converter.line_count
                 if dataset.file_type == 'auto':
-                    ext = sniff.guess_ext( dataset.path, registry.sniff_order )
+                    file_prefix = None
+                    if converter is not None and converted_path is None:
+                        # the sniffers look at the start of the file that was just written
+                        file_prefix = converter.get_file_prefix( dataset.path )
+                    ext = sniff.guess_ext( dataset.path, registry.sniff_order, file_prefix=file_prefix )
                 else:
                     ext = dataset.file_type
                 data_type = ext
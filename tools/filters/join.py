@@ -6,242 +6,102 @@ Script to Join Two Files on specified columns.
 Takes two tab delimited files, two column numbers (base 1) and outputs a new tab delimited file with lines joined by tabs.
 User can also opt to have have non-joining rows of file1 echoed.
 
+Lines of the second file are held in a hash table keyed by identifier when
+they fit in memory; otherwise both files are first partitioned by the hash of
+their identifiers into temporary files, which are then joined partition by
+partition. The output is in the order of the first file in either case.
 """
 
+import heapq
 import json
 import optparse
 import os
 import psyco_full
-import struct
+import shutil
 import sys
 import tempfile
 from galaxy.util.bunch import Bunch
 from galaxy.util import stringify_dictionary_keys
 
 
-class OffsetList:
-    def __init__( self, filesize = 0, fmt = None ):
-        self.file = tempfile.NamedTemporaryFile( 'w+b' )
-        if fmt:
-            self.fmt = fmt
-        elif filesize and filesize <= sys.maxint * 2:
-            self.fmt = 'I'
-        else:
-            self.fmt = 'Q'
-        self.fmt_size = struct.calcsize( self.fmt )
-    @property
-    def size( self ):
-        self.file.flush()
-        return self.file_size / self.fmt_size
-    @property
-    def file_size( self ):
-        self.file.flush()
-        return os.stat( self.file.name ).st_size
-    def add_offset( self, offset ):
-        if not isinstance( offset, list ):
-            offset = [offset]
-        self.file.seek( self.file_size )
-        for off in offset:
-            self.file.write( struct.pack( self.fmt, off ) )
-    def get_offsets( self, start = 0 ):
-        self.file.seek( start * self.fmt_size )
-        while True:
-            packed = self.file.read( self.fmt_size )
-            if not packed: break
-            yield struct.unpack( self.fmt, packed )[0]
-    def get_offset_by_index( self, index ):
-        self.file.seek( index * self.fmt_size )
-        return struct.unpack( self.fmt, self.file.read( self.fmt_size ) )[0]
-    def set_offset_at_index( self, index, offset ):
-        if not isinstance( offset, list ):
-            offset = [offset]
-        if index >= self.size:
-            self.add_offset( offset )
-        else:
-            temp_file = tempfile.NamedTemporaryFile( 'w+b' )
-            self.file.seek( 0 )
-            temp_file.write( self.file.read( ( index ) * self.fmt_size ) )
-            for off in offset:
-                temp_file.write( struct.pack( self.fmt, off ) )
-            temp_file.write( self.file.read() )
-            self.file = temp_file
+#estimated bytes of memory used per byte of input held in a hash table
+HASH_TABLE_OVERHEAD = 4
+DEFAULT_MAX_MEMORY = 512 * 1024 * 1024
+#partitions are written to at the same time, each holding an open file
+MAX_PARTITIONS = 512
+
+
+def get_identifier_by_line( line, column, split = None ):
+    if isinstance( line, str ):
+        fields = line.rstrip( '\r\n' ).split( split )
+        if column < len( fields ):
+            return fields[column]
+    return None
+
+
+def read_hash_table( lines, column, split = None ):
+    """Returns { identifier: [ lines ] }, with lines in input order, for lines that have an identifier."""
+    table = {}
+    for line in lines:
+        identifier = get_identifier_by_line( line, column, split )
+        if identifier:
+            line = line.rstrip( '\r\n' )
+            if identifier in table:
+                table[identifier].append( line )
+            else:
+                table[identifier] = [ line ]
+    return table
 
-class SortedOffsets( OffsetList ):
-    def __init__( self, indexed_filename, column, split = None ):
-        OffsetList.__init__( self, os.stat( indexed_filename ).st_size )
-        self.indexed_filename = indexed_filename
-        self.indexed_file = open( indexed_filename, 'rb' )
-        self.column = column
-        self.split = split
-        self.last_identifier = None
-        self.last_identifier_merged = None
-        self.last_offset_merged = 0
-    def merge_with_dict( self, new_offset_dict ):
-        if not new_offset_dict: return #no items to merge in
-        keys = new_offset_dict.keys()
-        keys.sort()
-        identifier2 = keys.pop( 0 )
-        
-        result_offsets = OffsetList( fmt = self.fmt )
-        offsets1 = enumerate( self.get_offsets() )
+
+def partition_count( filename, max_memory ):
+    """Returns the number of partitions needed to hold the lines of filename in memory, one partition at a time."""
+    if not max_memory:
+        return 1
+    size = os.stat( filename ).st_size * HASH_TABLE_OVERHEAD
+    return min( max( ( size + max_memory - 1 ) // max_memory, 1 ), MAX_PARTITIONS )
+
+
+class Partitions:
+    """Temporary files holding the lines of a file, split by the hash of their identifiers."""
+    def __init__( self, directory, name, count ):
+        self.filenames = [ os.path.join( directory, "%s_%i" % ( name, i ) ) for i in range( count ) ]
+    def partition( self, lines, column, split = None, numbered = False ):
+        """
+        Writes lines to the partition of their identifier; lines without an
+        identifier go to the first partition. When numbered, lines are
+        prefixed with their (0-based) line number.
+        """
+        outs = [ open( filename, 'wb' ) for filename in self.filenames ]
+        count = len( outs )
         try:
-            index1, offset1 = offsets1.next()
-            identifier1 = self.get_identifier_by_offset( offset1 )
-        except StopIteration:
-            offset1 = None
-            identifier1 = None
-            index1 = 0
-        
-        while True:
-            if identifier1 is None and identifier2 is None:
-                self.file = result_offsets.file #self is now merged results
-                return
-            elif identifier1 is None or ( identifier2 and identifier2 < identifier1 ):
-                result_offsets.add_offset( new_offset_dict[identifier2] )
-                if keys:
-                    identifier2 = keys.pop( 0 )
+            for i, line in enumerate( lines ):
+                identifier = get_identifier_by_line( line, column, split )
+                if identifier:
+                    out = outs[ hash( identifier ) % count ]
                 else:
-                    identifier2 = None
-            elif identifier2 is None:
-                result_offsets.file.seek( result_offsets.file_size )
-                self.file.seek( index1 * self.fmt_size )
-                result_offsets.file.write( self.file.read() )
-                identifier1 = None
-                offset1 = None
-            else:
-                result_offsets.add_offset( offset1 )
-                try:
-                    index1, offset1 = offsets1.next()
-                    identifier1 = self.get_identifier_by_offset( offset1 )
-                except StopIteration:
-                    offset1 = None
-                    identifier1 = None
-                    index1 += 1
-#methods to help link offsets to lines, ids, etc
-    def get_identifier_by_line( self, line ):
-        if isinstance( line, str ):
-            fields = line.rstrip( '\r\n' ).split( self.split )
-            if self.column < len( fields ):
-                return fields[self.column]
-        return None
-    def get_line_by_offset( self, offset ):
-        self.indexed_file.seek( offset )
-        return self.indexed_file.readline()
-    def get_identifier_by_offset( self, offset ):
-        return self.get_identifier_by_line( self.get_line_by_offset( offset ) )
+                    out = outs[0]
+                if not line.endswith( '\n' ):
+                    line = "%s\n" % line
+                if numbered:
+                    out.write( "%i\t%s" % ( i, line ) )
+                else:
+                    out.write( line )
+        finally:
+            for out in outs:
+                out.close()
 
-#indexed set of offsets, index is built on demand
-class OffsetIndex:
-    def __init__( self, filename, column, split = None, index_depth = 3 ):
-        self.filename = filename
-        self.file = open( filename, 'rb' )
-        self.column = column
-        self.split = split
-        self._offsets = {}
-        self._index = None
-        self.index_depth = index_depth
-    def _build_index( self ):
-        self._index = {}
-        for start_char, sorted_offsets in self._offsets.items():
-            self._index[start_char]={}
-            for i, offset in enumerate( sorted_offsets.get_offsets() ):
-                identifier = sorted_offsets.get_identifier_by_offset( offset )
-                if identifier[0:self.index_depth] not in self._index[start_char]:
-                    self._index[start_char][identifier[0:self.index_depth]] = i
-    def get_lines_by_identifier( self, identifier ):
-        if not identifier: return
-        #if index doesn't exist, build it
-        if self._index is None: self._build_index()
-        
-        #identifier cannot exist
-        if identifier[0] not in self._index or identifier[0:self.index_depth] not in self._index[identifier[0]]:
-            return
-        #identifier might exist, search for it
-        offset_index = self._index[identifier[0]][identifier[0:self.index_depth]]
-        while True:
-            if offset_index >= self._offsets[identifier[0]].size:
-                return
-            offset = self._offsets[identifier[0]].get_offset_by_index( offset_index )
-            identifier2 = self._offsets[identifier[0]].get_identifier_by_offset( offset )
-            if not identifier2 or identifier2 > identifier:
-                return
-            if identifier2 == identifier:
-                yield self._offsets[identifier[0]].get_line_by_offset( offset )
-            offset_index += 1
-    def get_offsets( self ):
-        keys = self._offsets.keys()
-        keys.sort()
-        for key in keys:
-            for offset in self._offsets[key].get_offsets():
-                yield offset
-    def get_line_by_offset( self, offset ):
-        self.file.seek( offset )
-        return self.file.readline()
-    def get_identifiers_offsets( self ):
-        keys = self._offsets.keys()
-        keys.sort()
-        for key in keys:
-            for offset in self._offsets[key].get_offsets():
-                yield self._offsets[key].get_identifier_by_offset( offset ), offset
-    def get_identifier_by_line( self, line ):
-        if isinstance( line, str ):
-            fields = line.rstrip( '\r\n' ).split( self.split )
-            if self.column < len( fields ):
-                return fields[self.column]
-        return None
-    def merge_with_dict( self, d ):
-        if not d: return #no data to merge
-        self._index = None
-        keys = d.keys()
-        keys.sort()
-        identifier = keys.pop( 0 )
-        first_char = identifier[0]
-        temp = { identifier: d[identifier] }
-        while True:
-            if not keys:
-                if first_char not in self._offsets:
-                    self._offsets[first_char] = SortedOffsets( self.filename, self.column, self.split )
-                self._offsets[first_char].merge_with_dict( temp )
-                return
-            identifier = keys.pop( 0 )
-            if identifier[0] == first_char:
-                temp[identifier] = d[identifier]
-            else:
-                if first_char not in self._offsets:
-                    self._offsets[first_char] = SortedOffsets( self.filename, self.column, self.split )
-                self._offsets[first_char].merge_with_dict( temp )
-                temp = { identifier: d[identifier] }
-                first_char = identifier[0]
 
-class BufferedIndex:
-    def __init__( self, filename, column, split = None, buffer = 1000000, index_depth = 3 ):
-        self.index = OffsetIndex( filename, column, split, index_depth )
-        self.buffered_offsets = {}
-        f = open( filename, 'rb' )
-        offset = f.tell()
-        identified_offset_count = 1
-        while True:
-            offset = f.tell()
-            line = f.readline()
-            if not line: break #EOF
-            identifier = self.index.get_identifier_by_line( line )
-            if identifier:
-                #flush buffered offsets, if buffer size reached
-                if buffer and identified_offset_count % buffer == 0:
-                    self.index.merge_with_dict( self.buffered_offsets )
-                    self.buffered_offsets = {}
-                if identifier not in self.buffered_offsets:
-                    self.buffered_offsets[identifier] = []
-                self.buffered_offsets[identifier].append( offset )
-                identified_offset_count += 1
-        f.close()
-     
-    def get_lines_by_identifier( self, identifier ):
-        for line in self.index.get_lines_by_identifier( identifier ):
-            yield line
-        if identifier in self.buffered_offsets:
-            for offset in self.buffered_offsets[identifier]:
-                yield self.index.get_line_by_offset( offset )
+def iter_numbered_lines( filename, with_position = False ):
+    """
+    Yields ( line number, line ) from a file of lines prefixed with their
+    line numbers, or ( line number, position in filename, line ).
+    """
+    for position, line in enumerate( open( filename, 'rb' ) ):
+        number, line = line.split( '\t', 1 )
+        if with_position:
+            yield int( number ), position, line
+        else:
+            yield int( number ), line
 
 
 def fill_empty_columns( line, split, fill_values ):
@@ -258,41 +118,84 @@ def fill_empty_columns( line, split, fill_values ):
     return split.join( filled_columns )
 
 
-def join_files( filename1, column1, filename2, column2, out_filename, split = None, buffer = 1000000, keep_unmatched = False, keep_partial = False, index_depth = 3, fill_options = None ):
-    #return identifier based upon line
-    def get_identifier_by_line( line, column, split = None ):
-        if isinstance( line, str ):
-            fields = line.rstrip( '\r\n' ).split( split )
-            if column < len( fields ):
-                return fields[column]
-        return None
+def iter_joined_lines( line1, identifier, table, split, keep_unmatched, keep_partial, fill_options ):
+    """Yields the output lines (without newlines) for line1 of the first file."""
+    if identifier:
+        written = False
+        for line2 in table.get( identifier, () ):
+            if not fill_options.fill_unjoined_only:
+                yield "%s%s%s" % ( fill_empty_columns( line1.rstrip( '\r\n' ), split, fill_options.file1_columns ), split, fill_empty_columns( line2, split, fill_options.file2_columns ) )
+            else:
+                yield "%s%s%s" % ( line1.rstrip( '\r\n' ), split, line2 )
+            written = True
+        if not written and keep_unmatched:
+            yield fill_unjoined_line( line1, split, fill_options )
+    elif keep_partial:
+        yield fill_unjoined_line( line1, split, fill_options )
+
+
+def fill_unjoined_line( line1, split, fill_options ):
+    line = fill_empty_columns( line1.rstrip( '\r\n' ), split, fill_options.file1_columns )
+    if fill_options:
+        if fill_options.file2_columns:
+            line = "%s%s%s" % ( line, split,  fill_empty_columns( "", split, fill_options.file2_columns ) )
+    return line
+
+
+def join_files( filename1, column1, filename2, column2, out_filename, split = None, buffer = 1000000, keep_unmatched = False, keep_partial = False, index_depth = 3, fill_options = None, max_memory = DEFAULT_MAX_MEMORY ):
+    """
+    Joins the lines of filename1 with those of filename2 on the given columns.
+    The second file is joined in memory when it fits in max_memory bytes (a
+    max_memory or buffer of 0 always joins in memory), otherwise as a
+    partitioned hash join through temporary files. buffer and index_depth
+    are no longer used.
+    """
     if fill_options is None:
         fill_options = Bunch( fill_unjoined_only = True, file1_columns = None, file2_columns = None )
+    if buffer == 0:
+        max_memory = 0
+    count = partition_count( filename2, max_memory )
     out = open( out_filename, 'w+b' )
-    index = BufferedIndex( filename2, column2, split, buffer, index_depth )
-    for line1 in open( filename1, 'rb' ):
-        identifier = get_identifier_by_line( line1, column1, split )
-        if identifier:
-            written = False
-            for line2 in index.get_lines_by_identifier( identifier ):
-                if not fill_options.fill_unjoined_only:
-                    out.write( "%s%s%s\n" % ( fill_empty_columns( line1.rstrip( '\r\n' ), split, fill_options.file1_columns ), split, fill_empty_columns( line2.rstrip( '\r\n' ), split, fill_options.file2_columns ) ) )
-                else:
-                    out.write( "%s%s%s\n" % ( line1.rstrip( '\r\n' ), split, line2.rstrip( '\r\n' ) ) )
-                written = True
-            if not written and keep_unmatched:
-                out.write( fill_empty_columns( line1.rstrip( '\r\n' ), split, fill_options.file1_columns ) )
-                if fill_options:
-                    if fill_options.file2_columns:
-                        out.write( "%s%s" % ( split,  fill_empty_columns( "", split, fill_options.file2_columns ) ) )
-                out.write( "\n" )
-        elif keep_partial:
-            out.write( fill_empty_columns( line1.rstrip( '\r\n' ), split, fill_options.file1_columns ) )
-            if fill_options:
-                if fill_options.file2_columns:
-                    out.write( "%s%s" % ( split,  fill_empty_columns( "", split, fill_options.file2_columns ) ) )
-            out.write( "\n" )
-    out.close()
+    try:
+        if count == 1:
+            table = read_hash_table( open( filename2, 'rb' ), column2, split )
+            for line1 in open( filename1, 'rb' ):
+                identifier = get_identifier_by_line( line1, column1, split )
+                for line in iter_joined_lines( line1, identifier, table, split, keep_unmatched, keep_partial, fill_options ):
+                    out.write( "%s\n" % line )
+        else:
+            join_partitioned( filename1, column1, filename2, column2, out, split, count, keep_unmatched, keep_partial, fill_options )
+    finally:
+        out.close()
+
+
+def join_partitioned( filename1, column1, filename2, column2, out, split, count, keep_unmatched, keep_partial, fill_options ):
+    temp_dir = tempfile.mkdtemp( dir = os.path.dirname( os.path.abspath( out.name ) ) )
+    try:
+        partitions1 = Partitions( temp_dir, 'input1', count )
+        partitions1.partition( open( filename1, 'rb' ), column1, split, numbered = True )
+        partitions2 = Partitions( temp_dir, 'input2', count )
+        partitions2.partition( open( filename2, 'rb' ), column2, split )
+        #join each partition, keeping the line numbers of the first file so that the results can be merged back into its order
+        joined_filenames = []
+        for i in range( count ):
+            table = read_hash_table( open( partitions2.filenames[i], 'rb' ), column2, split )
+            os.unlink( partitions2.filenames[i] )
+            joined_filename = os.path.join( temp_dir, "joined_%i" % i )
+            joined = open( joined_filename, 'wb' )
+            for number, line1 in iter_numbered_lines( partitions1.filenames[i] ):
+                identifier = get_identifier_by_line( line1, column1, split )
+                for line in iter_joined_lines( line1, identifier, table, split, keep_unmatched, keep_partial, fill_options ):
+                    joined.write( "%i\t%s\n" % ( number, line ) )
+            joined.close()
+            os.unlink( partitions1.filenames[i] )
+            joined_filenames.append( joined_filename )
+        #every line of the first file is in exactly one partition and each partition is in the order of the
+        #first file, so merging by line number (and position, for lines joined more than once) restores that order
+        for number, position, line in heapq.merge( *[ iter_numbered_lines( filename, with_position = True ) for filename in joined_filenames ] ):
+            out.write( line )
+    finally:
+        shutil.rmtree( temp_dir, ignore_errors = True )
 
 def main():
     parser = optparse.OptionParser()
@@ -300,13 +203,19 @@ def main():
         '-b','--buffer',
         dest='buffer',
         type='int',default=1000000,
-        help='Number of lines to buffer at a time. Default: 1,000,000 lines. A buffer of 0 will attempt to use memory only.'
+        help='Deprecated, use --max_memory. A buffer of 0 will attempt to use memory only.'
     )
     parser.add_option(
         '-d','--index_depth',
         dest='index_depth',
         type='int',default=3,
-        help='Depth to use on filebased offset indexing. Default: 3.'
+        help='Deprecated, no longer used.'
+    )
+    parser.add_option(
+        '-m','--max_memory',
+        dest='max_memory',
+        type='int',default=DEFAULT_MAX_MEMORY,
+        help='Approximate number of bytes of memory to use for joining; larger inputs are joined through temporary files. Default: 512MB. A value of 0 will attempt to use memory only.'
     )
     parser.add_option(
         '-p','--keep_partial',
@@ -358,6 +267,6 @@ def main():
     #Character for splitting fields and joining lines
     split = "\t"
     
-    return join_files( filename1, column1, filename2, column2, out_filename, split, options.buffer, options.keep_unmatched, options.keep_partial, options.index_depth, fill_options = fill_options )
+    return join_files( filename1, column1, filename2, column2, out_filename, split, options.buffer, options.keep_unmatched, options.keep_partial, options.index_depth, fill_options = fill_options, max_memory = options.max_memory )
 
 if __name__ == "__main__": main()
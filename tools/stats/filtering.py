@@ -4,7 +4,10 @@
 
 from __future__ import division
 import sys, re, os.path
+from itertools import islice
 from galaxy import eggs
+from galaxy.tools.util import columnar
+from galaxy.tools.util.columnar import numpy
 
 from ast import parse, Module, walk
 
@@ -224,36 +227,88 @@ invalid_line = None
 lines_kept = 0
 total_lines = 0
 out = open( out_fname, 'wt' )
-    
-# Read and filter input file, skipping invalid lines
-code = '''
-for i, line in enumerate( file( in_fname ) ):
-    total_lines += 1
-    line = line.rstrip( '\\r\\n' )
 
-    if i < num_header_lines:
-        lines_kept += 1
-        print >> out, line
-        continue
+# Evaluate the condition on whole columns of chunks of lines where possible,
+# otherwise line by line
+try:
+    expression = columnar.VectorizedExpression( cond_text, dict( ( col, in_column_types[ col - 1 ] ) for col in used_cols ) )
+except columnar.NotVectorizable:
+    expression = None
 
-    if not line or line.startswith( '#' ):
-        skipped_lines += 1
-        continue
-    try:
-        %s
-        %s
-        if %s:
-            lines_kept += 1
-            print >> out, line
-    except:
-        invalid_lines += 1
-        if not invalid_line:
-            first_invalid_line = i + 1
-            invalid_line = line
+def filter_chunk( lines ):
+    """Returns ( keep, invalid ) for the lines of a chunk, evaluated on whole columns."""
+    fields = [ line.split( '\t' ) for line in lines ]
+    invalid = numpy.array( map( len, fields ), dtype=int ) < largest_col_index
+    if invalid.any():
+        fields = [ field if len( field ) >= largest_col_index else [ '' ] * largest_col_index for field in fields ]
+    columns = {}
+    for col in expression.columns:
+        columns[ col ], invalid_values = columnar.convert_column( [ field[ col - 1 ] for field in fields ], in_column_types[ col - 1 ] )
+        if invalid_values is not None:
+            invalid |= invalid_values
+    for col in used_cols:
+        if col not in expression.columns:
+            #columns matched within strings of the condition are cast too, as when filtering line by line
+            invalid_values = columnar.convert_column( [ field[ col - 1 ] for field in fields ], in_column_types[ col - 1 ] )[1]
+            if invalid_values is not None:
+                invalid |= invalid_values
+    keep, invalid_expression = expression.evaluate( columns, len( lines ) )
+    invalid |= invalid_expression
+    return keep & ~invalid, invalid
+
+# Read and filter input file, skipping invalid lines
+code = '''
+def filter_line( line ):
+    %s
+    %s
+    return %s
 ''' % ( assign, wrap, cond_text )
 valid_filter = True
 try:
     exec code
+    input = open( in_fname )
+    for line in islice( input, num_header_lines ):
+        total_lines += 1
+        lines_kept += 1
+        print >> out, line.rstrip( '\r\n' )
+    i = total_lines
+    for chunk in columnar.iter_chunks( input ):
+        numbers = []
+        lines = []
+        for line in chunk:
+            line = line.rstrip( '\r\n' )
+            if not line or line.startswith( '#' ):
+                skipped_lines += 1
+            else:
+                numbers.append( i )
+                lines.append( line )
+            i += 1
+        total_lines += len( chunk )
+        keep = invalid = None
+        if expression is not None and lines:
+            try:
+                keep, invalid = filter_chunk( lines )
+            except Exception:
+                pass
+        if keep is None:
+            keep = []
+            invalid = []
+            for line in lines:
+                try:
+                    keep.append( bool( filter_line( line ) ) )
+                    invalid.append( False )
+                except:
+                    keep.append( False )
+                    invalid.append( True )
+        for number, line, kept, line_invalid in zip( numbers, lines, keep, invalid ):
+            if kept:
+                lines_kept += 1
+                print >> out, line
+            elif line_invalid:
+                invalid_lines += 1
+                if not invalid_line:
+                    first_invalid_line = number + 1
+                    invalid_line = line
 except Exception, e:
     out.close()
     if str( e ).startswith( 'invalid syntax' ):
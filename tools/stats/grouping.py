@@ -13,6 +13,7 @@ except:
     import numpy
 
 from itertools import groupby
+from galaxy.tools.util import columnar
 
 def stop_err(msg):
     sys.stderr.write(msg)
@@ -28,6 +29,39 @@ def mode(data):
         if counts[x] == maxcount:
             modelist.append( str(x) )
     return ','.join(modelist)
+
+def aggregate_groups(op, groups):
+    """
+    Returns the numpy aggregate op of the float values of each of the groups,
+    computed for all the groups at once.
+    """
+    values = []
+    for data in groups:
+        try:
+            values.extend( map(float, data) )
+        except ValueError:
+            sys.stderr.write( "Operation %s expected number values but got %s instead.\n" % (op, data) )
+            sys.exit( 1 )
+    starts = numpy.cumsum( [0] + [ len(data) for data in groups[:-1] ] )
+    return columnar.aggregate( op, numpy.array( values, dtype=float ), starts )
+
+def iter_group_chunks(groups, size=columnar.DEFAULT_CHUNK_LINES):
+    """
+    Yields lists of consecutive (key, op_vals, count) groups of together about
+    size lines, so that the numeric ops of many small groups are computed at
+    once while only a chunk of the sorted input is held in memory.
+    """
+    chunk = []
+    lines = 0
+    for group in groups:
+        chunk.append( group )
+        lines += group[2]
+        if lines >= size:
+            yield chunk
+            chunk = []
+            lines = 0
+    if chunk:
+        yield chunk
     
 def main():
     inputfile = sys.argv[2]
@@ -106,55 +140,60 @@ def main():
             return item.lower()
         return item
         
-    for key, line_list in groupby(tmpfile, key=is_new_item):
-        op_vals = [ [] for op in ops ]
-        out_str = key
-        multiple_modes = False
-        mode_index = None
+    def iter_groups():
+        for key, line_list in groupby(tmpfile, key=is_new_item):
+            op_vals = [ [] for op in ops ]
+            count = 0
+            for line in line_list:
+                count += 1
+                fields = line.strip().split("\t")
+                for i, col in enumerate(cols):
+                    col = int(col)-1 # cXX from galaxy is 1-based
+                    try:
+                        val = fields[col].strip()
+                        op_vals[i].append(val)
+                    except IndexError:
+                        sys.stderr.write( 'Could not access the value for column %s on line: "%s". Make sure file is tab-delimited.\n' % (col+1, line) )
+                        sys.exit( 1 )
+            yield key, op_vals, count
         
-        for line in line_list:
-            fields = line.strip().split("\t")
-            for i, col in enumerate(cols):
-                col = int(col)-1 # cXX from galaxy is 1-based
-                try:
-                    val = fields[col].strip()
-                    op_vals[i].append(val)
-                except IndexError:
-                    sys.stderr.write( 'Could not access the value for column %s on line: "%s". Make sure file is tab-delimited.\n' % (col+1, line) )
-                    sys.exit( 1 )
-                
-        # Generate string for each op for this group
+    for chunk in iter_group_chunks( iter_groups() ):
+        # The numpy fns are computed for all groups of the chunk at once
+        aggregates = {}
         for i, op in enumerate( ops ):
-            data = op_vals[i]
-            rval = ""
-            if op == "mode":
-                rval = mode( data )
-            elif op == "length":
-                rval = len( data )
-            elif op == "random":
-                rval = random.choice(data)
-            elif op in ['cat', 'cat_uniq']:
-                if op == 'cat_uniq':
-                    data = numpy.unique(data)
-                rval = ','.join(data)
-            elif op == "unique":
-                rval = len( numpy.unique(data) )
-            else:
-                # some kind of numpy fn
-                try:
-                    data = map(float, data)
-                except ValueError:
-                    sys.stderr.write( "Operation %s expected number values but got %s instead.\n" % (op, data) )
-                    sys.exit( 1 )
-                rval = getattr(numpy, op)( data )
-                if round_val[i] == 'yes':
-                    rval = round(rval)
-                else:
-                    rval = '%g' % rval
-                        
-            out_str += "\t%s" % rval
+            if op not in ['mode', 'length', 'random', 'cat', 'cat_uniq', 'unique']:
+                aggregates[i] = aggregate_groups( op, [ op_vals[i] for key, op_vals, count in chunk ] )
         
-        fout.write(out_str + "\n")
+        for j, (key, op_vals, count) in enumerate( chunk ):
+            out_str = key
+            
+            # Generate string for each op for this group
+            for i, op in enumerate( ops ):
+                data = op_vals[i]
+                rval = ""
+                if op == "mode":
+                    rval = mode( data )
+                elif op == "length":
+                    rval = len( data )
+                elif op == "random":
+                    rval = random.choice(data)
+                elif op in ['cat', 'cat_uniq']:
+                    if op == 'cat_uniq':
+                        data = numpy.unique(data)
+                    rval = ','.join(data)
+                elif op == "unique":
+                    rval = len( numpy.unique(data) )
+                else:
+                    # some kind of numpy fn
+                    rval = aggregates[i][j]
+                    if round_val[i] == 'yes':
+                        rval = round(rval)
+                    else:
+                        rval = '%g' % rval
+                            
+                out_str += "\t%s" % rval
+            
+            fout.write(out_str + "\n")
     
     # Generate a useful info message.
     msg = "--Group by c%d: " %(group_col+1)